@@ -0,0 +1,213 @@
+from __future__ import division
+
+import bisect, collections, math, time
+
+# -- Workflow timing analysis
+#
+# Analyses over the call attempts of a CallTable.  Cromwell's metadata
+# has no explicit call dependencies, so they are inferred from the timing:
+# an attempt can only have been waiting on attempts that ended before it
+# started.  Everything is done with sorts and binary searches, so the
+# analyses stay O(n log n) in the number of call attempts.
+
+def timed_rows(calls):
+    '''
+    The indexes of the call attempts with both a start and an end time
+    '''
+    (starts, ends) = (calls['start'], calls['end'])
+    return [ i for i in range(len(calls)) if starts[i] is not None and ends[i] is not None ]
+
+def critical_path(calls):
+    '''
+    The chain of call attempts (as CallTable row indexes, in time order)
+    that bounds the workflow's wall clock time.  It starts at the attempt
+    that ended last, and each step goes back to the attempt of another
+    call that ended last before the current one started (the shards of a
+    scatter run side by side, and do not wait on each other).
+    '''
+    rows = timed_rows(calls)
+    if not rows:
+        return []
+
+    rows.sort(key=lambda i: calls['end'][i])
+    ends = [ calls['end'][i] for i in rows ]
+    names = [ calls['call'][i] for i in rows ]
+    # the first position of the run of attempts of the same call that
+    # ends at each position, to skip over the attempts of a call at once
+    run_start = list(range(len(rows)))
+    for k in range(1, len(rows)):
+        if names[k] == names[k - 1]:
+            run_start[k] = run_start[k - 1]
+
+    path = []
+    j = len(rows) - 1
+    while j >= 0:
+        i = rows[j]
+        path.append(i)
+        # never the same attempt again (e.g. zero length attempts)
+        j = min(bisect.bisect_right(ends, calls['start'][i]), j) - 1
+        if j >= 0 and names[j] == calls['call'][i]:
+            j = run_start[j] - 1
+
+    path.reverse()
+    return path
+
+def stragglers(calls, factor=3.0, min_seconds=60.0):
+    '''
+    The call attempts whose duration is more than factor times the median
+    duration of their call (and more than min_seconds above it), as
+    (row index, duration, median duration) tuples, the worst first.
+    '''
+    durations = collections.defaultdict(list)
+    for i in timed_rows(calls):
+        durations[calls['call'][i]].append((calls['end'][i] - calls['start'][i], i))
+
+    flagged = []
+    for call in durations:
+        shards = sorted(durations[call])
+        median = _median([ d for (d, i) in shards ])
+        # only the tail of the sorted durations can be stragglers
+        k = bisect.bisect_right(shards, (max(factor * median, median + min_seconds), float('inf')))
+        flagged.extend([ (i, d, median) for (d, i) in shards[k:] ])
+
+    flagged.sort(key=lambda f: f[2] - f[1])
+    return flagged
+
+# -- Job phases
+#
+# The time of every job that ran on the pipelines api, split into phases
+# by the call's start time and the events of its genomics operation (see
+# cromulent.gcloud.GenomicsOperation.milestones):
+#
+#   queued          call start -> worker assigned (cromwell and pipelines
+#                   api queues, including waiting on quota)
+#   provisioning    worker assigned -> localization started (vm boot)
+#   localization    -> user action started
+#   running         -> delocalization started
+#   delocalization  -> worker released
+
+PHASES = ('queued', 'provisioning', 'localization', 'running', 'delocalization')
+
+def job_phases(calls):
+    '''
+    A column of phase durations (in seconds) for every phase, aligned with
+    the rows of calls, which must have its operations loaded (see
+    CallTable.load_operations).  A duration is None when the job (or one
+    of the events bounding the phase) is unknown.
+    '''
+    phases = dict([ (p, [None] * len(calls)) for p in PHASES ])
+    for (i, operation) in enumerate(calls.operations):
+        if operation is None:
+            continue
+        (assigned, localization, user_action, delocalization, released) = operation.milestones
+        start = calls['start'][i]
+        bounds = (
+            start if start is not None else operation.created,
+            assigned if assigned is not None else operation.start,
+            localization,
+            user_action,
+            delocalization,
+            released if released is not None else operation.end,
+        )
+        for (k, phase) in enumerate(PHASES):
+            (begin, end) = (bounds[k], bounds[k + 1])
+            if begin is not None and end is not None:
+                phases[phase][i] = max(end - begin, 0.0)
+    return phases
+
+def phase_summary(calls, phases=None, quantiles=(0.5, 0.9)):
+    '''
+    The phase durations of the jobs aggregated by call, as a dict of call
+    -> phase -> (jobs, quantiles, max, total).  The "*" call aggregates
+    all the jobs of the workflow.
+    '''
+    if phases is None:
+        phases = job_phases(calls)
+
+    # a single pass over the columns to group the durations
+    grouped = collections.defaultdict(lambda: collections.defaultdict(list))
+    for phase in PHASES:
+        for (call, d) in zip(calls['call'], phases[phase]):
+            if d is not None:
+                grouped[call][phase].append(d)
+                grouped['*'][phase].append(d)
+
+    summary = {}
+    for call in grouped:
+        summary[call] = {}
+        for phase in PHASES:
+            durations = sorted(grouped[call][phase])
+            if not durations:
+                continue
+            summary[call][phase] = (len(durations),
+                                    tuple([ _quantile(durations, q) for q in quantiles ]),
+                                    durations[-1],
+                                    sum(durations))
+    return summary
+
+# -- Concurrent resource usage
+#
+# A sweep line over the start and end times of the genomics operations
+# gives the resources held at once, per region (as the compute engine
+# quotas are regional).  Unfinished operations are held until now.
+
+RESOURCES = ('vms', 'cores', 'preemptible_cores', 'mem_gb', 'pd_standard_gb', 'pd_ssd_gb')
+
+def concurrency(operations, now=None):
+    '''
+    The resources (see RESOURCES) held at once by the operations (None
+    entries are skipped), as a dict of region -> (timeline, peaks).  The
+    timeline is a list of (time, usage) where usage is a tuple of the
+    RESOURCES held from that time on, and peaks is a dict of resource ->
+    (peak usage, first time it was reached).
+    '''
+    if now is None:
+        now = time.time()
+
+    events = collections.defaultdict(list)
+    for op in operations:
+        if op is None:
+            continue
+        usage = _usage(op)
+        end = op.end if op.end is not None else max(now, op.start)
+        # releases sort before acquisitions at the same time
+        events[op.region].append((op.start, 1, usage))
+        events[op.region].append((end, -1, usage))
+
+    result = {}
+    for region in events:
+        region_events = events[region]
+        region_events.sort(key=lambda e: (e[0], e[1]))
+
+        held = [0] * len(RESOURCES)
+        peaks = [ (0, None) ] * len(RESOURCES)
+        timeline = []
+        for (k, (t, sign, usage)) in enumerate(region_events):
+            for (j, amount) in enumerate(usage):
+                held[j] += sign * amount
+            # a point per distinct time, once all its events are applied
+            if k + 1 < len(region_events) and region_events[k + 1][0] == t:
+                continue
+            timeline.append((t, tuple(held)))
+            for (j, amount) in enumerate(held):
+                if amount > peaks[j][0]:
+                    peaks[j] = (amount, t)
+        result[region] = (timeline, dict(zip(RESOURCES, peaks)))
+    return result
+
+def _usage(op):
+    standard = sum([ size for (size, disk_type) in op.disk_shapes if disk_type != 'pd-ssd' ])
+    ssd = sum([ size for (size, disk_type) in op.disk_shapes if disk_type == 'pd-ssd' ])
+    return (1, op.cores, op.cores if op.preemptible else 0, op.mem_gb, standard, ssd)
+
+def _quantile(values, q):
+    # nearest rank, values are sorted
+    k = int(math.ceil(q * len(values))) - 1
+    return values[min(max(k, 0), len(values) - 1)]
+
+def _median(values):
+    # values are sorted
+    n = len(values)
+    if n % 2:
+        return values[n // 2]
+    return (values[n // 2 - 1] + values[n // 2]) / 2
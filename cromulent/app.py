@@ -1,25 +1,27 @@
 # -- CromulentApp
 
-import pymysql.cursors
-from pyhocon import ConfigFactory
-import logging, os, re
+import errno, hashlib, json, logging, os, re
 import sqlite3
 
+import cromulent.utils as utils
+
 class CromulentApp(object):
     def __init__(self, config_fname=None):
         '''
         The Cromulent App with Cromwell's HOCON Config
+
+        The config is only loaded when it is first needed.  Only its
+        database section is used, and that is cached on disk (keyed by the
+        config path and modification time) so that cromwell's (large)
+        HOCON config is not re-parsed on every invocation.
         '''
-        self.config = None
+        self.config_fname = config_fname
+        self._config = None
         self.db = None
         if config_fname is not None:
             logging.getLogger('root').info('Using config at {0}'.format(config_fname))
-            config_str = ''
-            with open(config_fname, 'r') as f:
-                for l in f.readlines():
-                    if re.search("^\s*include required", l): continue
-                    config_str += l
-            self.config = ConfigFactory.parse_string(config_str)
+            if not os.path.isfile(config_fname):
+                raise IOError(errno.ENOENT, "No such file or directory", config_fname)
 
     # -- __init
 
@@ -29,22 +31,90 @@ class CromulentApp(object):
 
     # -- __del__
 
+    @property
+    def config(self):
+        if self._config is None and self.config_fname is not None:
+            self._config = self._load_config()
+        return self._config
+
+    def _config_cache_path(self):
+        key = hashlib.sha1(os.path.abspath(self.config_fname).encode('utf-8')).hexdigest()
+        return os.path.join(utils.cache_dir('config'), '{0}.json'.format(key))
+
+    def _load_config(self):
+        path = os.path.abspath(self.config_fname)
+        mtime = os.path.getmtime(path)
+        cache_path = self._config_cache_path()
+
+        cached = self._read_config_cache(cache_path)
+        if cached is not None and cached['path'] == path and cached['mtime'] == mtime:
+            logging.getLogger('root').debug('Using cached config at {0}'.format(cache_path))
+            return { 'database' : cached['database'] }
+
+        config = self._parse_config()
+        database = config.get('database', None)
+        if database is not None:
+            database = database.as_plain_ordered_dict()
+
+        # the database section has credentials, so only the user may read it
+        # (written to a temporary file first, so that concurrent invocations
+        # never see a partial cache)
+        cached = { 'path' : path, 'mtime' : mtime, 'database' : database }
+        tmp_path = '{0}.{1}.tmp'.format(cache_path, os.getpid())
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(cached, f)
+        os.rename(tmp_path, cache_path)
+
+        return { 'database' : database }
+
+    def _read_config_cache(self, cache_path):
+        # an unreadable cache is just a cache miss
+        if not os.path.exists(cache_path):
+            return None
+        try:
+            with open(cache_path, 'r') as f:
+                cached = json.load(f)
+            return cached if all([ k in cached for k in ('path', 'mtime', 'database') ]) else None
+        except (IOError, OSError, ValueError, TypeError):
+            logging.getLogger('root').debug('Ignoring unreadable config cache {0}'.format(cache_path))
+            return None
+
+    def _parse_config(self):
+        from pyhocon import ConfigFactory
+        with open(self.config_fname, 'r') as f:
+            lines = [ l for l in f if not re.search(r"^\s*include required", l) ]
+        return ConfigFactory.parse_string(''.join(lines))
+
+    def _config_get(self, key, default=None):
+        # dotted key lookups, e.g. "database.db.host"
+        value = self.config
+        for k in key.split('.'):
+            if not isinstance(value, dict) or k not in value:
+                return default
+            value = value[k]
+        return value
+
+    # -- config
+
     def connect(self):
         if self.db is not None: return self.db
 
         if self.config is None:
             raise Exception("No configuration found to connect to database!")
 
-        if self.config.get("database.db.file", None):
+        if self._config_get("database.db.file", None):
             self._connect_sqlite()
         else:
             self._connect_mysql()
         return self.db
 
     def _connect_mysql(self):
-        host = self.config.get("database.db.host", "localhost")
-        port = self.config.get("database.db.port", "3306")
-        url = self.config.get("database.db.url")
+        import pymysql.cursors
+
+        host = self._config_get("database.db.host", "localhost")
+        port = self._config_get("database.db.port", "3306")
+        url = self._config_get("database.db.url")
         if url is not None:
             #"jdbc:mysql://cromwell-mysql:3306/cromwell?rewriteBatchedStatements=true&useSSL=false"
             (host, port) = url.split("/")[2].split(":")
@@ -52,15 +122,15 @@ class CromulentApp(object):
         self.db = pymysql.connect(
             host=host,
             port=port,
-            user=self.config.get("database.db.user", "root"),
-            password=self.config.get("database.db.password"), # only thing without a default
-            db=self.config.get("database.db.password", "cromwell"),
+            user=self._config_get("database.db.user", "root"),
+            password=self._config_get("database.db.password"), # only thing without a default
+            db=self._config_get("database.db.password", "cromwell"),
             charset="utf8mb4",
             cursorclass=pymysql.cursors.DictCursor,
         )
 
     def _connect_sqlite(self):
-        self.db = sqlite3.connect( self.config.get("database.db.file") )
+        self.db = sqlite3.connect( self._config_get("database.db.file") )
 
     # -- connect
 
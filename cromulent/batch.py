@@ -0,0 +1,118 @@
+from __future__ import division
+
+import json, logging, multiprocessing, os
+
+import cromulent.cromwell as cromwell
+import cromulent.gcloud as gcloud
+import cromulent.store as cstore
+from cromulent.progress import meter
+import cromulent.utils as utils
+
+# the cromwell server and google services of a worker process
+# (see _init_worker)
+_worker = {}
+
+def estimate_batch(sources,
+                   output,
+                   host='localhost',
+                   port=8000,
+                   sku_path=None,
+                   tier_scheme='all',
+                   processes=None,
+                   index_path=None,
+                   cache=True):
+    '''
+    Estimate the cost of many workflows across a pool of processes.
+
+    A source is either a path to a workflow metadata json file or a
+    cromwell workflow id.  One JSON result per workflow is written to the
+    output (a file object) in JSON Lines format as soon as it is done.  A
+    failed workflow is written out as a result with an 'error' and does
+    not stop the batch.
+
+    Returns the per-task rollup of all the successful workflows and the
+    number of failed workflows.  Unless cache is False, the metadata of
+    finished workflows is kept in the local MetadataStore.
+    '''
+    # the workers share a memory-mapped pricing index, or else the sku
+    # list is loaded once and handed to every worker process
+    sku_list = None
+    if index_path is None:
+        logging.info("Loading the compute price list")
+        sku_list = gcloud.GoogleServices(sku_path).compute_engine_skus()
+
+    pool = multiprocessing.Pool(processes=processes,
+                                initializer=_init_worker,
+                                initargs=(host, port, sku_list, index_path, tier_scheme, cache))
+
+    rollup = {}
+    (done, failed) = (0, 0)
+    try:
+        for result in pool.imap_unordered(_estimate_worker, sources):
+            output.write(json.dumps(result, sort_keys=True))
+            output.write('\n')
+            output.flush()
+
+            done += 1
+            meter.count('workflows')
+            if 'error' in result:
+                failed += 1
+                logging.error("[{}/{}] Failed to estimate {}: {}".format(
+                    done, len(sources), result['source'], result['error']))
+            else:
+                merge_rollup(rollup, result['tasks'])
+                logging.info("[{}/{}] Estimated {}".format(done, len(sources), result['id']))
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    return (rollup, failed)
+
+def _init_worker(host, port, sku_list, index_path, tier_scheme, cache):
+    # only the parent process renders the progress
+    meter.disable()
+    gcloud.GoogleServices.get_available_compute_types = \
+        utils.memoize(gcloud.GoogleServices.get_available_compute_types)
+    store = cstore.MetadataStore() if cache else None
+    _worker['server'] = cromwell.Server(host, port, store=store)
+    _worker['google'] = gcloud.GoogleServices(sku_list=sku_list, index_path=index_path)
+    _worker['tier_scheme'] = tier_scheme
+
+def _estimate_worker(source):
+    return estimate_workflow(source,
+                             _worker['server'],
+                             _worker['google'],
+                             _worker['tier_scheme'])
+
+def estimate_workflow(source, server, google, tier_scheme='all'):
+    result = { 'source' : source }
+    try:
+        if os.path.isfile(source):
+            with open(source, 'r') as f:
+                metadata = json.load(f)
+        else:
+            metadata = server.get_workflow_metadata(source)
+        result['id'] = metadata['id']
+
+        estimator = cromwell.CostEstimator(server, google, totals_only=True)
+        result['tasks'] = estimator.calculate_cost(metadata, tier_scheme)
+        result['in-flight'] = len(estimator.in_flight)
+        result['total-cost'] = sum([ t['total-cost'] for t in result['tasks'].values() ])
+    except (Exception, SystemExit) as e:
+        # the pricing code calls sys.exit on unknown skus
+        result['error'] = '{}: {}'.format(type(e).__name__, e)
+
+    return result
+
+def merge_rollup(rollup, tasks):
+    for task in tasks:
+        if task not in rollup:
+            rollup[task] = { 'cpu': 0.0, 'mem': 0.0, 'disk': 0.0,
+                             'total-cost': 0.0, 'shards': 0, 'workflows': 0 }
+        for k in ('cpu', 'mem', 'disk', 'total-cost', 'shards'):
+            rollup[task][k] += tasks[task][k]
+        rollup[task]['workflows'] += 1
+    return rollup
@@ -0,0 +1,261 @@
+from __future__ import division
+
+import json, logging, os
+
+import cromulent.utils as utils
+
+# -- Call Table
+#
+# A workflow's metadata flattened into columns, with one row per call
+# attempt (subworkflows are expanded in place).  The columns are plain
+# python lists; a table can be exported to a NumPy structured array or an
+# Arrow table, and written to Parquet, Arrow (feather), .npy or JSON
+# Lines files.  numpy and pyarrow are optional and are imported only by
+# the exports that need them.
+
+COLUMNS = (
+    'workflow_id',     # the (sub)workflow the call belongs to
+    'call',            # fully qualified call name, e.g. "Test.Align"
+    'shard',           # shardIndex (-1 for unscattered calls)
+    'attempt',
+    'status',          # executionStatus
+    'job_id',          # the genomics operation name
+    'start',           # seconds since the epoch
+    'end',             # seconds since the epoch
+    'backend_status',
+    'return_code',
+    'stderr',
+    'error',           # the first failure message
+)
+
+# column kinds, used by the NumPy and Arrow exports
+STRING_COLUMNS = ('workflow_id', 'call', 'status', 'job_id', 'backend_status', 'stderr', 'error')
+INT_COLUMNS = ('shard', 'attempt', 'return_code')
+TIME_COLUMNS = ('start', 'end')
+
+# missing integers in the NumPy export (missing times are NaN, and
+# missing strings are empty)
+INT_NA = -(2 ** 31)
+
+class CallTable(object):
+    def __init__(self, columns=None):
+        '''
+        A columnar table of call attempts (see COLUMNS)
+        '''
+        self.columns = dict([ (c, []) for c in COLUMNS ])
+        # the metadata execution (dict) behind each row, when the table was
+        # built from metadata, for the details that are not in the columns
+        self.executions = []
+        # see load_operations
+        self.operations = None
+        if columns is not None:
+            for c in COLUMNS:
+                self.columns[c].extend(columns[c])
+            self.executions.extend([None] * len(self))
+
+    # -- __init__
+
+    @classmethod
+    def from_metadata(cls, metadata, server=None, expand=True):
+        '''
+        Flatten a workflow's metadata.  Subworkflows that are not expanded
+        in the metadata are fetched from the cromwell server, if one is
+        given, or else skipped.  If expand is False, the subworkflow calls
+        are rows of their own instead.
+        '''
+        table = cls()
+        table.add_workflow(metadata, server, expand)
+        return table
+
+    def add_workflow(self, metadata, server=None, expand=True):
+        wf_id = metadata.get('id', None)
+        for call in sorted(metadata.get('calls', {})):
+            for execution in metadata['calls'][call]:
+                if not expand:
+                    self.append(_call_row(wf_id, call, execution), execution)
+                elif 'subWorkflowMetadata' in execution:
+                    self.add_workflow(execution['subWorkflowMetadata'], server)
+                elif 'subWorkflowId' in execution:
+                    if server is None:
+                        logging.warning("Skipping the unexpanded subworkflow {}".format(
+                            execution['subWorkflowId']))
+                        continue
+                    subworkflow = server.get_workflow_metadata(execution['subWorkflowId'])
+                    self.add_workflow(subworkflow, server)
+                else:
+                    self.append(_call_row(wf_id, call, execution), execution)
+
+    def load_operations(self, google):
+        '''
+        Fetch the genomics operation (a GenomicsOperation) of every call
+        attempt that ran on the pipelines api into self.operations, which
+        is aligned with the rows (None for the other attempts).
+        '''
+        from cromulent.gcloud import GenomicsOperation
+        self.operations = []
+        for job_id in self.columns['job_id']:
+            operation = None
+            if job_id is not None and '/operations/' in job_id:
+                try:
+                    operation = GenomicsOperation(google.get_genomics_operation_metadata(job_id))
+                except (KeyError, ValueError) as e:
+                    logging.warning("Skipping the unreadable operation {}: {}".format(job_id, e))
+            self.operations.append(operation)
+        logging.info("Fetched {} genomics operations".format(
+            len([ op for op in self.operations if op is not None ])))
+        return self.operations
+
+    def append(self, row, execution=None):
+        for c in COLUMNS:
+            self.columns[c].append(row.get(c, None))
+        self.executions.append(execution)
+
+    def extend(self, other):
+        for c in COLUMNS:
+            self.columns[c].extend(other.columns[c])
+        self.executions.extend(other.executions)
+
+    def __len__(self):
+        return len(self.columns['call'])
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    def rows(self):
+        for i in range(len(self)):
+            yield dict([ (c, self.columns[c][i]) for c in COLUMNS ])
+
+    # -- exports
+
+    def to_numpy(self):
+        '''
+        A NumPy structured array with one record per call attempt
+        '''
+        import numpy
+
+        dtype = []
+        for c in COLUMNS:
+            if c in INT_COLUMNS:
+                dtype.append((c, 'i4'))
+            elif c in TIME_COLUMNS:
+                dtype.append((c, 'f8'))
+            else:
+                width = max([ len(v) for v in self.columns[c] if v is not None ] or [1])
+                dtype.append((c, 'U{}'.format(width)))
+
+        array = numpy.zeros(len(self), dtype=dtype)
+        for c in COLUMNS:
+            if c in INT_COLUMNS:
+                na = INT_NA
+            elif c in TIME_COLUMNS:
+                na = float('nan')
+            else:
+                na = ''
+            array[c] = [ na if v is None else v for v in self.columns[c] ]
+        return array
+
+    def to_arrow(self):
+        '''
+        A pyarrow Table (missing values are nulls)
+        '''
+        import pyarrow
+
+        types = {}
+        for c in COLUMNS:
+            if c in INT_COLUMNS:
+                types[c] = pyarrow.int32()
+            elif c in TIME_COLUMNS:
+                types[c] = pyarrow.float64()
+            else:
+                types[c] = pyarrow.string()
+        arrays = [ pyarrow.array(self.columns[c], type=types[c]) for c in COLUMNS ]
+        return pyarrow.Table.from_arrays(arrays, names=list(COLUMNS))
+
+    def write(self, path):
+        '''
+        Write the table in the format implied by the file extension:
+        .parquet, .arrow/.feather, .npy or .jsonl
+        '''
+        ext = os.path.splitext(path)[1].lower()
+        if ext == '.parquet':
+            import pyarrow.parquet
+            pyarrow.parquet.write_table(self.to_arrow(), path)
+        elif ext in ('.arrow', '.feather'):
+            import pyarrow.feather
+            pyarrow.feather.write_feather(self.to_arrow(), path)
+        elif ext == '.npy':
+            import numpy
+            numpy.save(path, self.to_numpy())
+        elif ext == '.jsonl':
+            with open(path, 'w') as f:
+                for row in self.rows():
+                    f.write(json.dumps(row, sort_keys=True))
+                    f.write('\n')
+        else:
+            msg = "Unknown call table format '{}' (use .parquet, .arrow, .npy or .jsonl)"
+            raise Exception(msg.format(path))
+        logging.info("Wrote {} call attempts to {}".format(len(self), path))
+
+    @classmethod
+    def read(cls, path):
+        '''
+        Read a table written by write()
+        '''
+        ext = os.path.splitext(path)[1].lower()
+        table = cls()
+        if ext in ('.parquet', '.arrow', '.feather'):
+            if ext == '.parquet':
+                import pyarrow.parquet
+                data = pyarrow.parquet.read_table(path)
+            else:
+                import pyarrow.feather
+                data = pyarrow.feather.read_table(path)
+            for c in COLUMNS:
+                table.columns[c] = data.column(c).to_pylist()
+            table.executions = [None] * len(table)
+        elif ext == '.npy':
+            import numpy
+            array = numpy.load(path)
+            for c in COLUMNS:
+                table.columns[c] = [ _from_numpy(c, v) for v in array[c].tolist() ]
+            table.executions = [None] * len(table)
+        elif ext == '.jsonl':
+            with open(path, 'r') as f:
+                for line in f:
+                    table.append(json.loads(line))
+        else:
+            msg = "Unknown call table format '{}' (use .parquet, .arrow, .npy or .jsonl)"
+            raise Exception(msg.format(path))
+        return table
+
+# -- CallTable (end)
+
+def _call_row(wf_id, call, execution):
+    failures = execution.get('failures', None) or [{}]
+    return {
+        'workflow_id'    : wf_id,
+        'call'           : call,
+        'shard'          : execution.get('shardIndex', None),
+        'attempt'        : execution.get('attempt', None),
+        'status'         : execution.get('executionStatus', None),
+        'job_id'         : execution.get('jobId', None),
+        'start'          : _timestamp(execution.get('start', None)),
+        'end'            : _timestamp(execution.get('end', None)),
+        'backend_status' : execution.get('backendStatus', None),
+        'return_code'    : execution.get('returnCode', None),
+        'stderr'         : execution.get('stderr', None),
+        'error'          : failures[0].get('message', None),
+    }
+
+def _timestamp(ts):
+    if ts is None:
+        return None
+    return utils.parse_rfc3339(ts)
+
+def _from_numpy(column, value):
+    # undo the missing value conventions of to_numpy()
+    if column in INT_COLUMNS:
+        return None if value == INT_NA else value
+    if column in TIME_COLUMNS:
+        return None if value != value else value
+    return value or None
@@ -0,0 +1,60 @@
+# -- CostCheckpoint
+
+import json, logging, os
+
+class CostCheckpoint(object):
+    def __init__(self, path, workflow_id):
+        '''
+        The priced genomics operations (by jobId) of a workflow, persisted
+        to a JSON file keyed by workflow ID so that later cost estimates
+        only need to price newly completed operations.
+        '''
+        self.path = path
+        self.workflow_id = workflow_id
+        self.workflows = {}
+        self.jobs = {}
+        if os.path.exists(path):
+            logging.info('Using cost checkpoint at {0}'.format(path))
+            with open(path, 'r') as f:
+                self.workflows = json.load(f)
+        self.jobs = self.workflows.get(workflow_id, {}).get('jobs', {})
+
+    # -- __init__
+
+    def get(self, job_id):
+        return self.jobs.get(job_id, None)
+
+    def record(self, job_id, cost):
+        self.jobs[job_id] = {
+            'cpu'  : cost['cpu'],
+            'mem'  : cost['mem'],
+            'disk' : cost['disk'],
+        }
+
+    def __contains__(self, job_id):
+        return job_id in self.jobs
+
+    def __len__(self):
+        return len(self.jobs)
+
+    # -- record
+
+    def save(self):
+        # other estimates may share the checkpoint file, so only this
+        # workflow's entry is replaced in the latest version of the file
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                self.workflows = json.load(f)
+        self.workflows[self.workflow_id] = { 'jobs' : self.jobs }
+
+        # write to a temporary file first so that an interrupted run never
+        # leaves behind a truncated checkpoint
+        tmp_path = '{0}.{1}.tmp'.format(self.path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            json.dump(self.workflows, f, sort_keys=True)
+        os.rename(tmp_path, self.path)
+        logging.info('Saved {0} priced jobs to cost checkpoint {1}'.format(len(self.jobs), self.path))
+
+    # -- save
+
+# -- CostCheckpoint (end)
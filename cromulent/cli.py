@@ -6,12 +6,23 @@ import click
 
 from cromulent.version import __version__
 
-import cromulent.app as app
-import cromulent.cromwell as cromwell
-import cromulent.gcloud as gcloud
-import cromulent.sqlrun as sqlrun
 import cromulent.utils as utils
-import cromulent.report as creport
+
+# NOTE: the other cromulent modules (and their heavy third-party
+#       dependencies, like the google api client, pymysql or pyhocon)
+#       are imported by the subcommands that need them.  This keeps the
+#       startup time of simple subcommands like `status` low.
+
+class ThirdPartyLogFilter(logging.Filter):
+    # The third-party modules are imported on demand, after the logging
+    # has been set up, so their loggers cannot be silenced up front.
+    # Instead their records are filtered out below this level.
+    level = logging.CRITICAL
+
+    def filter(self, record):
+        if record.name == 'root' or record.name.startswith('cromulent'):
+            return True
+        return record.levelno >= self.level
 
 logging.basicConfig(
     format='[%(asctime)s] : %(name)s : %(levelname)s : %(message)s',
@@ -19,15 +30,54 @@ logging.basicConfig(
 )
 
 # suppress the loggers from the other third-party modules
-for name in logging.Logger.manager.loggerDict.keys():
-    logging.getLogger(name).setLevel(logging.CRITICAL)
+third_party_log_filter = ThirdPartyLogFilter()
+for handler in logging.getLogger().handlers:
+    handler.addFilter(third_party_log_filter)
+
+class LazyChoice(click.Choice):
+    # a click.Choice whose choices are looked up only when the option is
+    # actually used (or its help is shown)
+    def __init__(self, choices_fn, case_sensitive=True):
+        self.choices_fn = choices_fn
+        self.case_sensitive = case_sensitive
+        self._choices = None
+
+    @property
+    def choices(self):
+        if self._choices is None:
+            self._choices = list(self.choices_fn())
+        return self._choices
+
+def _workflow_report_types():
+    import cromulent.report as creport
+    return creport.workflow_report_types()
 
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 
 @click.group(context_settings=CONTEXT_SETTINGS)
 @click.version_option(version=__version__)
+@click.option('--no-daemon', type=click.BOOL, is_flag=True, default=False,
+              help='do not forward to a running cromulent daemon (see serve)')
+@click.option('--no-cache', type=click.BOOL, is_flag=True, default=False,
+              help='do not use the local store of finished workflow metadata')
+@click.option('--no-progress', type=click.BOOL, is_flag=True, default=False,
+              help='do not show the progress line on stderr')
+@click.option('--progress-json', type=click.Path(), default=None,
+              help='Path to write progress snapshots to (in JSON Lines format)')
+@click.option('--metrics', 'metrics_path', type=click.Path(), default=None,
+              help='Path to write a summary of the call latencies to at exit '
+                   '(a Prometheus textfile if it ends with .prom, or else JSON)')
+@click.option('--trace', 'trace_path', type=click.Path(), default=None,
+              help='Path to write the trace spans of the command to at exit '
+                   '(OTLP JSON if it ends with .otlp.json, or else a Chrome trace)')
+@click.option('--profile', 'profile_path', type=click.Path(), default=None,
+              help='Path to write a cpu profile (cProfile pstats) of the command to')
+@click.option('--memprofile', 'memprofile_path', type=click.Path(), default=None,
+              help='Path to write the top allocation sites and the peak memory '
+                   '(tracemalloc) of the command to')
 @click.pass_context
-def cli(ctx):
+def cli(ctx, no_daemon, no_cache, no_progress, progress_json, metrics_path,
+        trace_path, profile_path, memprofile_path):
     '''
     A collection of cromwell helpers.
 
@@ -38,7 +88,13 @@ def cli(ctx):
     # to make this script/module behave nicely with unix pipes
     # http://newbebweb.blogspot.com/2012/02/python-head-ioerror-errno-32-broken.html
     signal.signal(signal.SIGPIPE, signal.SIG_DFL)
-    ctx.obj = app.CromulentApp(os.environ.get('CROMULENT_CONFIG', None))
+    # the commands that are measured (metrics, traces or profiles) run locally
+    measured = any([ p is not None for p in (metrics_path, trace_path, profile_path, memprofile_path) ])
+    ctx.obj = { 'no_daemon' : no_daemon, 'no_cache' : no_cache, 'measured' : measured }
+    _setup_profiles(ctx, profile_path, memprofile_path)
+    _setup_progress(ctx, no_progress, progress_json)
+    _setup_metrics(ctx, metrics_path)
+    _setup_tracing(ctx, trace_path)
 
 
 # -- Subcommands ---------------------------------------------------------------
@@ -46,7 +102,8 @@ def cli(ctx):
              short_help="retrieve sku pricing info from the Google Cloud API")
 @click.option('--output', type=click.Path(), default=None,
               help='Path to dump the raw JSON pricing information to')
-def sku_list(output, raw):
+def sku_list(output):
+    import cromulent.gcloud as gcloud
     google = gcloud.GoogleServices()
     data = google.compute_engine_skus()
     skulist = json.dumps(data, indent=4, sort_keys=True)
@@ -56,6 +113,30 @@ def sku_list(output, raw):
     else:
         print(skulist)
 
+@cli.command(name='pricing-index',
+             short_help="compile the pricing info into a memory-mappable index file")
+@click.option('--sku-list', type=click.Path(exists=True), default=None,
+              help='Path to an existing sku pricing info json file.')
+@click.option('--zone', type=click.STRING, multiple=True,
+              help='zone to include the machine type catalog of (may be repeated)')
+@click.option('--project', type=click.STRING, default=None,
+              help='google project of the machine type catalogs [default: gcloud default project]')
+@click.option('--output', type=click.Path(), required=True,
+              help='Path to write the pricing index to')
+def pricing_index(sku_list, zone, project, output):
+    import cromulent.gcloud as gcloud
+    import cromulent.pricing as pricing
+    google = gcloud.GoogleServices(sku_list)
+    if project is None:
+        project = google.project
+
+    catalogs = {}
+    for z in zone:
+        logging.info("Obtaining the machine types of {} / {}".format(project, z))
+        catalogs[(z, project)] = google.get_available_compute_types(z, project)
+
+    pricing.write_pricing_index(output, google.compute_engine_skus(), catalogs)
+
 @cli.command(short_help='retrieve metadata for workflow-id')
 @click.option('--output', type=click.Path(), default=None,
               help='Path to dump the raw JSON metadata information to')
@@ -65,13 +146,10 @@ def sku_list(output, raw):
               help='cromwell web server port')
 @click.argument('workflow-id')
 def metadata(workflow_id, output, host, port):
-    cromwell.Server.get_workflow_metadata = \
-        utils.memoize(cromwell.Server.get_workflow_metadata)
-    server = cromwell.Server(host, port)
-    if not server.is_accessible():
-        msg = "Could not access the cromwell server!  Please ensure it is up!"
-        raise Exception(msg)
-    metadata = server.get_workflow_metadata(workflow_id)
+    metadata = _forward_to_daemon('metadata', workflow_id=workflow_id, host=host, port=port)
+    if metadata is None:
+        server = _get_cromwell_server(host, port)
+        metadata = server.get_workflow_metadata(workflow_id)
     pretty_metadata = json.dumps(metadata, indent=4, sort_keys=True)
     if output:
         with open(output, 'w') as f:
@@ -88,13 +166,11 @@ def metadata(workflow_id, output, host, port):
               help='cromwell web server port')
 @click.argument('workflow-id')
 def metadata_lite(workflow_id, output, host, port):
-    cromwell.Server.get_workflow_metadata_lite = \
-        utils.memoize(cromwell.Server.get_workflow_metadata_lite)
-    server = cromwell.Server(host, port)
-    if not server.is_accessible():
-        msg = "Could not access the cromwell server!  Please ensure it is up!"
-        raise Exception(msg)
-    metadata = server.get_workflow_metadata_lite(workflow_id)
+    metadata = _forward_to_daemon('metadata', workflow_id=workflow_id,
+                                  host=host, port=port, lite=True)
+    if metadata is None:
+        server = _get_cromwell_server(host, port)
+        metadata = server.get_workflow_metadata_lite(workflow_id)
     pretty_metadata = json.dumps(metadata, indent=4, sort_keys=True)
     if output:
         with open(output, 'w') as f:
@@ -108,6 +184,8 @@ def metadata_lite(workflow_id, output, host, port):
                     'cromwell workflow metadata json file.'))
 @click.option('--sku-list', type=click.Path(exists=True), default=None,
               help='Path to an existing sku pricing info json file.')
+@click.option('--pricing-index', type=click.Path(exists=True), default=None,
+              help='Path to an existing pricing index (see pricing-index).')
 @click.option('--import-raw-cost-data', type=click.Path(exists=True),
               default=None,
               help='Import prior calculated raw cost data (in JSON format)')
@@ -127,10 +205,22 @@ def metadata_lite(workflow_id, output, host, port):
               help='output report choice')
 @click.option('--nanos', type=click.BOOL, is_flag=True, default=False,
               help='display costs in nano dollars')
+@click.option('--checkpoint', type=click.Path(), default=None,
+              help=('Path to a cost checkpoint file. Previously priced jobs '
+                    'are read from it and newly priced jobs are added to it.'))
+@click.option('--totals-only', type=click.BOOL, is_flag=True, default=False,
+              help=('only keep the per-task totals and shard counts '
+                    '(constant memory for very large workflows)'))
+@click.option('--shard-rows', type=click.Path(), default=None,
+              help='Path to stream the per-shard costs to (in JSON Lines format)')
+@click.option('--stream', type=click.BOOL, is_flag=True, default=False,
+              help=('write the per-shard costs to stdout (in JSON Lines format) '
+                    'as they are priced, instead of the report'))
 @click.option('-v', '--verbose', count=True,
               help='verbosity level')
 def estimate(metadata,
              sku_list,
+             pricing_index,
              import_raw_cost_data,
              workflow_id,
              host,
@@ -138,15 +228,26 @@ def estimate(metadata,
              tier_scheme,
              report,
              nanos,
+             checkpoint,
+             totals_only,
+             shard_rows,
+             stream,
              verbose):
+    import cromulent.report as creport
     if verbose:
         _setup_logging_level(verbose)
 
+    if stream and (shard_rows or import_raw_cost_data):
+        sys.exit("[err] '--stream' can't be combined with '--shard-rows' or '--import-raw-cost-data'!")
+
     # go straight to the report generation
     if import_raw_cost_data:
         with open(import_raw_cost_data, 'r') as f:
             costs = json.load(f)
-        report_fn(costs['id'], costs['tasks'])
+        if report == 'raw':
+            creport.raw_cost_report(costs['id'], costs['tasks'])
+        else:
+            creport.standard_cost_report(costs['id'], costs['tasks'], nanos)
         sys.exit(0)
 
     # otherwise prepare to cost calcuate and then report
@@ -154,20 +255,288 @@ def estimate(metadata,
         sys.exit(("[err] Please specify either a "
                   "'--metadata' or '--workflow-id' option!"))
 
+    if stream:
+        # the costs are written as they are priced, so nothing is forwarded
+        # to the daemon
+        (costs, in_flight) = estimate_workflow_cost(
+            metadata, workflow_id, sku_list, host, port, tier_scheme,
+            checkpoint, True, None, pricing_index, stream=True
+        )
+        if in_flight:
+            logging.warning("{} jobs are still in flight (not priced)".format(len(in_flight)))
+        sys.exit(0)
+
     wf_id = _identify_workflow_id(metadata) if metadata else workflow_id
-    costs = estimate_workflow_cost(
-        metadata,
-        workflow_id,
-        sku_list,
-        host,
-        port,
-        tier_scheme
-    )
+    # the daemon runs on the same host, so it can use the same paths
+    abspath = lambda p: os.path.abspath(p) if p else p
+    result = _forward_to_daemon('estimate',
+                                metadata_path=abspath(metadata),
+                                workflow_id=workflow_id,
+                                sku_path=abspath(sku_list),
+                                host=host,
+                                port=port,
+                                tier_scheme=tier_scheme,
+                                checkpoint_path=abspath(checkpoint),
+                                totals_only=totals_only,
+                                shard_rows_path=abspath(shard_rows),
+                                index_path=abspath(pricing_index))
+    if result is not None:
+        (costs, in_flight) = (result['tasks'], result['in-flight'])
+    else:
+        (costs, in_flight) = estimate_workflow_cost(
+            metadata,
+            workflow_id,
+            sku_list,
+            host,
+            port,
+            tier_scheme,
+            checkpoint,
+            totals_only,
+            shard_rows,
+            pricing_index
+        )
 
     if report == 'raw':
-        creport.raw_cost_report(wf_id, costs)
+        creport.raw_cost_report(wf_id, costs, in_flight)
     else:
         creport.standard_cost_report(wf_id, costs, nanos)
+        creport.in_flight_report(in_flight)
+
+@cli.command(name='estimate-batch',
+             short_help="estimate ideal cost of many workflows")
+@click.option('--sources', type=click.Path(exists=True), default=None,
+              help=('Path to a file of workflow-ids or metadata json file '
+                    'paths (one per line)'))
+@click.option('--sku-list', type=click.Path(exists=True), default=None,
+              help='Path to an existing sku pricing info json file.')
+@click.option('--pricing-index', type=click.Path(exists=True), default=None,
+              help=('Path to an existing pricing index (see pricing-index). '
+                    'It is memory-mapped and shared by all the workers.'))
+@click.option('--host', type=click.STRING, default='localhost',
+              help='cromwell web server host')
+@click.option('--port', type=click.INT, default=8000,
+              help='cromwell web server port')
+@click.option('--tier-scheme',
+              type=click.Choice(['all', 'no-free', 'top-tier', 'max-price']),
+              default='all',
+              help='tiered pricing handling scheme')
+@click.option('--processes', type=click.INT, default=None,
+              help='number of worker processes [default: number of cpus]')
+@click.option('--output', type=click.Path(), required=True,
+              help='Path to write the per-workflow results to (in JSON Lines format)')
+@click.option('--report', type=click.Choice(['standard', 'raw']),
+              default='standard',
+              help='per-task rollup report choice')
+@click.option('--nanos', type=click.BOOL, is_flag=True, default=False,
+              help='display costs in nano dollars')
+@click.option('-v', '--verbose', count=True,
+              help='verbosity level')
+@click.argument('workflows', nargs=-1)
+def estimate_batch(sources,
+                   sku_list,
+                   pricing_index,
+                   host,
+                   port,
+                   tier_scheme,
+                   processes,
+                   output,
+                   report,
+                   nanos,
+                   verbose,
+                   workflows):
+    '''
+    Estimate the cost of each of the WORKFLOWS (cromwell workflow-ids or
+    metadata json files) and report the per-task rollup.
+    '''
+    import cromulent.batch as batch
+    import cromulent.report as creport
+
+    if verbose:
+        _setup_logging_level(verbose)
+
+    workflows = list(workflows)
+    if sources:
+        with open(sources, 'r') as f:
+            workflows.extend([ l.strip() for l in f if l.strip() ])
+
+    if not workflows:
+        sys.exit("[err] Please specify workflows to estimate!")
+
+    # the worker processes set up their own cromwell servers
+    if not all([ os.path.isfile(w) for w in workflows ]):
+        _check_cromwell_server(host, port)
+
+    with open(output, 'w') as f:
+        (rollup, failed) = batch.estimate_batch(workflows,
+                                                f,
+                                                host=host,
+                                                port=port,
+                                                sku_path=sku_list,
+                                                index_path=pricing_index,
+                                                tier_scheme=tier_scheme,
+                                                processes=processes,
+                                                cache=not _get_cli_option('no_cache'))
+
+    if failed:
+        logging.warning("Failed to estimate {} of {} workflows (see {})".format(
+            failed, len(workflows), output))
+
+    label = '{} workflows'.format(len(workflows) - failed)
+    if report == 'raw':
+        creport.raw_cost_report(label, rollup)
+    else:
+        creport.standard_cost_report(label, rollup, nanos)
+
+@cli.command(name='what-if',
+             short_help="reprice a workflow under other pricing scenarios")
+@click.option('--metadata', 'metadata_path', type=click.Path(exists=True), default=None,
+              help=('Path to an existing (not-raw) '
+                    'cromwell workflow metadata json file.'))
+@click.option('--workflow-id', type=click.STRING, default=None,
+              help=('A cromwell workflow-id to fetch metadata from '
+                    'the cromwell server'))
+@click.option('--host', type=click.STRING, default='localhost',
+              help='cromwell web server host')
+@click.option('--port', type=click.INT, default=8000,
+              help='cromwell web server port')
+@click.option('--sku-list', type=click.Path(exists=True), default=None,
+              help='Path to an existing sku pricing info json file.')
+@click.option('--pricing-index', type=click.Path(exists=True), default=None,
+              help='Path to an existing pricing index (see pricing-index).')
+@click.option('--tier-scheme', 'tier_schemes', multiple=True,
+              type=click.Choice(['all', 'no-free', 'top-tier', 'max-price']),
+              help='tiered pricing handling schemes [default: all]')
+@click.option('--region', 'regions', multiple=True, type=click.STRING,
+              help='regions (e.g. us-east1, or as-run) [default: as-run]')
+@click.option('--preemptible', 'preemptible', multiple=True,
+              type=click.Choice(['as-run', 'yes', 'no']),
+              help='preemptible VMs [default: as-run]')
+@click.option('--family', 'families', multiple=True,
+              type=click.Choice(['as-run', 'custom', 'n1-standard', 'n1-highmem', 'n1-highcpu']),
+              help='machine families [default: as-run]')
+@click.option('--nanos', type=click.BOOL, is_flag=True, default=False,
+              help='display costs in nano dollars')
+@click.option('--format', 'fmt', type=click.Choice(['simple', 'tsv', 'jsonl']),
+              default='simple',
+              help='table output format')
+@click.option('-v', '--verbose', count=True,
+              help='verbosity level')
+def what_if(metadata_path, workflow_id, host, port, sku_list, pricing_index,
+            tier_schemes, regions, preemptible, families, nanos, fmt, verbose):
+    '''
+    Price the finished jobs of a workflow under every combination of the
+    given tier schemes, regions, preemptibility and machine families.
+    The genomics operations are fetched once and repriced for all the
+    scenarios.
+    '''
+    import cromulent.gcloud as gcloud
+    import cromulent.report as creport
+    import cromulent.whatif as whatif
+    if verbose:
+        _setup_logging_level(verbose)
+
+    google = gcloud.GoogleServices(sku_list, index_path=pricing_index)
+    (metadata, calls) = _get_workflow_operations(metadata_path, workflow_id, host, port, google)
+    operation_set = whatif.OperationSet(google, calls.operations)
+
+    as_run = lambda values: [ None if v == 'as-run' else v for v in values ]
+    grid = whatif.scenarios(
+        tier_schemes=tier_schemes or ('all',),
+        regions=as_run(regions) or (whatif.AS_RUN,),
+        preemptible=[ None if p == 'as-run' else p == 'yes' for p in preemptible ] or (whatif.AS_RUN,),
+        families=as_run(families) or (whatif.AS_RUN,)
+    )
+    results = whatif.compare(operation_set, grid)
+    creport.what_if_report(metadata['id'], operation_set.count, results, nanos, fmt)
+
+@cli.command(short_help="recommend the cheapest machine shapes for a workflow's tasks")
+@click.option('--metadata', 'metadata_path', type=click.Path(exists=True), default=None,
+              help=('Path to an existing (not-raw) '
+                    'cromwell workflow metadata json file.'))
+@click.option('--workflow-id', type=click.STRING, default=None,
+              help=('A cromwell workflow-id to fetch metadata from '
+                    'the cromwell server'))
+@click.option('--host', type=click.STRING, default='localhost',
+              help='cromwell web server host')
+@click.option('--port', type=click.INT, default=8000,
+              help='cromwell web server port')
+@click.option('--sku-list', type=click.Path(exists=True), default=None,
+              help='Path to an existing sku pricing info json file.')
+@click.option('--pricing-index', type=click.Path(exists=True), default=None,
+              help=('Path to an existing pricing index (see pricing-index) '
+                    'with the machine type catalogs of the zones.'))
+@click.option('--nanos', type=click.BOOL, is_flag=True, default=False,
+              help='display costs in nano dollars')
+@click.option('--format', 'fmt', type=click.Choice(['simple', 'tsv', 'jsonl']),
+              default='simple',
+              help='table output format')
+@click.option('-v', '--verbose', count=True,
+              help='verbosity level')
+def shapes(metadata_path, workflow_id, host, port, sku_list, pricing_index, nanos, fmt, verbose):
+    '''
+    For every task of a workflow, find the cheapest predefined or custom
+    machine shape with at least the cores and memory its jobs ran with,
+    and report the projected cpu and memory savings.
+    '''
+    import cromulent.gcloud as gcloud
+    import cromulent.report as creport
+    import cromulent.shapes as cshapes
+    if verbose:
+        _setup_logging_level(verbose)
+
+    gcloud.GoogleServices.get_available_compute_types = \
+        utils.memoize(gcloud.GoogleServices.get_available_compute_types)
+    google = gcloud.GoogleServices(sku_list, index_path=pricing_index)
+    (metadata, calls) = _get_workflow_operations(metadata_path, workflow_id, host, port, google)
+    tasks = cshapes.recommend(google, calls)
+    creport.shapes_report(metadata['id'], tasks, nanos, fmt)
+
+@cli.command(name='call-table', short_help="export the call attempts of workflows as a table")
+@click.option('--sources', type=click.Path(exists=True), default=None,
+              help=('Path to a file of workflow-ids or metadata json file '
+                    'paths (one per line)'))
+@click.option('--host', type=click.STRING, default='localhost',
+              help='cromwell web server host')
+@click.option('--port', type=click.INT, default=8000,
+              help='cromwell web server port')
+@click.option('--output', type=click.Path(), required=True,
+              help=('Path to write the table to '
+                    '(.parquet, .arrow, .npy or .jsonl)'))
+@click.option('-v', '--verbose', count=True,
+              help='verbosity level')
+@click.argument('workflows', nargs=-1)
+def call_table(sources, host, port, output, verbose, workflows):
+    '''
+    Flatten the metadata of workflows (workflow-ids or metadata json
+    files), including their subworkflows, into one columnar table with
+    a row per call attempt.  Parquet and Arrow output need pyarrow, and
+    .npy output needs numpy.
+    '''
+    import cromulent.calltable as calltable
+    if verbose:
+        _setup_logging_level(verbose)
+
+    workflows = list(workflows)
+    if sources:
+        with open(sources, 'r') as f:
+            workflows.extend([ l.strip() for l in f if l.strip() ])
+
+    if not workflows:
+        sys.exit("[err] Please specify workflows to export!")
+
+    server = None
+    if not all([ os.path.isfile(w) for w in workflows ]):
+        server = _get_cromwell_server(host, port, memoize=False)
+
+    table = calltable.CallTable()
+    for w in workflows:
+        if os.path.isfile(w):
+            metadata = _get_metadata_json(metadata_path=w)
+        else:
+            metadata = server.get_workflow_metadata(w)
+        table.add_workflow(metadata, server)
+
+    table.write(output)
 
 @cli.command(short_help="get workflow status")
 @click.option('--host', type=click.STRING, default='localhost',
@@ -176,11 +545,11 @@ def estimate(metadata,
               help='cromwell web server port')
 @click.argument('workflow-id', type=click.STRING)
 def status(workflow_id, host, port):
-    server = cromwell.Server(host, port)
-    if not server.is_accessible():
-        msg = "Could not access the cromwell server!  Please ensure it is up!"
-        raise Exception(msg)
-    status = server.get_workflow_status(workflow_id)
+    import cromulent.report as creport
+    status = _forward_to_daemon('status', workflow_id=workflow_id, host=host, port=port)
+    if status is None:
+        server = _get_cromwell_server(host, port)
+        status = server.get_workflow_status(workflow_id)
     creport.display_workflow_status(workflow_id, status)
 
 @cli.command(name='execution-status', short_help="get workflow execution status")
@@ -190,10 +559,8 @@ def status(workflow_id, host, port):
         help='cromwell web server port')
 @click.argument('workflow-id', type=click.STRING)
 def execution_status(workflow_id, host, port):
-    server = cromwell.Server(host, port)
-    if not server.is_accessible():
-        msg = "Could not access the cromwell server!  Please ensure it is up!"
-        raise Exception(msg)
+    import cromulent.report as creport
+    server = _get_cromwell_server(host, port)
     status_summary = server.get_workflow_execution_status(workflow_id)
     creport.display_workflow_execution_status(workflow_id, status_summary)
 
@@ -204,10 +571,7 @@ def execution_status(workflow_id, host, port):
               help='cromwell web server port')
 @click.argument('workflow-id', type=click.STRING)
 def outputs(workflow_id, host, port):
-    server = cromwell.Server(host, port)
-    if not server.is_accessible():
-        msg = "Could not access the cromwell server!  Please ensure it is up!"
-        raise Exception(msg)
+    server = _get_cromwell_server(host, port)
     metadata = server.get_workflow_input_outputs(workflow_id)
     pretty_metadata = json.dumps(metadata, indent=4, sort_keys=True)
     print(pretty_metadata)
@@ -219,6 +583,7 @@ def outputs(workflow_id, host, port):
               help='cromwell web server port')
 @click.argument('workflow-id', type=click.STRING)
 def abort(workflow_id, host, port):
+    import cromulent.cromwell as cromwell
     server = cromwell.Server(host, port)
     if not server.is_accessible():
         msg = "Could not access the cromwell server!  Please ensure it is up!"
@@ -241,11 +606,14 @@ def bq():
               help='cromwell web server host')
 @click.option('--port', type=click.INT, default=8000,
               help='cromwell web server port')
-@click.option('--report', type=click.Choice(creport.workflow_report_types()),
+@click.option('--report', type=LazyChoice(_workflow_report_types),
               default='summary',
               help='output report choices')
 @click.option('--opts', type=click.STRING, default=None,
               help='specialized report options')
+@click.option('--format', 'fmt', type=click.Choice(['simple', 'tsv', 'jsonl']),
+              default='simple',
+              help='table output format')
 @click.option('-v', '--verbose', count=True,
               help='verbosity level')
 def wf(metadata_path,
@@ -254,7 +622,9 @@ def wf(metadata_path,
        port,
        report,
        opts,
+       fmt,
        verbose):
+    import cromulent.report as creport
     if verbose:
         _setup_logging_level(verbose)
 
@@ -263,6 +633,13 @@ def wf(metadata_path,
         sys.exit(("[err] Please specify either a "
                   "'--metadata' or '--workflow-id' option!"))
 
+    if metadata_path is None:
+        text = _forward_to_daemon('report', report=report, workflow_id=workflow_id,
+                                  host=host, port=port, opts=opts, fmt=fmt)
+        if text is not None:
+            sys.stdout.write(text)
+            return
+
     metadata = _get_metadata_json(
         metadata_path=metadata_path,
         workflow_id=workflow_id,
@@ -270,16 +647,110 @@ def wf(metadata_path,
         port=port
     )
 
-    creport.workflow_report(report, metadata, opts)
+    google = None
+    if report in creport.operation_report_types():
+        import cromulent.gcloud as gcloud
+        # the operations reports need no pricing information
+        google = gcloud.GoogleServices(sku_list={})
+
+    creport.workflow_report(report, metadata, opts, fmt, google=google)
+
+@cli.command(short_help="run a daemon that keeps cromulent's caches warm")
+@click.option('--daemon-port', type=click.INT, default=0,
+              help='localhost port to listen on [default: any free port]')
+@click.option('--sku-list', type=click.Path(exists=True), default=None,
+              help='Path to an existing sku pricing info json file to preload.')
+@click.option('--pricing-index', type=click.Path(exists=True), default=None,
+              help='Path to an existing pricing index to preload.')
+@click.option('-v', '--verbose', count=True,
+              help='verbosity level')
+def serve(daemon_port, sku_list, pricing_index, verbose):
+    '''
+    Run a long-running daemon on localhost that keeps the cromwell
+    sessions, google services, pricing information and machine type
+    catalogs warm.  While it is running, the metadata, metadata-lite,
+    status, estimate and wf subcommands are forwarded to it.
+    '''
+    import cromulent.daemon as daemon
+    if verbose:
+        _setup_logging_level(verbose)
+
+    # the daemon serves many commands at once
+    from cromulent.progress import meter
+    meter.disable()
+
+    d = daemon.Daemon(store=_get_metadata_store())
+    if sku_list or pricing_index:
+        d.get_google(os.path.abspath(sku_list) if sku_list else None,
+                     os.path.abspath(pricing_index) if pricing_index else None)
+    d.serve(daemon_port)
+
+@cli.command(name='fake-server',
+             short_help="serve synthetic workflows as fake cromwell and google servers")
+@click.option('--host', type=click.STRING, default='localhost',
+              help='host to listen on')
+@click.option('--port', type=click.INT, default=8000,
+              help='port to listen on')
+@click.option('--shards', type=click.INT, default=1000,
+              help='number of shards of the workflow')
+@click.option('--calls', type=click.INT, default=10,
+              help='number of calls of each (sub)workflow')
+@click.option('--subworkflow-depth', type=click.INT, default=0,
+              help='number of nested subworkflows')
+@click.option('--cache-ratio', type=click.FLOAT, default=0.0,
+              help='fraction of the shards that are call cached')
+@click.option('--failure-ratio', type=click.FLOAT, default=0.0,
+              help='fraction of the shards that failed once before succeeding')
+@click.option('--seed', type=click.INT, default=0,
+              help='seed of the synthetic workflow and of the injected latencies and errors')
+@click.option('--latency', type=click.FLOAT, default=0.0,
+              help='seconds to delay every request by')
+@click.option('--jitter', type=click.FLOAT, default=0.0,
+              help='up to how many more seconds to delay every request by, at random')
+@click.option('--error-rate', type=click.FLOAT, default=0.0,
+              help='fraction of the requests that fail (with a 503)')
+@click.option('-v', '--verbose', count=True,
+              help='verbosity level')
+def fake_server(host, port, shards, calls, subworkflow_depth, cache_ratio, failure_ratio,
+                seed, latency, jitter, error_rate, verbose):
+    '''
+    Serve a synthetic workflow (its metadata, genomics operations, sku
+    list and machine types) as a fake cromwell server and fake google
+    apis, with optional latency and errors, for offline load tests.
+    '''
+    import cromulent.fakeserver as fakeserver
+    import cromulent.synthetic as synthetic
+    if verbose:
+        _setup_logging_level(verbose)
+
+    from cromulent.progress import meter
+    meter.disable()
+
+    workflow = synthetic.SyntheticWorkflow(
+        shards=shards, calls=calls, subworkflow_depth=subworkflow_depth,
+        cache_ratio=cache_ratio, failure_ratio=failure_ratio,
+        expand_subworkflows=False, seed=seed)
+    server = fakeserver.FakeServer(workflow, host=host, port=port, latency=latency,
+                                   jitter=jitter, error_rate=error_rate, seed=seed)
+    print("workflow id : {} ({} operations)".format(workflow.metadata['id'], workflow.jobs))
+    print("cromwell    : --host {} --port {}".format(server.host, server.port))
+    print("google apis : export CROMULENT_GOOGLE_API_ROOT={}".format(server.url))
+    sys.stdout.flush()
+    server.serve()
 
 ## SQL ##
 @cli.command(name='sql',
              short_help="directly query the cromwell database")
+@click.option('--format', 'fmt', type=click.Choice(['simple', 'tsv', 'jsonl']),
+              default='simple',
+              help='table output format')
 @click.argument('sql-file', type=click.Path(), required=True)
-@click.pass_obj
-def sku_list(app, sql_file):
-    db = app.connect()
-    sqlrun.run(db, sql_file)
+def sql(sql_file, fmt):
+    import cromulent.app as app
+    import cromulent.sqlrun as sqlrun
+    theapp = app.CromulentApp(os.environ.get('CROMULENT_CONFIG', None))
+    db = theapp.connect()
+    sqlrun.run(db, sql_file, fmt)
 
 # -- Helper functions ----------------------------------------------------------
 def _identify_workflow_id(metadata_json):
@@ -303,8 +774,88 @@ def _setup_logging_level(verbosity_level):
 
 def _enable_third_party_module_logs(level):
     # re-enable the loggers from the other third-party modules
-    for name in logging.Logger.manager.loggerDict.keys():
-        logging.getLogger(name).setLevel(level)
+    third_party_log_filter.level = level
+
+def _setup_profiles(ctx, profile_path, memprofile_path):
+    import cromulent.profiling as profiling
+    profiles = []
+    if memprofile_path is not None:
+        profiles.append(profiling.MemoryProfile(memprofile_path))
+    if profile_path is not None:
+        profiles.append(profiling.CpuProfile(profile_path))
+    for profile in profiles:
+        profile.start()
+
+    def close():
+        # the cpu profile is stopped first, so that its own allocations
+        # are not in the memory profile
+        for profile in reversed(profiles):
+            profile.stop()
+    ctx.call_on_close(close)
+
+def _setup_progress(ctx, no_progress, progress_json):
+    from cromulent.progress import meter
+    # the live line is only shown on a terminal
+    live = sys.stderr if not no_progress and sys.stderr.isatty() else None
+    json_out = open(progress_json, 'w') if progress_json else None
+    meter.enable(live=live, json_out=json_out)
+    if live is not None:
+        # the log records go to stderr too
+        for handler in logging.getLogger().handlers:
+            if getattr(handler, 'stream', None) is live:
+                meter.clear_around(handler)
+
+    def close():
+        meter.close()
+        if json_out is not None:
+            json_out.close()
+    ctx.call_on_close(close)
+
+def _setup_metrics(ctx, metrics_path):
+    if metrics_path is None:
+        return
+    from cromulent import metrics
+    metrics.registry.enable()
+    ctx.call_on_close(lambda: metrics.registry.write(metrics_path))
+
+def _setup_tracing(ctx, trace_path):
+    if trace_path is None:
+        return
+    from cromulent.tracing import tracer
+    tracer.enable()
+    ctx.call_on_close(lambda: tracer.write(trace_path))
+
+def _get_cli_option(name):
+    ctx = click.get_current_context(silent=True)
+    if ctx is None or ctx.find_root().obj is None:
+        return False
+    return ctx.find_root().obj.get(name, False)
+
+def _forward_to_daemon(operation, **params):
+    # the result of the operation from a running daemon, or None if the
+    # command should run locally instead.  A daemon has its own metadata
+    # store, so --no-cache bypasses it too, and a command is only measured
+    # (--metrics, --trace, --profile, --memprofile) when it runs locally.
+    if _get_cli_option('no_daemon') or _get_cli_option('no_cache') or _get_cli_option('measured'):
+        return None
+    import cromulent.daemon as daemon
+    client = daemon.Client.find()
+    if client is None:
+        return None
+    try:
+        return client.request(operation, **params)
+    except daemon.DaemonUnavailable as e:
+        logging.warning("{} -- running locally instead".format(e))
+        return None
+    except daemon.DaemonTimeout as e:
+        # not run again locally, as the daemon may still be working on it
+        sys.exit('[err] {}'.format(e))
+
+def _get_metadata_store():
+    if _get_cli_option('no_cache'):
+        return None
+    import cromulent.store as cstore
+    return cstore.MetadataStore()
 
 def _get_metadata_json(metadata_path=None, workflow_id=None,
                        host='localhost', port=8000):
@@ -315,6 +866,9 @@ def _get_metadata_json(metadata_path=None, workflow_id=None,
         with open(metadata_path) as f:
             metadata = json.load(f)
     else:
+        metadata = _forward_to_daemon('metadata', workflow_id=workflow_id, host=host, port=port)
+
+    if metadata is None and not metadata_path:
         logging.info("Fetching metadata from cromwell")
         server = _get_cromwell_server(host, port)
         metadata = server.get_workflow_metadata(workflow_id)
@@ -327,43 +881,70 @@ def _get_metadata_json(metadata_path=None, workflow_id=None,
 
     return metadata
 
-def _get_cromwell_server(host, port):
+def _get_workflow_operations(metadata_path, workflow_id, host, port, google):
+    # the metadata and the call table of a workflow (including its
+    # subworkflows), with the genomics operations of the calls loaded
+    import cromulent.calltable as calltable
+    if (metadata_path is None) and (workflow_id is None):
+        sys.exit(("[err] Please specify either a "
+                  "'--metadata' or '--workflow-id' option!"))
+
+    metadata = _get_metadata_json(
+        metadata_path=metadata_path,
+        workflow_id=workflow_id,
+        host=host,
+        port=port
+    )
+    server = _get_cromwell_server(host, port) if workflow_id else None
+    calls = calltable.CallTable.from_metadata(metadata, server=server)
+    calls.load_operations(google)
+    return (metadata, calls)
+
+def _get_cromwell_server(host, port, memoize=True):
+    import cromulent.cromwell as cromwell
     # setup the server object
-    # decorate the cromwell.Server class function
-    cromwell.Server.get_workflow_metadata = \
-        utils.memoize(cromwell.Server.get_workflow_metadata)
-    server = cromwell.Server(host, port)
+    # decorate the cromwell.Server class function (the memoized metadata is
+    # never released, so commands that go through many workflows opt out)
+    if memoize:
+        cromwell.Server.get_workflow_metadata = \
+            utils.memoize(cromwell.Server.get_workflow_metadata)
+    server = cromwell.Server(host, port, store=_get_metadata_store())
+    _check_cromwell_server(host, port, server.session)
+    return server
 
+def _check_cromwell_server(host, port, session=None):
+    import cromulent.cromwell as cromwell
     logging.info("Checking if we have access to the cromwell server")
-    if not server.is_accessible():
+    if not cromwell.is_accessible(host, port, session):
         msg = "Could not access the cromwell server!  Please ensure it is up!"
         logging.error(msg)
         raise Exception(msg)
 
-    return server
-
 def estimate_workflow_cost(metadata_path=None,
                            workflow_id=None,
                            sku_path=None,
                            host='localhost',
                            port=8000,
-                           tier_scheme='all'):
-    # setup the server object
-    # decorate the cromwell.Server class function
-    cromwell.Server.get_workflow_metadata = \
-        utils.memoize(cromwell.Server.get_workflow_metadata)
-    server = cromwell.Server(host, port)
-
-    logging.info("Checking if we have access to the cromwell server")
-    if not server.is_accessible():
-        msg = "Could not access the cromwell server!  Please ensure it is up!"
-        logging.error(msg)
-        raise Exception(msg)
+                           tier_scheme='all',
+                           checkpoint_path=None,
+                           totals_only=False,
+                           shard_rows_path=None,
+                           index_path=None,
+                           server=None,
+                           google=None,
+                           stream=False):
+    import cromulent.checkpoint as ccheckpoint
+    import cromulent.cromwell as cromwell
+    import cromulent.gcloud as gcloud
+    # the cromulent daemon passes in its (warm) server and google services
+    if server is None:
+        server = _get_cromwell_server(host, port)
 
     # setup the google services and skus information
-    gcloud.GoogleServices.get_available_compute_types = \
-        utils.memoize(gcloud.GoogleServices.get_available_compute_types)
-    google = gcloud.GoogleServices(sku_path)
+    if google is None:
+        gcloud.GoogleServices.get_available_compute_types = \
+            utils.memoize(gcloud.GoogleServices.get_available_compute_types)
+        google = gcloud.GoogleServices(sku_path, index_path=index_path)
 
     # derive the metadata
     metadata = None
@@ -382,10 +963,34 @@ def estimate_workflow_cost(metadata_path=None,
         logger.error(msg)
         raise Exception(msg)
 
+    # previously priced jobs of this workflow
+    cost_checkpoint = None
+    if checkpoint_path:
+        cost_checkpoint = ccheckpoint.CostCheckpoint(checkpoint_path, metadata['id'])
+
+    shard_rows = None
+    if stream:
+        shard_rows = sys.stdout
+    elif shard_rows_path:
+        logging.info("Writing the per-shard costs to : {}".format(shard_rows_path))
+        shard_rows = open(shard_rows_path, 'w')
+
     # perform the calculations
-    estimator = cromwell.CostEstimator(server, google)
+    estimator = cromwell.CostEstimator(server,
+                                       google,
+                                       checkpoint=cost_checkpoint,
+                                       totals_only=totals_only,
+                                       shard_rows=shard_rows,
+                                       stream=stream)
     logging.info("Starting cost calculations")
-    cost = estimator.calculate_cost(metadata, tier_scheme)
+    try:
+        cost = estimator.calculate_cost(metadata, tier_scheme)
+    finally:
+        if shard_rows is not None and not stream:
+            shard_rows.close()
     logging.info("Finished cost calculations")
 
-    return cost
+    if cost_checkpoint is not None:
+        cost_checkpoint.save()
+
+    return (cost, estimator.in_flight)
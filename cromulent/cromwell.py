@@ -4,30 +4,43 @@ from pprint import pprint
 import json, logging, math, functools
 
 from cromulent.gcloud import GenomicsOperation
+from cromulent.progress import meter
+from cromulent import metrics
+from cromulent.tracing import annotate, span
 
 import requests
 
+def is_accessible(host, port, session=None):
+    '''
+    Whether the cromwell server at host and port answers (with a one-off
+    request, unless a requests session is given)
+    '''
+    url = 'http://{}:{}/engine/v1/version'.format(host, port)
+    try:
+        r = (session or requests).get(url)
+    except requests.exceptions.ConnectionError as e:
+        return False
+
+    if r.status_code != 200:
+        return False
+
+    return True
+
 class Server(object):
 
-    def __init__(self, host="localhost", port=8000):
+    def __init__(self, host="localhost", port=8000, store=None):
         self.host = host
         self.port = port
+        # an optional MetadataStore of terminal workflows (see store.py)
+        self.store = store
+        # keep the connections to the cromwell server alive between requests
+        self.session = requests.Session()
 
     def _get_base_url(self):
         return 'http://{}:{}'.format(self.host, self.port)
 
     def is_accessible(self):
-        base_url = self._get_base_url()
-        url = '/'.join([base_url, 'engine', 'v1', 'version'])
-        try:
-            r = requests.get(url)
-        except requests.exceptions.ConnectionError as e:
-            return False
-
-        if r.status_code != 200:
-            return False
-
-        return True
+        return is_accessible(self.host, self.port, self.session)
 
     def get_workflow_metadata_lite(self, workflow_id):
         url_params = {
@@ -46,22 +59,43 @@ class Server(object):
         return self._get_workflow_metadata(workflow_id, { 'expandSubWorkflows' : 'false', } );
 
     def _get_workflow_metadata(self, workflow_id, url_params):
-        base_url = self._get_base_url()
-        url = '/'.join([base_url,
-                        'api',
-                        'workflows',
-                        'v1',
-                        workflow_id,
-                        'metadata'])
-        logging.info("Fetching workflow metadata: {}".format(workflow_id))
-        r = requests.get(url, params=url_params)
-        if r.status_code != 200:
-            logging.error('Error retrieving workflow metadata: {}'.format(r.json()['message']))
-            raise Exception(r.json()['message'])
-        logging.debug("Obtained workflow metadata")
-        return r.json()
+        with span('cromwell.metadata', workflow_id=workflow_id) as s:
+            if self.store is not None:
+                metadata = self.store.get(workflow_id, url_params)
+                s.set('cache_hit', metadata is not None)
+                if metadata is not None:
+                    meter.count('cache-hits')
+                    return metadata
+                meter.count('cache-misses')
+
+            base_url = self._get_base_url()
+            url = '/'.join([base_url,
+                            'api',
+                            'workflows',
+                            'v1',
+                            workflow_id,
+                            'metadata'])
+            logging.info("Fetching workflow metadata: {}".format(workflow_id))
+            with metrics.timer('cromwell.metadata') as t:
+                r = self.session.get(url, params=url_params)
+                t.nbytes = len(r.content)
+            if r.status_code != 200:
+                metrics.count('cromwell.errors')
+                logging.error('Error retrieving workflow metadata: {}'.format(r.json()['message']))
+                raise Exception(r.json()['message'])
+            logging.debug("Obtained workflow metadata")
+            metadata = r.json()
+            meter.count('metadata')
+            if self.store is not None:
+                self.store.put(workflow_id, url_params, metadata)
+            return metadata
 
     def get_workflow_status(self, workflow_id):
+        if self.store is not None:
+            status = self.store.status(workflow_id)
+            if status is not None:
+                return status
+
         base_url = self._get_base_url()
         url = '/'.join([base_url,
                         'api',
@@ -71,7 +105,9 @@ class Server(object):
                         'status'])
 
         logging.debug("Fetching workflow status: {}".format(workflow_id))
-        r = requests.get(url)
+        with span('cromwell.status', workflow_id=workflow_id), metrics.timer('cromwell.status') as t:
+            r = self.session.get(url)
+            t.nbytes = len(r.content)
         logging.debug("Obtained workflow status")
         return r.json()['status']
 
@@ -85,23 +121,15 @@ class Server(object):
                         'abort'])
 
         logging.debug("Attempting to abort workflow: {}".format(workflow_id))
-        r = requests.post(url)
+        with span('cromwell.abort', workflow_id=workflow_id), metrics.timer('cromwell.abort') as t:
+            r = self.session.post(url)
+            t.nbytes = len(r.content)
         logging.debug("Received server reply")
         return r.json()
 
     def get_workflow_execution_status(self, workflow_id):
-        base_url = self._get_base_url()
-        url = '/'.join([base_url,
-                        'api',
-                        'workflows',
-                        'v1',
-                        workflow_id,
-                        'metadata?includeKey=executionStatus'])
-
-        logging.debug("Fetching workflow metadata: {}".format(workflow_id))
-        r = requests.get(url)
-        status = r.json()
-        logging.debug("Obtained workflow metadata")
+        url_params = { 'includeKey' : [ 'executionStatus', 'status' ] }
+        status = self._get_workflow_metadata(workflow_id, url_params)
         summary = {}
         for call in status['calls']:
             for task in status['calls']:
@@ -114,24 +142,20 @@ class Server(object):
         return summary
 
     def get_workflow_input_outputs(self, workflow_id):
-        base_url = self._get_base_url()
-        url = '/'.join([base_url,
-                        'api',
-                        'workflows',
-                        'v1',
-                        workflow_id,
-                        'metadata?includeKey=executionStatus&includeKey=inputs&includeKey=outputs'])
-
-        logging.debug("Fetching workflow metadata: {}".format(workflow_id))
-        r = requests.get(url)
-        logging.debug("Obtained workflow metadata")
-        return r.json()
+        url_params = { 'includeKey' : [ 'executionStatus', 'inputs', 'outputs', 'status' ] }
+        return self._get_workflow_metadata(workflow_id, url_params)
 
 class CostEstimator(object):
 
-    def __init__(self, cromwell_server, google):
+    def __init__(self, cromwell_server, google, checkpoint=None,
+                 totals_only=False, shard_rows=None, stream=False):
         self.google = google
         self.cromwell_server = cromwell_server
+        self.checkpoint = checkpoint
+        self.totals_only = totals_only
+        self.shard_rows = shard_rows # file object for JSON Lines shard costs
+        self.stream = stream # flush every shard cost row
+        self.in_flight = []
 
     def get_operation_metadata(self, name):
         return self.google.get_genomics_operation_metadata(name)
@@ -154,7 +178,8 @@ class CostEstimator(object):
         except KeyError:
             # retrieve subworkflow
             wfid = execution['subWorkflowId']
-            meta = self.cromwell_server.get_workflow_metadata(wfid)
+            with span('subworkflow.metadata', workflow_id=wfid):
+                meta = self.cromwell_server.get_workflow_metadata(wfid)
             return meta
 
     def get_subworkflow_id(self, execution):
@@ -163,17 +188,67 @@ class CostEstimator(object):
         except KeyError:
             return execution['subWorkflowId']
 
+    def is_execution_cached(self, execution):
+        result = execution.get('callCaching', {}).get('result', '')
+        return result.startswith('Cache Hit')
+
     def get_cached_job(self, execution):
         cache = execution["callCaching"]["result"]
         logging.debug("        Cached -- see {}".format(cache))
         (old_wf_id, old_call_name, old_shard_index) = (cache.split(' '))[2].split(':')
-        old_metadata = self.cromwell_server.get_workflow_metadata(old_wf_id)
-        proper_shard_index = int(old_shard_index)
-        job_id = old_metadata['calls'][old_call_name][proper_shard_index]['jobId']
+        with span('call-cache.job', workflow_id=old_wf_id, call=old_call_name) as s:
+            old_metadata = self.cromwell_server.get_workflow_metadata(old_wf_id)
+            proper_shard_index = int(old_shard_index)
+            job_id = old_metadata['calls'][old_call_name][proper_shard_index]['jobId']
+            s.set('jobId', job_id)
         return job_id
 
-    def calculate_cost(self, metadata, tier_scheme='all'):
-        # tier_scheme can be on of the following:
+    def estimate_job_cost(self, task, shard, job_id, tier_scheme):
+        # returns None for jobs that have not finished running yet, these
+        # are tracked in the in-flight list instead of being priced
+        meter.count('jobs')
+        if job_id is None:
+            logging.debug("            not started yet")
+            self.in_flight.append({ 'task' : task, 'shard' : shard, 'jobId' : None })
+            return None
+
+        if self.checkpoint is not None:
+            in_checkpoint = job_id in self.checkpoint
+            annotate('cache_hit', in_checkpoint)
+            if in_checkpoint:
+                meter.count('cache-hits')
+                cost = self.checkpoint.get(job_id)
+                logging.debug('            checkpointed cost: {}'.format(cost))
+                return cost
+            meter.count('cache-misses')
+
+        op = GenomicsOperation(self.get_operation_metadata(job_id))
+        logging.debug('            operation: {}'.format(op))
+        if not op.is_finished():
+            logging.debug("            still running")
+            self.in_flight.append({ 'task' : task, 'shard' : shard, 'jobId' : job_id })
+            return None
+
+        with span('pricing'), metrics.timer('pricing.operation'):
+            cost = self.google.estimate_genomics_operation_cost(op, tier_scheme)
+        meter.count('priced')
+        logging.debug('            cost: {}'.format(cost))
+        if self.checkpoint is not None:
+            self.checkpoint.record(job_id, cost)
+        return cost
+
+    def write_shard_row(self, record):
+        if self.shard_rows is None:
+            return
+        self.shard_rows.write(json.dumps(record, sort_keys=True))
+        self.shard_rows.write('\n')
+        if self.stream:
+            self.shard_rows.flush()
+
+    def iter_shard_costs(self, metadata, tier_scheme='all'):
+        # Price the finished jobs of the workflow (and of its subworkflows)
+        # one by one, yielding a record of each job's cost as soon as it
+        # is priced.  tier_scheme can be on of the following:
         # 1.  all       -- assume starting workflow in a new project
         #                  and include all the relevant tiering pricing
         # 2.  no-free   -- use tiered-pricing, but remove any free-tiers
@@ -181,68 +256,105 @@ class CostEstimator(object):
         # 4.  max-price -- use only the tier with the highest price
         logging.info("Using price tiering scheme: '{}'".format(tier_scheme))
         calls = self.get_calls(metadata)
+        wf_id = metadata.get('id', None)
+
+        with span('workflow', workflow_id=wf_id):
+            for task in calls:
+                logging.debug("Processing {}".format(task))
+                meter.expect(len([ e for e in calls[task] if not self.is_execution_subworkflow(e) ]))
+                with span('call', workflow_id=wf_id, call=task):
+                    for record in self._iter_call_costs(wf_id, task, calls[task], tier_scheme):
+                        yield record
+
+    def _iter_call_costs(self, wf_id, task, executions, tier_scheme):
+        for e in executions:
+            shard = e['shardIndex']
+            logging.debug("    Shard: {}".format(shard))
+            if self.is_execution_subworkflow(e):
+                subworkflow_id = self.get_subworkflow_id(e)
+                logging.debug("    Entering Subworkflow: {} / {}".format(shard, subworkflow_id))
+                subworkflow = self.get_subworkflow_metadata(e)
+                for record in self.iter_shard_costs(subworkflow, tier_scheme=tier_scheme):
+                    yield record
+                continue
+
+            with span('shard', call=task, shard=shard, attempt=e.get('attempt', None)) as s:
+                job_id = e.get('jobId', None)
+                if job_id is None and self.is_execution_cached(e):
+                    job_id = self.get_cached_job(e)
+                s.set('jobId', job_id)
+                cost = self.estimate_job_cost(task, shard, job_id, tier_scheme)
+            if cost is None:
+                continue
+
+            yield {
+                'workflow_id' : wf_id,
+                'task'        : task,
+                'shard'       : shard,
+                'attempt'     : e.get('attempt', None),
+                'jobId'       : job_id,
+                'cpu'         : cost['cpu'],
+                'mem'         : cost['mem'],
+                'disk'        : cost['disk'],
+            }
 
-        summary = {}
-        subworkflow_summary_costs = {}
-
-        for task in calls:
-            logging.debug("Processing {}".format(task))
-            executions = calls[task]
-            task_costs = None
-            for e in executions:
-                shard = e['shardIndex']
-                logging.debug("    Shard: {}".format(shard))
-                if self.is_execution_subworkflow(e):
-                    subworkflow_id = self.get_subworkflow_id(e)
-                    logging.debug("    Entering Subworkflow: {} / {}".format(shard, subworkflow_id))
-                    subworkflow_summary_costs = self.calculate_cost(self.get_subworkflow_metadata(e), tier_scheme=tier_scheme)
-                    for task in subworkflow_summary_costs:
-                        if task in summary:
-                            summary[task]['cpu'] += subworkflow_summary_costs[task]['cpu']
-                            summary[task]['mem'] += subworkflow_summary_costs[task]['mem']
-                            summary[task]['disk'] += subworkflow_summary_costs[task]['disk']
-                            summary[task]['total-cost'] += subworkflow_summary_costs[task]['total-cost']
-                            summary[task]['items'].extend(subworkflow_summary_costs[task]['items'])
-                        else:
-                            summary[task] = subworkflow_summary_costs[task]
-                else:
-                    job_id = e.get('jobId', None)
-                    if job_id is None:
-                        job_id = self.get_cached_job(e)
-                    op = GenomicsOperation(self.get_operation_metadata(job_id))
-                    logging.debug('            operation: {}'.format(op))
-                    cost = self.google.estimate_genomics_operation_cost(op, tier_scheme)
-                    logging.debug('            cost: {}'.format(cost))
-
-                    if task_costs is None:
-                        task_costs = {}
-
-                    if shard not in task_costs:
-                        task_costs[shard] = {'cpu': 0.0, 'mem': 0.0, 'disk': 0.0}
-
-                    task_costs[shard]['cpu']  += cost['cpu']
-                    task_costs[shard]['mem']  += cost['mem']
-                    task_costs[shard]['disk'] += cost['disk']
-
-            if task_costs:
-                cpu_costs  = sum([c['cpu'] for c in task_costs.values()])
-                mem_costs  = sum([c['mem'] for c in task_costs.values()])
-                disk_costs = sum([c['disk'] for c in task_costs.values()])
-                total_cost = cpu_costs + mem_costs + disk_costs
-                logging.debug("    Total Task Cost: {}".format(total_cost))
-                if task in summary:
-                    summary[task]['cpu']  += cpu_costs
-                    summary[task]['mem']  += mem_costs
-                    summary[task]['disk'] += disk_costs
-                    summary[task]['total-cost'] += total_cost
-                    summary[task]['items'].append(task_costs)
-                else:
-                    summary[task] = {
-                        'cpu' : cpu_costs,
-                        'mem' : mem_costs,
-                        'disk' : disk_costs,
-                        'total-cost': total_cost,
-                        'items' : [task_costs]
-                    }
-
-        return summary
+    def calculate_cost(self, metadata, tier_scheme='all'):
+        # the per-task summary of iter_shard_costs (see CostSummary).  The
+        # per-shard costs are written to the shard rows as they are priced.
+        summary = CostSummary(totals_only=self.totals_only)
+        with span('calculate_cost', workflow_id=metadata.get('id', None), tier_scheme=tier_scheme):
+            for record in self.iter_shard_costs(metadata, tier_scheme):
+                self.write_shard_row(record)
+                summary.add(record)
+        return summary.tasks
+
+class CostSummary(object):
+    def __init__(self, totals_only=False):
+        '''
+        The per-task cost summary of a workflow, aggregated one shard cost
+        record (see CostEstimator.iter_shard_costs) at a time.  Every task
+        has its cpu, mem, disk and total-cost, the number of shards and,
+        unless totals_only, the "items": a dictionary of shard to cost for
+        every (sub)workflow the task ran in.
+        '''
+        self.totals_only = totals_only
+        self.tasks = {}
+        # (task, workflow id) -> (shards seen, shard costs), which are not
+        # kept in the totals only mode
+        self.groups = {}
+
+    def add(self, record):
+        task = record['task']
+        if task not in self.tasks:
+            self.tasks[task] = { 'cpu' : 0.0, 'mem' : 0.0, 'disk' : 0.0,
+                                 'total-cost' : 0.0, 'shards' : 0 }
+            if not self.totals_only:
+                self.tasks[task]['items'] = []
+        summary = self.tasks[task]
+
+        for k in ('cpu', 'mem', 'disk'):
+            summary[k] += record[k]
+        summary['total-cost'] = summary['cpu'] + summary['mem'] + summary['disk']
+
+        shard = record['shard']
+        if self.totals_only:
+            # a shard is counted by its first attempt, so that the memory
+            # used does not grow with the number of shards
+            if record.get('attempt', None) in (None, 1):
+                summary['shards'] += 1
+            return
+
+        key = (task, record.get('workflow_id', None))
+        if key not in self.groups:
+            self.groups[key] = (set(), {})
+            summary['items'].append(self.groups[key][1])
+        (shards, shard_costs) = self.groups[key]
+
+        if shard not in shards:
+            shards.add(shard)
+            summary['shards'] += 1
+
+        if shard not in shard_costs:
+            shard_costs[shard] = {'cpu': 0.0, 'mem': 0.0, 'disk': 0.0}
+        for k in ('cpu', 'mem', 'disk'):
+            shard_costs[shard][k] += record[k]
@@ -0,0 +1,318 @@
+from __future__ import print_function
+
+import binascii, contextlib, errno, hmac, json, logging, os, signal, socket, sys, threading
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urllib import urlencode
+    from urllib2 import urlopen, Request, HTTPError, URLError
+    from urlparse import urlparse, parse_qsl
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlencode, urlparse, parse_qsl
+    from urllib.request import urlopen, Request
+    from urllib.error import HTTPError, URLError
+
+import cromulent.utils as utils
+
+# -- cromulent daemon
+#
+# `cromulent serve` keeps the cromwell server sessions, google services,
+# pricing information and machine type catalogs warm in one long running
+# process.  It answers the cromulent operations as JSON over HTTP on
+# localhost, and records its address in a state file so that the other
+# cromulent subcommands can find it and forward to it.
+#
+# The state file (in a 0700 directory, and itself 0600) also holds a
+# random token that every request must present, so that other local users
+# cannot drive the daemon, e.g. to write files with its permissions.
+
+# the header that carries the token
+TOKEN_HEADER = 'X-Cromulent-Token'
+
+# seconds a client waits on the daemon before giving up on it
+DEFAULT_TIMEOUT = 600
+
+# the operations that take as long as the work needs (e.g. an estimate of
+# a large workflow), which a client waits on without a timeout
+UNTIMED_OPERATIONS = ('estimate', 'report')
+
+def state_path():
+    path = utils.cache_dir('daemon')
+    os.chmod(path, 0o700)
+    return os.path.join(path, 'daemon.json')
+
+class DaemonUnavailable(Exception):
+    pass
+
+class DaemonTimeout(Exception):
+    pass
+
+class _LockedGoogle(object):
+    # the google api clients are not thread safe, so the calls into the
+    # (shared) google services are serialized; everything else, like
+    # fetching the cromwell metadata, still runs concurrently
+    def __init__(self, google, lock):
+        self._google = google
+        self._lock = lock
+
+    def __getattr__(self, name):
+        attr = getattr(self._google, name)
+        if not callable(attr):
+            return attr
+
+        def locked(*args, **kwargs):
+            with self._lock:
+                return attr(*args, **kwargs)
+        return locked
+
+class _ThreadStdout(object):
+    # stands in for sys.stdout while the daemon serves, so that the output
+    # of an operation (the reports print and render to sys.stdout) is
+    # captured per request thread
+    def __init__(self, stdout):
+        self._stdout = stdout
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def capture(self):
+        self._local.out = StringIO()
+        try:
+            yield self._local.out
+        finally:
+            del self._local.out
+
+    def __getattr__(self, name):
+        return getattr(getattr(self._local, 'out', self._stdout), name)
+
+class Daemon(object):
+    def __init__(self, store=None):
+        self.httpd = None
+        self.store = store  # shared by all the cromwell servers
+        self.token = binascii.hexlify(os.urandom(16)).decode('ascii')
+        self.servers = {}  # (host, port)          => cromwell.Server
+        self.google = {}   # (sku_path, index_path) => gcloud.GoogleServices
+        self.operations_google = None  # without pricing, for the wf reports
+        self.stdout = None
+        # the google api clients are not thread safe
+        self.google_lock = threading.Lock()
+        self.lock = threading.Lock()
+
+    def operations(self):
+        return {
+            'metadata' : self.metadata,
+            'status'   : self.status,
+            'estimate' : self.estimate,
+            'report'   : self.report,
+        }
+
+    def get_server(self, host, port):
+        import cromulent.cromwell as cromwell
+        key = (host, int(port))
+        with self.lock:
+            if key not in self.servers:
+                server = cromwell.Server(host, int(port), store=self.store)
+                if not server.is_accessible():
+                    msg = "Could not access the cromwell server!  Please ensure it is up!"
+                    raise Exception(msg)
+                self.servers[key] = server
+            return self.servers[key]
+
+    def get_google(self, sku_path=None, index_path=None):
+        import cromulent.gcloud as gcloud
+        key = (sku_path, index_path)
+        with self.lock:
+            if key not in self.google:
+                google = gcloud.GoogleServices(sku_path, index_path=index_path)
+                google.get_available_compute_types = \
+                    utils.memoize(google.get_available_compute_types)
+                self.google[key] = google
+            return self.google[key]
+
+    def get_operations_google(self):
+        import cromulent.gcloud as gcloud
+        with self.lock:
+            if self.operations_google is None:
+                # the operations reports need no pricing information
+                self.operations_google = gcloud.GoogleServices(sku_list={})
+            return self.operations_google
+
+    # -- operations
+
+    def metadata(self, workflow_id, host='localhost', port=8000, lite=False):
+        server = self.get_server(host, port)
+        if lite:
+            return server.get_workflow_metadata_lite(workflow_id)
+        return server.get_workflow_metadata(workflow_id)
+
+    def status(self, workflow_id, host='localhost', port=8000):
+        return self.get_server(host, port).get_workflow_status(workflow_id)
+
+    def estimate(self, host='localhost', port=8000, sku_path=None, index_path=None, **kwargs):
+        import cromulent.cli as cli
+        server = self.get_server(host, port)
+        google = _LockedGoogle(self.get_google(sku_path, index_path), self.google_lock)
+        (costs, in_flight) = cli.estimate_workflow_cost(server=server,
+                                                        google=google,
+                                                        **kwargs)
+        return { 'tasks' : costs, 'in-flight' : in_flight }
+
+    def report(self, report, workflow_id, host='localhost', port=8000, opts=None, fmt='simple'):
+        import cromulent.report as creport
+        metadata = self.get_server(host, port).get_workflow_metadata(workflow_id)
+        google = None
+        if report in creport.operation_report_types():
+            google = _LockedGoogle(self.get_operations_google(), self.google_lock)
+        with self.stdout.capture() as out:
+            creport.workflow_report(report, metadata, opts, fmt, google=google)
+            return out.getvalue()
+
+    # -- serving
+
+    def serve(self, port=0):
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                token = self.headers.get(TOKEN_HEADER, '')
+                if not hmac.compare_digest(token.encode('ascii', 'replace'),
+                                           daemon.token.encode('ascii')):
+                    self.respond(403, { 'error' : 'Invalid cromulent daemon token' })
+                    return
+
+                url = urlparse(self.path)
+                operation = url.path.strip('/')
+                params = dict(parse_qsl(url.query))
+                fn = daemon.operations().get(operation, None)
+                try:
+                    if fn is None:
+                        raise Exception("Unknown operation: '{}'".format(operation))
+                    (code, body) = (200, { 'result' : fn(**_decode_params(params)) })
+                except (Exception, SystemExit) as e:
+                    logging.exception("Failed {}".format(self.path))
+                    (code, body) = (500, { 'error' : str(e) })
+                self.respond(code, body)
+
+            def respond(self, code, body):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, fmt, *args):
+                logging.debug(fmt % args)
+
+        class ThreadingServer(ThreadingMixIn, HTTPServer):
+            daemon_threads = True
+
+        self.httpd = httpd = ThreadingServer(('127.0.0.1', port), Handler)
+        (host, port) = httpd.server_address
+        state = { 'host' : host, 'port' : port, 'pid' : os.getpid(), 'token' : self.token }
+        tmp_path = '{}.{}.tmp'.format(state_path(), os.getpid())
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(state, f)
+        os.rename(tmp_path, state_path())
+        logging.info("cromulent daemon listening on {}:{}".format(host, port))
+
+        if _is_main_thread():
+            def shutdown(signum, frame):
+                raise KeyboardInterrupt()
+            signal.signal(signal.SIGTERM, shutdown)
+
+        (stdout, sys.stdout) = (sys.stdout, _ThreadStdout(sys.stdout))
+        self.stdout = sys.stdout
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            logging.info("Shutting down the cromulent daemon")
+        finally:
+            sys.stdout = stdout
+            httpd.server_close()
+            if os.path.exists(state_path()):
+                os.remove(state_path())
+
+    def stop(self):
+        '''
+        Stop a daemon that is serving in another thread
+        '''
+        self.httpd.shutdown()
+
+def _is_main_thread():
+    if hasattr(threading, 'main_thread'):
+        return threading.current_thread() is threading.main_thread()
+    # python 2
+    return isinstance(threading.current_thread(), threading._MainThread)
+
+def _decode_params(params):
+    # the parameter values are JSON encoded by the client
+    return dict([ (k, json.loads(v)) for (k, v) in params.items() ])
+
+# -- Daemon (end)
+
+class Client(object):
+    def __init__(self, host, port, token, timeout=DEFAULT_TIMEOUT):
+        '''
+        Forwards cromulent operations to a running daemon
+        '''
+        self.host = host
+        self.port = port
+        self.token = token
+        self.timeout = timeout
+
+    @staticmethod
+    def find():
+        '''
+        The client of the running daemon, or None if there is none
+        '''
+        path = state_path()
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, 'r') as f:
+                state = json.load(f)
+            os.kill(state['pid'], 0)
+            return Client(state['host'], state['port'], state['token'])
+        except (ValueError, KeyError, OSError, IOError):
+            logging.debug("Ignoring stale cromulent daemon state at {}".format(path))
+            return None
+
+    def request(self, operation, **params):
+        query = urlencode([ (k, json.dumps(v)) for (k, v) in params.items() ])
+        url = 'http://{}:{}/{}?{}'.format(self.host, self.port, operation, query)
+        logging.debug("Forwarding '{}' to the cromulent daemon".format(operation))
+        request = Request(url, headers={ TOKEN_HEADER : self.token })
+        timeout = None if operation in UNTIMED_OPERATIONS else self.timeout
+        try:
+            response = urlopen(request, timeout=timeout)
+            data = response.read()
+        except HTTPError as e:
+            data = e.read()
+        except (URLError, socket.error) as e:
+            reason = getattr(e, 'reason', e)
+            if isinstance(reason, socket.timeout):
+                # the daemon may still be working on it, so it is not
+                # run again locally
+                msg = ("The cromulent daemon did not answer '{}' within {} seconds "
+                       "(use --no-daemon to run it locally)")
+                raise DaemonTimeout(msg.format(operation, timeout))
+            if getattr(reason, 'errno', None) in (errno.ECONNREFUSED, errno.ENOENT):
+                # e.g. a stale state file whose pid was reused
+                raise DaemonUnavailable("Could not reach the cromulent daemon: {}".format(e))
+            raise
+        body = json.loads(data.decode('utf-8'))
+        if 'error' in body:
+            raise Exception(body['error'])
+        return body['result']
+
+# -- Client (end)
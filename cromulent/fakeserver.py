@@ -0,0 +1,314 @@
+from __future__ import print_function
+
+import json, logging, random, re, threading, time
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+
+import cromulent.synthetic as synthetic
+
+# -- Fake cromwell and google servers
+#
+# A stand-in for a cromwell server and the google apis cromulent uses,
+# serving the workflows, genomics operations, sku list and machine types
+# of a SyntheticWorkflow, for load tests on a laptop with no network:
+#
+#   cromwell : GET  /engine/v1/version
+#              GET  /api/workflows/v1/<id>/metadata   (includeKey filters)
+#              GET  /api/workflows/v1/<id>/status
+#              POST /api/workflows/v1/<id>/abort
+#   google   : GET  /discovery/v1/apis/<api>/<version>/rest
+#              GET  /v2alpha1/projects/<project>/operations/<n>   (genomics)
+#              GET  /v1/services, /v1/services/<id>/skus          (billing)
+#              GET  /compute/v1/projects/<project>/zones/<zone>/machineTypes
+#
+# Point cromwell.Server at the fake server's host and port, and
+# GoogleServices at its url (the api_root argument, or the
+# CROMULENT_GOOGLE_API_ROOT environment variable).  The google apis are
+# described by minimal discovery documents, so that the google api
+# client talks to the fake server.
+#
+# Every request (except for the discovery documents) is delayed by
+# latency seconds (plus up to jitter more), and fails with a 503 at the
+# error rate, from a seeded random generator.
+
+# the billing service id of Compute Engine
+COMPUTE_SERVICE = 'services/6F81-5844-456A'
+
+# skus per billing page
+SKU_PAGE_SIZE = 10
+
+class FakeServer(object):
+    def __init__(self, workflow, host='localhost', port=0, latency=0.0, jitter=0.0,
+                 error_rate=0.0, seed=0):
+        '''
+        Serves the workflows of workflow (a SyntheticWorkflow) on host and
+        port (any free port by default)
+        '''
+        self.workflow = workflow
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.skus = sorted(synthetic.skus().values(), key=lambda s: s['description'])
+        self.machines = sorted(synthetic.machine_types().values(), key=lambda m: m['name'])
+        self.aborted = set()
+
+        class ThreadingServer(ThreadingMixIn, HTTPServer):
+            daemon_threads = True
+
+        self.httpd = ThreadingServer((host, port), _handler(self))
+        (self.host, self.port) = self.httpd.server_address[:2]
+        self.thread = None
+
+    # -- __init__
+
+    @property
+    def url(self):
+        return 'http://{}:{}'.format(self.host, self.port)
+
+    def serve(self):
+        logging.info("Fake cromwell and google servers listening on {}".format(self.url))
+        try:
+            self.httpd.serve_forever()
+        except KeyboardInterrupt:
+            logging.info("Shutting down the fake servers")
+        finally:
+            self.httpd.server_close()
+
+    def start(self):
+        '''
+        Serve in a background thread
+        '''
+        self.thread = threading.Thread(target=self.serve, name='cromulent-fake-server')
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        if self.thread is not None:
+            self.thread.join()
+
+    # -- request handling
+
+    def handle(self, method, path, query):
+        '''
+        The (status code, json body) of a request
+        '''
+        if path.startswith('/discovery/'):
+            return self.discovery(path)
+
+        with self.lock:
+            self.requests += 1
+            delay = self.latency + self.rng.uniform(0, self.jitter)
+            failed = self.rng.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        if delay:
+            time.sleep(delay)
+        if failed:
+            return _error(503, 'Injected error')
+
+        for (route_method, pattern, fn) in ROUTES:
+            m = pattern.match(path)
+            if m is not None and method == route_method:
+                return fn(self, query, *m.groups())
+        return _error(404, 'Not found: {} {}'.format(method, path))
+
+    def version(self, query):
+        return (200, { 'cromwell' : 'fake' })
+
+    def metadata(self, query, workflow_id):
+        if workflow_id not in self.workflow.workflows:
+            return _cromwell_error(workflow_id)
+        metadata = self.workflow.workflows[workflow_id]
+        if 'includeKey' in query:
+            metadata = _include_keys(metadata, set(query['includeKey']))
+        return (200, metadata)
+
+    def status(self, query, workflow_id):
+        if workflow_id not in self.workflow.workflows:
+            return _cromwell_error(workflow_id)
+        status = self.workflow.workflows[workflow_id]['status']
+        if workflow_id in self.aborted:
+            status = 'Aborted'
+        return (200, { 'id' : workflow_id, 'status' : status })
+
+    def abort(self, query, workflow_id):
+        if workflow_id not in self.workflow.workflows:
+            return _cromwell_error(workflow_id)
+        self.aborted.add(workflow_id)
+        return (200, { 'id' : workflow_id, 'status' : 'Aborting' })
+
+    def operation(self, query, name):
+        try:
+            return (200, self.workflow.operation(name))
+        except (KeyError, ValueError):
+            return _error(404, 'Operation {} not found'.format(name))
+
+    def services(self, query):
+        return (200, { 'services' : [ { 'name' : COMPUTE_SERVICE, 'displayName' : 'Compute Engine' } ],
+                       'nextPageToken' : '' })
+
+    def sku_page(self, query, service):
+        if 'services/' + service != COMPUTE_SERVICE:
+            return _error(404, 'Service services/{} not found'.format(service))
+        start = int(query.get('pageToken', ['0'])[0] or 0)
+        end = start + SKU_PAGE_SIZE
+        return (200, { 'skus' : self.skus[start:end],
+                       'nextPageToken' : str(end) if end < len(self.skus) else '' })
+
+    def machine_types(self, query, project, zone):
+        return (200, { 'kind' : 'compute#machineTypeList', 'items' : self.machines })
+
+    def discovery(self, path):
+        m = re.match(r'^/discovery/v1/apis/([^/]+)/([^/]+)/rest$', path)
+        if m is None or m.groups() not in DISCOVERY:
+            return _error(404, 'No discovery document for {}'.format(path))
+        (api, version) = m.groups()
+        document = dict(DISCOVERY[(api, version)])
+        document.update({
+            'kind'             : 'discovery#restDescription',
+            'discoveryVersion' : 'v1',
+            'id'               : '{}:{}'.format(api, version),
+            'name'             : api,
+            'version'          : version,
+            'protocol'         : 'rest',
+            'rootUrl'          : self.url + '/',
+            'baseUrl'          : self.url + '/' + document['servicePath'],
+        })
+        return (200, document)
+
+# -- FakeServer (end)
+
+ROUTES = (
+    ('GET', re.compile(r'^/engine/v1/version$'), FakeServer.version),
+    ('GET', re.compile(r'^/api/workflows/v1/([^/]+)/metadata$'), FakeServer.metadata),
+    ('GET', re.compile(r'^/api/workflows/v1/([^/]+)/status$'), FakeServer.status),
+    ('POST', re.compile(r'^/api/workflows/v1/([^/]+)/abort$'), FakeServer.abort),
+    ('GET', re.compile(r'^/v2alpha1/(projects/[^/]+/operations/[^/]+)$'), FakeServer.operation),
+    ('GET', re.compile(r'^/v1/services$'), FakeServer.services),
+    ('GET', re.compile(r'^/v1/services/([^/]+)/skus$'), FakeServer.sku_page),
+    ('GET', re.compile(r'^/compute/v1/projects/([^/]+)/zones/([^/]+)/machineTypes$'), FakeServer.machine_types),
+)
+
+def _method(method_id, path, parameters, response=None):
+    method = {
+        'id'             : method_id,
+        'path'           : path,
+        'httpMethod'     : 'GET',
+        'parameters'     : parameters,
+        'parameterOrder' : [ p for p in parameters if parameters[p].get('required', False) ],
+    }
+    if response is not None:
+        method['response'] = { '$ref' : response }
+    return method
+
+_PATH = { 'type' : 'string', 'location' : 'path', 'required' : True }
+_QUERY = { 'type' : 'string', 'location' : 'query' }
+
+# the minimal discovery documents of the google apis cromulent uses
+DISCOVERY = {
+    ('genomics', 'v2alpha1') : {
+        'servicePath' : '',
+        'schemas' : {
+            'Operation' : { 'id' : 'Operation', 'type' : 'object' },
+        },
+        'resources' : { 'projects' : { 'resources' : { 'operations' : { 'methods' : {
+            'get' : _method('genomics.projects.operations.get', 'v2alpha1/{+name}', { 'name' : _PATH },
+                            'Operation'),
+        } } } } },
+    },
+    ('cloudbilling', 'v1') : {
+        'servicePath' : '',
+        'schemas' : {
+            'ListServicesResponse' : { 'id' : 'ListServicesResponse', 'type' : 'object', 'properties' : {
+                'services' : { 'type' : 'array', 'items' : { 'type' : 'object' } },
+                'nextPageToken' : { 'type' : 'string' } } },
+            'ListSkusResponse' : { 'id' : 'ListSkusResponse', 'type' : 'object', 'properties' : {
+                'skus' : { 'type' : 'array', 'items' : { 'type' : 'object' } },
+                'nextPageToken' : { 'type' : 'string' } } },
+        },
+        'resources' : { 'services' : {
+            'methods' : {
+                'list' : _method('cloudbilling.services.list', 'v1/services',
+                                 { 'pageToken' : _QUERY, 'pageSize' : _QUERY }, 'ListServicesResponse'),
+            },
+            'resources' : { 'skus' : { 'methods' : {
+                'list' : _method('cloudbilling.services.skus.list', 'v1/{+parent}/skus',
+                                 { 'parent' : _PATH, 'pageToken' : _QUERY, 'pageSize' : _QUERY },
+                                 'ListSkusResponse'),
+            } } },
+        } },
+    },
+    ('compute', 'v1') : {
+        'servicePath' : 'compute/v1/',
+        'schemas' : {
+            'MachineTypeList' : { 'id' : 'MachineTypeList', 'type' : 'object', 'properties' : {
+                'items' : { 'type' : 'array', 'items' : { 'type' : 'object' } },
+                'nextPageToken' : { 'type' : 'string' } } },
+        },
+        'resources' : { 'machineTypes' : { 'methods' : {
+            'list' : _method('compute.machineTypes.list', 'projects/{project}/zones/{zone}/machineTypes',
+                             { 'project' : _PATH, 'zone' : _PATH, 'pageToken' : _QUERY,
+                               'maxResults' : _QUERY, 'filter' : _QUERY }, 'MachineTypeList'),
+        } } },
+    },
+}
+
+def _handler(server):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.dispatch('GET')
+
+        def do_POST(self):
+            self.dispatch('POST')
+
+        def dispatch(self, method):
+            url = urlparse(self.path)
+            try:
+                (code, body) = server.handle(method, url.path, parse_qs(url.query))
+            except Exception as e:
+                logging.exception("Failed {} {}".format(method, self.path))
+                (code, body) = _error(500, str(e))
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, fmt, *args):
+            logging.debug(fmt % args)
+
+    return Handler
+
+def _include_keys(metadata, keys):
+    # the metadata with only the keys asked for (and the workflow id and
+    # calls), at the workflow and the call levels, as cromwell does
+    keys = keys | set(['id'])
+    filtered = dict([ (k, v) for (k, v) in metadata.items() if k in keys ])
+    filtered['calls'] = {}
+    for (call, executions) in metadata.get('calls', {}).items():
+        filtered['calls'][call] = [
+            dict([ (k, v) for (k, v) in e.items()
+                   if k in keys or k in ('shardIndex', 'attempt', 'subWorkflowId') ])
+            for e in executions ]
+    return filtered
+
+def _error(code, message):
+    # in the format of the google apis
+    return (code, { 'error' : { 'code' : code, 'message' : message }, 'message' : message })
+
+def _cromwell_error(workflow_id):
+    return (404, { 'status' : 'fail', 'message' : 'Unrecognized workflow ID: {}'.format(workflow_id) })
@@ -1,15 +1,17 @@
 from __future__ import division
 
-import dateutil.parser
-import math, os, sys, json
+import datetime, math, os, sys, json
 import logging
 from collections import namedtuple
 
-from googleapiclient import discovery
-import google.auth
-import requests
+import cromulent.pricing as pricing
+from cromulent import metrics
+from cromulent.progress import meter
+from cromulent.tracing import span
+from cromulent.utils import parse_rfc3339
 
 class Resource(object):
+    __slots__ = ('duration',)
 
     def __init__(self, duration):
         self.duration = duration # in seconds
@@ -44,6 +46,7 @@ class Resource(object):
                         ['baseUnitConversionFactor'])
 
 class Disk(Resource):
+    __slots__ = ('size', 'type_')
 
     def __init__(self, size, duration, disk_type='pd-standard'):
         self.size = size # in gb
@@ -120,13 +123,15 @@ class Disk(Resource):
         return nano_dollars
 
     def cost_no_free_tier(self, sku):
-        tiered_unit_prices = self.get_unit_prices(sku)
+        tiered_unit_prices = list(self.get_unit_prices(sku))
 
         # if the first tier is "free" set the price of the free tier to the
-        # price of the next higher tier
+        # price of the next higher tier (in a copy, the sku is shared)
         if tiered_unit_prices[0]['unitPrice']['nanos'] == 0:
-            tiered_unit_prices[0]['unitPrice']['nanos'] = \
-                tiered_unit_prices[1]['unitPrice']['nanos']
+            free_tier = dict(tiered_unit_prices[0])
+            free_tier['unitPrice'] = dict(free_tier['unitPrice'],
+                                          nanos=tiered_unit_prices[1]['unitPrice']['nanos'])
+            tiered_unit_prices[0] = free_tier
 
         unit_disk_usage = self._compute_unit_disk_usage()
 
@@ -164,6 +169,7 @@ class Disk(Resource):
 
 
 class Cpu(Resource):
+    __slots__ = ('cores',)
 
     def __init__(self, cores, duration):
         self.cores = int(cores)
@@ -188,6 +194,7 @@ class Cpu(Resource):
         return base_price
 
 class Ram(Resource):
+    __slots__ = ('size',)
 
     def __init__(self, size, duration):
         self.size = size # in gb
@@ -213,45 +220,110 @@ class Ram(Resource):
         return base_price
 
 
+def _event_milestones(events):
+    # (worker assigned, localization started, user action started,
+    #  delocalization started, worker released) -- None when not seen
+    milestones = [None] * len(GenomicsOperation.MILESTONES)
+    for event in events:
+        event_type = event.get('details', {}).get('@type', '')
+        description = event.get('description', '')
+        if event_type.endswith('WorkerAssignedEvent'):
+            k = 0
+        elif event_type.endswith('WorkerReleasedEvent'):
+            k = 4
+        elif description.startswith('Started running "Localization'):
+            k = 1
+        elif description.startswith('Started running "UserAction'):
+            k = 2
+        elif description.startswith('Started running "Delocalization'):
+            k = 3
+        else:
+            continue
+
+        ts = parse_rfc3339(event['timestamp'])
+        # the first start of each phase, but the last release
+        if milestones[k] is None or (ts > milestones[k] if k == 4 else ts < milestones[k]):
+            milestones[k] = ts
+    return tuple(milestones)
+
 class GenomicsOperation(object):
 
+    # workflows can have a very large number of operations, so only the
+    # fields needed for pricing are kept.  The cpu, ram and disk resources
+    # are created on demand.
+    __slots__ = ('machine', 'zone', 'region', 'preemptible', 'project',
+                 'cores', 'mem_gb', 'disk_shapes', 'start', 'end',
+                 'created', 'milestones')
+
+    # the timestamps of the operation events that mark the phases of a job
+    # (see _event_milestones)
+    MILESTONES = ('assigned', 'localization', 'user-action', 'delocalization', 'released')
+
     def __init__(self, response_json):
         meta = response_json['metadata']
-        vm =  meta['pipeline']['resources']['virtualMachine']
+        resources = meta['pipeline']['resources']
+        vm = resources['virtualMachine']
         # This is now likely to be something like custom-8-7424, even for pre-defined types.
         self.machine = vm['machineType']
         # TODO - is this ok to always take the earliest event to get zone? Is it always VM starting?
         self.zone = meta['events'][-1]['details']['zone']
-        self.region, _ = self.zone.rsplit('-', 1)
+        self.region = self.zone.rsplit('-', 1)[0]
         self.preemptible = vm['preemptible']
-        self.project = meta['pipeline']['resources']['projectId']
-        self.start_time = dateutil.parser.parse(meta['startTime'])
+        self.project = resources['projectId']
 
-        try:
-            self.end_time = dateutil.parser.parse(meta['endTime'])
-            self.length = self.end_time - self.start_time
-        except KeyError:
-            self.end_time = None
-            self.length = None
+        # timestamps are kept as seconds since the epoch
+        self.start = parse_rfc3339(meta['startTime'])
+        end_time = meta.get('endTime', None)
+        self.end = parse_rfc3339(end_time) if end_time else None
+        create_time = meta.get('createTime', None)
+        self.created = parse_rfc3339(create_time) if create_time else self.start
+        self.milestones = _event_milestones(meta.get('events', []))
+
+        _, cpus, mem_mb = self.machine.split('-')
+        self.cores = int(cpus)
+        self.mem_gb = float(mem_mb) / 1024.0
+
+        # (size in gb, disk type) -- the boot disk is last
+        disk_shapes = [ (x['sizeGb'], x['type']) for x in vm['disks'] ]
+        disk_shapes.append((vm['bootDiskSizeGb'], 'pd-standard'))
+        self.disk_shapes = tuple(disk_shapes)
 
+    @property
+    def cpu(self):
+        return Cpu(cores=self.cores, duration=self.duration())
+
+    @property
+    def ram(self):
+        return Ram(size=self.mem_gb, duration=self.duration())
+
+    @property
+    def disks(self):
         time_elapsed = self.duration()
+        return [ Disk(size=size, disk_type=disk_type, duration=time_elapsed)
+                 for (size, disk_type) in self.disk_shapes ]
 
-        # setup the cpu and ram components
-        _, cpus, mem_mb = self.machine.split('-')
-        mem_gb = float(mem_mb) / 1024.0
-        self.cpu = Cpu(cores=cpus, duration=time_elapsed)
-        self.ram = Ram(size=mem_gb, duration=time_elapsed)
+    @property
+    def start_time(self):
+        return datetime.datetime.utcfromtimestamp(self.start)
+
+    @property
+    def end_time(self):
+        if self.end is None:
+            return None
+        return datetime.datetime.utcfromtimestamp(self.end)
 
-        # setup the disk components
-        self.disks = [ Disk(size=x['sizeGb'],
-                            disk_type=x['type'],
-                            duration=time_elapsed) for x in vm['disks'] ]
+    @property
+    def length(self):
+        if self.end is None:
+            return None
+        return datetime.timedelta(seconds=self.end - self.start)
 
-        self.disks.append(Disk(vm['bootDiskSizeGb'], duration=time_elapsed))
+    def is_finished(self):
+        return self.end is not None
 
     def duration(self):
-        if self.length:
-            return self.length.total_seconds()
+        if self.end is not None:
+            return self.end - self.start
         else:
             return None
 
@@ -267,7 +339,7 @@ class GenomicsOperation(object):
                 "length: {}, "
                 "duration: {} )").format(
                         self.machine,
-                        self.disks,
+                        self.disk_shapes,
                         self.zone,
                         self.region,
                         self.preemptible,
@@ -286,17 +358,72 @@ class GoogleServices(object):
     # and https://developers.google.com/resources/api-libraries/documentation/cloudbilling/v1/python/latest/cloudbilling_v1.services.skus.html
     # and https://cloud.google.com/billing/reference/rest/v1/services.skus/list
     # and https://cloud.google.com/compute/pricing#disk
-    def __init__(self, sku_path=None):
+    def __init__(self, sku_path=None, sku_list=None, index_path=None, api_root=None):
+
+        # the credentials and api clients are set up on first use
+        self._credentials = None
+        self._clients = {}
+
+        # the root url of stand-in google apis (e.g. a cromulent fake-server),
+        # which are used without credentials
+        if api_root is None:
+            api_root = os.environ.get('CROMULENT_GOOGLE_API_ROOT', None)
+        self.api_root = api_root.rstrip('/') if api_root else None
+
+        # a pricing index (see cromulent.pricing) is used in place of the
+        # sku list and also holds machine type catalogs
+        self.index = None
+        if index_path is not None:
+            logging.info("Using the pricing index at {}".format(index_path))
+            self.index = pricing.PricingIndex(index_path)
+            sku_list = self.index
+
+        # an already loaded sku list can be shared (e.g. with worker processes)
+        if sku_list is None:
+            sku_list = self._construct_compute_sku_list(sku_path)
+        self.sku_list = sku_list
+
+        # (compute class, region, preemptible) -> compute_unit_prices()
+        self._unit_prices = {}
+
+    def _get_credentials(self):
+        if self._credentials is None:
+            import google.auth
+            self._credentials = google.auth.default()
+        return self._credentials
+
+    @property
+    def credentials(self):
+        return self._get_credentials()[0]
+
+    @property
+    def project(self):
+        return self._get_credentials()[1]
+
+    def _get_client(self, name, version):
+        if name not in self._clients:
+            from googleapiclient import discovery
+            if self.api_root is not None:
+                import httplib2
+                url = self.api_root + '/discovery/v1/apis/{api}/{apiVersion}/rest'
+                self._clients[name] = discovery.build(name, version, http=httplib2.Http(),
+                                                      discoveryServiceUrl=url,
+                                                      cache_discovery=False)
+            else:
+                self._clients[name] = discovery.build(name, version, credentials=self.credentials)
+        return self._clients[name]
 
-        credentials, project = google.auth.default()
-        self.credentials = credentials
-        self.project = project
+    @property
+    def billing(self):
+        return self._get_client('cloudbilling', 'v1')
 
-        self.billing  = discovery.build('cloudbilling', 'v1', credentials=credentials)
-        self.compute  = discovery.build('compute', 'v1', credentials=credentials)
-        self.genomics = discovery.build('genomics', 'v2alpha1', credentials=credentials)
+    @property
+    def compute(self):
+        return self._get_client('compute', 'v1')
 
-        self.sku_list = self._construct_compute_sku_list(sku_path)
+    @property
+    def genomics(self):
+        return self._get_client('genomics', 'v2alpha1')
 
     def compute_engine_skus(self):
         return self.sku_list
@@ -318,16 +445,28 @@ class GoogleServices(object):
         compute_skus = self._get_billing_skus_for_service(compute_service)
         return compute_skus
 
+    def _execute(self, metric, request, **attributes):
+        # a google api request, timed (and traced with the attributes) under
+        # metric; the size of the response is that of its json (as decoded
+        # and encoded again), and is only measured while the metrics are
+        # enabled
+        with span(metric, **attributes), metrics.timer(metric) as t:
+            response = request.execute()
+            if metrics.registry.enabled:
+                t.nbytes = len(json.dumps(response))
+        return response
+
     def _get_billing_service(self, service_name):
-        response = self.billing.services().list().execute()
-        compute_service = filter(lambda x: x['displayName'] == service_name, response['services'])
+        response = self._execute('google.billing.services', self.billing.services().list())
+        compute_service = [ x for x in response['services'] if x['displayName'] == service_name ]
         if not compute_service:
-            raise("Didn't find '{}' in billing API service list".format(service_name))
+            raise Exception("Didn't find '{}' in billing API service list".format(service_name))
         return compute_service[0]
 
     def _get_billing_skus_for_service(self, service_info):
         service_name = service_info["name"]
-        response = self.billing.services().skus().list(parent=service_name).execute()
+        response = self._execute('google.billing.skus',
+                                 self.billing.services().skus().list(parent=service_name))
 
         # assemble the skus into a better format
         service_skus = {}
@@ -336,7 +475,8 @@ class GoogleServices(object):
                 description = sku['description']
                 service_skus[description] = sku
             if response['nextPageToken']:
-                response = self.billing.services().skus().list(parent=service_name, pageToken=response['nextPageToken']).execute()
+                response = self._execute('google.billing.skus',
+                                         self.billing.services().skus().list(parent=service_name, pageToken=response['nextPageToken']))
             else:
                 break
 
@@ -344,7 +484,8 @@ class GoogleServices(object):
 
     def get_genomics_operation_metadata(self, name):
         request = self.genomics.projects().operations().get(name=name)
-        response = request.execute()
+        response = self._execute('google.genomics.operation', request, jobId=name)
+        meter.count('operations')
         return response
 
     def estimate_genomics_operation_cost(self, operation, tier_scheme):
@@ -374,6 +515,7 @@ class GoogleServices(object):
 
         return { 'cpu': core_cost, 'mem': mem_cost, 'disk': disk_cost }
 
+    @metrics.timed('sku.disk')
     def identify_google_disk_sku(self, disk):
         formal_disk_names = self.google_disk_classes()
 
@@ -382,6 +524,7 @@ class GoogleServices(object):
         sku = self.sku_list[sku_name]
         return sku
 
+    @metrics.timed('sku.compute')
     def identify_google_compute_sku(self, operation, resource_type):
         compute_class = self.identify_google_compute_class(operation)
         formal_region = self.identify_google_compute_formal_region(operation)
@@ -390,26 +533,59 @@ class GoogleServices(object):
             # special. Only one sku.
             return self.sku_list[name]
 
-        proper_sku_name = None
-        if operation.preemptible:
-            template = 'Preemptible {unit} {resource_type} running in {region}'
-            proper_sku_name = template.format(
-                unit=compute_class,
-                resource_type=resource_type,
-                region=formal_region
-            )
-        else:
-            proper_sku_name = '{} {}'.format(compute_class, resource_type)
+        proper_sku_name = self.google_compute_sku_name(
+            compute_class, resource_type, formal_region, operation.preemptible)
 
         if proper_sku_name not in self.sku_list:
             sys.exit("[err] Didn't find '{}' in google sku list!".format(proper_sku_name))
 
         return self.sku_list[proper_sku_name]
 
-    def identify_google_compute_formal_region(self, operation):
-        formal_region_names = self.google_alternative_region_names()
+    def google_compute_sku_name(self, compute_class, resource_type, formal_region, preemptible):
+        # only the preemptible skus are regional
+        if preemptible:
+            template = 'Preemptible {unit} {resource_type} running in {region}'
+            return template.format(
+                unit=compute_class,
+                resource_type=resource_type,
+                region=formal_region
+            )
+        return '{} {}'.format(compute_class, resource_type)
 
+    def identify_google_compute_formal_region(self, operation):
         region, _ = operation.zone.rsplit('-', 1)
+        return self.google_formal_region(region)
+
+    def compute_unit_prices(self, compute_class, region, preemptible):
+        '''
+        The (nano dollars per core second, nano dollars per GiB of memory
+        second) prices of a compute class, or None if its skus are not in
+        the sku list.
+        '''
+        key = (compute_class, region, preemptible)
+        if key in self._unit_prices:
+            return self._unit_prices[key]
+
+        try:
+            formal_region = self.google_formal_region(region)
+        except (KeyError, ValueError):
+            formal_region = region
+        skus = []
+        for resource_type in ('Core', 'Ram'):
+            name = self.google_compute_sku_name(compute_class, resource_type, formal_region, preemptible)
+            skus.append(self.sku_list.get(name, None))
+            if skus[-1] is None:
+                logging.warning("Didn't find '{}' in google sku list".format(name))
+
+        prices = None
+        if None not in skus:
+            gib = 1024.0 * 1024.0 * 1024.0
+            prices = (Cpu(1, 0).get_base_price(skus[0]), gib * Ram(0, 0).get_base_price(skus[1]))
+        self._unit_prices[key] = prices
+        return prices
+
+    def google_formal_region(self, region):
+        formal_region_names = self.google_alternative_region_names()
 
         formal_region = None
         if region in formal_region_names:
@@ -466,13 +642,18 @@ class GoogleServices(object):
         return disk_classes
 
     def get_available_compute_types(self, zone, project):
+        if self.index is not None:
+            machines = self.index.get_compute_types(zone, project)
+            if machines is not None:
+                return machines
+
         request = self.compute.machineTypes() \
                                .list(project=project, zone=zone)
 
         # assemble the relevant machines into a better format
         machines = {}
         while request is not None:
-            response = request.execute()
+            response = self._execute('google.compute.machine_types', request, zone=zone)
 
             for machine_type in response['items']:
                 key = (machine_type['guestCpus'], machine_type['memoryMb'])
@@ -0,0 +1,190 @@
+from __future__ import division
+
+import functools, json, os, random, threading, time
+
+# -- Metrics registry
+#
+# Call counts, latencies and bytes transferred of the hot paths (cromwell
+# requests, google api calls, sku lookups, pricing and reports), summed up
+# per run and written as JSON or as a Prometheus textfile (for the
+# node_exporter textfile collector).  Nothing is recorded until the
+# registry is enabled, and a disabled timer costs one attribute check.
+#
+# The latencies of each metric are kept in a reservoir sample of at most
+# RESERVOIR_SIZE values, so the percentiles of very long runs are
+# estimates but the memory used stays bounded.
+
+RESERVOIR_SIZE = 10000
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+class Metric(object):
+    __slots__ = ('count', 'total', 'bytes', 'samples')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.bytes = 0
+        self.samples = []
+
+    def observe(self, seconds, nbytes=None):
+        self.count += 1
+        self.total += seconds
+        if nbytes is not None:
+            self.bytes += nbytes
+        if len(self.samples) < RESERVOIR_SIZE:
+            self.samples.append(seconds)
+        else:
+            i = random.randint(0, self.count - 1)
+            if i < RESERVOIR_SIZE:
+                self.samples[i] = seconds
+
+    def quantiles(self):
+        values = sorted(self.samples)
+        if not values:
+            return dict([ (q, None) for q in QUANTILES ])
+        return dict([ (q, values[min(int(q * len(values)), len(values) - 1)]) for q in QUANTILES ])
+
+class Registry(object):
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.counters = {}
+
+    def enable(self):
+        self.enabled = True
+
+    def reset(self):
+        with self.lock:
+            self.metrics = {}
+            self.counters = {}
+
+    # -- recording
+
+    def observe(self, name, seconds, nbytes=None):
+        if not self.enabled:
+            return
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = Metric()
+            self.metrics[name].observe(seconds, nbytes)
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def timer(self, name):
+        '''
+        A context manager that observes the time spent in its block.  The
+        bytes transferred can be set on it (as "nbytes") within the block.
+        '''
+        return _Timer(self, name)
+
+    def timed(self, name):
+        '''
+        A decorator that observes the time spent in every call of a function
+        '''
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                start = time.time()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(name, time.time() - start)
+            return wrapper
+        return decorator
+
+    # -- export
+
+    def summary(self):
+        with self.lock:
+            metrics = dict(self.metrics)
+            counters = dict(self.counters)
+        calls = {}
+        for name in metrics:
+            m = metrics[name]
+            quantiles = m.quantiles()
+            calls[name] = {
+                'count' : m.count,
+                'total' : m.total,
+                'p50'   : quantiles[0.5],
+                'p95'   : quantiles[0.95],
+                'p99'   : quantiles[0.99],
+                'bytes' : m.bytes,
+            }
+        return { 'calls' : calls, 'counters' : counters }
+
+    def to_prometheus(self):
+        summary = self.summary()
+        lines = [
+            '# HELP cromulent_call_seconds Latency of the calls made by cromulent.',
+            '# TYPE cromulent_call_seconds summary',
+        ]
+        for name in sorted(summary['calls']):
+            call = summary['calls'][name]
+            for (q, key) in zip(QUANTILES, ('p50', 'p95', 'p99')):
+                if call[key] is not None:
+                    lines.append('cromulent_call_seconds{{call="{}",quantile="{}"}} {!r}'.format(
+                        name, q, call[key]))
+            lines.append('cromulent_call_seconds_sum{{call="{}"}} {!r}'.format(name, call['total']))
+            lines.append('cromulent_call_seconds_count{{call="{}"}} {}'.format(name, call['count']))
+        lines.extend([
+            '# HELP cromulent_call_bytes_total Bytes transferred by the calls made by cromulent.',
+            '# TYPE cromulent_call_bytes_total counter',
+        ])
+        for name in sorted(summary['calls']):
+            lines.append('cromulent_call_bytes_total{{call="{}"}} {}'.format(
+                name, summary['calls'][name]['bytes']))
+        lines.extend([
+            '# HELP cromulent_events_total Events counted by cromulent.',
+            '# TYPE cromulent_events_total counter',
+        ])
+        for name in sorted(summary['counters']):
+            lines.append('cromulent_events_total{{event="{}"}} {}'.format(name, summary['counters'][name]))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        '''
+        Write the summary to path, as a Prometheus textfile if the path
+        ends with .prom, or else as JSON.  The file is replaced atomically,
+        as the textfile collector may read it at any time.
+        '''
+        if path.endswith('.prom'):
+            text = self.to_prometheus()
+        else:
+            text = json.dumps(self.summary(), sort_keys=True, indent=4) + '\n'
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+        os.rename(tmp_path, path)
+
+# -- Registry (end)
+
+class _Timer(object):
+    __slots__ = ('registry', 'name', 'start', 'nbytes')
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+        self.nbytes = None
+
+    def __enter__(self):
+        self.start = time.time() if self.registry.enabled else None
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.start is not None:
+            self.registry.observe(self.name, time.time() - self.start, self.nbytes)
+        return False
+
+# the registry of this process
+registry = Registry()
+timed = registry.timed
+timer = registry.timer
+count = registry.count
@@ -0,0 +1,228 @@
+from __future__ import division
+
+import logging, mmap, os, struct
+
+# -- Pricing Index
+#
+# The compiled compute engine sku prices and machine type catalogs in a
+# flat binary file.  The file is memory-mapped, so every process using
+# the same index shares its pages through the page cache, and nothing is
+# parsed up front -- lookups are binary searches over fixed size records.
+#
+# Layout (all little-endian):
+#
+#   header   : magic, sku count, tier count, machine count
+#   skus     : (key offset, key length, base unit conversion factor,
+#               first tier, tier count)  sorted by the sku description
+#   tiers    : (start usage amount, unit price units, unit price nanos)
+#   machines : (key offset, key length, name offset, name length,
+#               guest cpus, memory mb)  sorted by the "project/zone" key
+#   strings  : the utf-8 encoded sku descriptions, keys and names
+
+MAGIC = b'CRMLPIX1'
+HEADER = struct.Struct('<8sIII')
+SKU = struct.Struct('<IIdII')
+TIER = struct.Struct('<dqq')
+MACHINE = struct.Struct('<IIIIii')
+
+def write_pricing_index(path, sku_list, machine_catalogs=None):
+    '''
+    Compile a sku list (as returned by GoogleServices.compute_engine_skus)
+    and optionally the machine type catalogs (a dictionary of
+    (zone, project) to GoogleServices.get_available_compute_types results)
+    into a pricing index file.
+    '''
+    strings = bytearray()
+
+    def add_string(text):
+        data = text.encode('utf-8')
+        offset = len(strings)
+        strings.extend(data)
+        return (offset, len(data))
+
+    sku_records = []
+    tier_records = []
+    for description in sorted(sku_list, key=lambda d: d.encode('utf-8')):
+        expression = sku_list[description]['pricingInfo'][0]['pricingExpression']
+        tiers = expression['tieredRates']
+        (offset, length) = add_string(description)
+        sku_records.append((offset, length,
+                            float(expression['baseUnitConversionFactor']),
+                            len(tier_records), len(tiers)))
+        for tier in tiers:
+            tier_records.append((float(tier.get('startUsageAmount', 0)),
+                                 int(tier['unitPrice'].get('units', 0)),
+                                 int(tier['unitPrice'].get('nanos', 0))))
+
+    machine_records = []
+    catalogs = machine_catalogs or {}
+    for (zone, project) in sorted(catalogs, key=lambda k: _catalog_key(*k)):
+        (key_offset, key_length) = add_string(_catalog_key(zone, project).decode('utf-8'))
+        machines = catalogs[(zone, project)]
+        for shape in sorted(machines, key=lambda k: (int(k[0]), int(k[1]))):
+            (name_offset, name_length) = add_string(machines[shape]['name'])
+            machine_records.append((key_offset, key_length, name_offset, name_length,
+                                    int(shape[0]), int(shape[1])))
+
+    strings_offset = (HEADER.size
+                      + SKU.size * len(sku_records)
+                      + TIER.size * len(tier_records)
+                      + MACHINE.size * len(machine_records))
+
+    tmp_path = '{0}.tmp'.format(path)
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(sku_records), len(tier_records), len(machine_records)))
+        for (offset, length, factor, first_tier, tier_count) in sku_records:
+            f.write(SKU.pack(strings_offset + offset, length, factor, first_tier, tier_count))
+        for record in tier_records:
+            f.write(TIER.pack(*record))
+        for (key_offset, key_length, name_offset, name_length, cpus, memory_mb) in machine_records:
+            f.write(MACHINE.pack(strings_offset + key_offset, key_length,
+                                 strings_offset + name_offset, name_length,
+                                 cpus, memory_mb))
+        f.write(bytes(strings))
+    os.rename(tmp_path, path)
+
+    logging.info("Wrote {} skus and {} machine types to pricing index {}".format(
+        len(sku_records), len(machine_records), path))
+
+def _catalog_key(zone, project):
+    return '{}/{}'.format(project, zone).encode('utf-8')
+
+class PricingIndex(object):
+    def __init__(self, path):
+        '''
+        A read-only, memory-mapped pricing index.  It can be used in place
+        of the sku list dictionary of GoogleServices.
+        '''
+        self.path = path
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, self.sku_count, self.tier_count, self.machine_count) = \
+            HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            raise Exception("'{}' is not a cromulent pricing index!".format(path))
+
+        self.tiers_offset = HEADER.size + SKU.size * self.sku_count
+        self.machines_offset = self.tiers_offset + TIER.size * self.tier_count
+
+        # the handful of skus used for pricing are decoded only once
+        self._skus = {}
+
+    # -- __init__
+
+    def _string(self, offset, length):
+        return self.data[offset:offset + length]
+
+    def _sku_record(self, i):
+        return SKU.unpack_from(self.data, HEADER.size + SKU.size * i)
+
+    def _machine_record(self, i):
+        return MACHINE.unpack_from(self.data, self.machines_offset + MACHINE.size * i)
+
+    def _bisect(self, count, record_fn, key):
+        # the leftmost record whose key is >= key
+        (lo, hi) = (0, count)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            record = record_fn(mid)
+            if self._string(record[0], record[1]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _find_sku(self, description):
+        key = description.encode('utf-8')
+        i = self._bisect(self.sku_count, self._sku_record, key)
+        if i < self.sku_count:
+            record = self._sku_record(i)
+            if self._string(record[0], record[1]) == key:
+                return record
+        return None
+
+    # -- sku list (dictionary) interface
+
+    def __contains__(self, description):
+        return description in self._skus or self._find_sku(description) is not None
+
+    def __getitem__(self, description):
+        if description in self._skus:
+            return self._skus[description]
+
+        record = self._find_sku(description)
+        if record is None:
+            raise KeyError(description)
+
+        (_, _, factor, first_tier, tier_count) = record
+        tiers = []
+        for i in range(first_tier, first_tier + tier_count):
+            (start, units, nanos) = TIER.unpack_from(self.data, self.tiers_offset + TIER.size * i)
+            tiers.append({
+                'startUsageAmount' : start,
+                'unitPrice' : { 'units' : str(units), 'nanos' : nanos },
+            })
+
+        # the same shape as the skus from the cloud billing api
+        sku = {
+            'description' : description,
+            'pricingInfo' : [{
+                'pricingExpression' : {
+                    'baseUnitConversionFactor' : factor,
+                    'tieredRates' : tiers,
+                }
+            }]
+        }
+        self._skus[description] = sku
+        return sku
+
+    def get(self, description, default=None):
+        try:
+            return self[description]
+        except KeyError:
+            return default
+
+    def __len__(self):
+        return self.sku_count
+
+    def __iter__(self):
+        for i in range(self.sku_count):
+            record = self._sku_record(i)
+            yield self._string(record[0], record[1]).decode('utf-8')
+
+    def keys(self):
+        return list(iter(self))
+
+    # -- machine type catalogs
+
+    def get_compute_types(self, zone, project):
+        '''
+        The machine types available in a zone (in the same format as
+        GoogleServices.get_available_compute_types), or None if the zone
+        is not in the index.
+        '''
+        key = _catalog_key(zone, project)
+        i = self._bisect(self.machine_count, self._machine_record, key)
+
+        machines = None
+        while i < self.machine_count:
+            (key_offset, key_length, name_offset, name_length, cpus, memory_mb) = \
+                self._machine_record(i)
+            if self._string(key_offset, key_length) != key:
+                break
+            if machines is None:
+                machines = {}
+            machines[(cpus, memory_mb)] = {
+                'name' : self._string(name_offset, name_length).decode('utf-8'),
+                'guestCpus' : cpus,
+                'memoryMb' : memory_mb,
+            }
+            i += 1
+
+        return machines
+
+    def close(self):
+        self.data.close()
+
+# -- PricingIndex (end)
@@ -0,0 +1,95 @@
+from __future__ import division
+
+import logging, os
+
+# -- Profiling
+#
+# Runs a command under cProfile, writing a pstats file (see the pstats
+# module, or snakeviz), and/or under tracemalloc, writing a text report of
+# the top allocation sites and the peak memory.  tracemalloc needs python
+# 3.4 or later.
+
+# the number of allocation sites in a memory profile report
+TOP_SITES = 25
+
+class CpuProfile(object):
+    def __init__(self, path):
+        self.path = path
+        self.profile = None
+
+    def start(self):
+        import cProfile
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def stop(self):
+        if self.profile is None:
+            return
+        self.profile.disable()
+        self.profile.dump_stats(self.path)
+        self.profile = None
+        logging.info("Wrote the cpu profile to {}".format(self.path))
+
+class MemoryProfile(object):
+    def __init__(self, path, top=TOP_SITES):
+        self.path = path
+        self.top = top
+        self.started = False
+
+    def start(self):
+        try:
+            import tracemalloc
+        except ImportError:
+            raise Exception("Memory profiles need tracemalloc (python 3.4 or later)")
+        tracemalloc.start()
+        self.started = True
+
+    def stop(self):
+        if not self.started:
+            return
+        import tracemalloc
+        snapshot = tracemalloc.take_snapshot()
+        (current, peak) = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.started = False
+
+        # leave out the allocations of the profiling itself
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        ])
+        with open(self.path, 'w') as f:
+            f.write(memory_report(snapshot.statistics('lineno'), current, peak, self.top))
+        logging.info("Wrote the memory profile to {}".format(self.path))
+
+# -- MemoryProfile (end)
+
+def memory_report(statistics, current, peak, top=TOP_SITES):
+    '''
+    The text report of the top allocation sites (tracemalloc Statistic
+    objects, largest first) and of the current and peak traced memory
+    '''
+    lines = [
+        'peak memory    : {}'.format(_size(peak)),
+        'current memory : {}'.format(_size(current)),
+        '',
+        'top {} allocation sites:'.format(min(top, len(statistics))),
+    ]
+    for (i, stat) in enumerate(statistics[:top], 1):
+        frame = stat.traceback[0]
+        lines.append('{:3d}. {}:{}: {} in {} blocks'.format(
+            i, _short_path(frame.filename), frame.lineno, _size(stat.size), stat.count))
+    return '\n'.join(lines) + '\n'
+
+def _short_path(path):
+    # the path relative to the installed packages or the working directory
+    for prefix in ('site-packages' + os.sep, os.getcwd() + os.sep):
+        if prefix in path:
+            return path.split(prefix, 1)[1]
+    return path
+
+def _size(nbytes):
+    for unit in ('B', 'KiB', 'MiB'):
+        if abs(nbytes) < 1024:
+            return '{:.1f} {}'.format(nbytes, unit)
+        nbytes /= 1024
+    return '{:.1f} GiB'.format(nbytes)
@@ -0,0 +1,194 @@
+from __future__ import division
+
+import json, threading, time
+
+import cromulent.utils as utils
+
+# -- Progress meter
+#
+# Counts of the work done by a long running command (jobs priced,
+# operations and metadata fetched, cache hits), rendered at most every
+# INTERVAL seconds as a live line on stderr and/or as JSON Lines
+# snapshots.  Counting is a dictionary increment and a clock read, and
+# does nothing at all while the meter is disabled, so the meter is left
+# on by default.  A background thread keeps rendering while nothing is
+# counted, so a stalled command shows as "idle".
+#
+# The counts are:
+#
+#   jobs          jobs (call attempts) gone through by the cost estimator
+#   priced        jobs priced
+#   operations    genomics operations fetched from google
+#   metadata      workflow metadata fetched from cromwell
+#   workflows     workflows done (estimate-batch)
+#   cache-hits    lookups answered by a local cache (the cost checkpoint
+#   cache-misses  or the metadata store) -- or not
+
+#
+# The log records written to the stream of the live line (see
+# Meter.clear_around) clear the line first and redraw it after, so that
+# the two do not garble each other.
+
+# seconds between renderings
+INTERVAL = 0.5
+
+class Meter(object):
+    def __init__(self):
+        self.enabled = False
+        self.live = None
+        self.json_out = None
+        self.lock = threading.Lock()
+        self.ticker = None
+        # the live line on the screen, if any
+        self.line = None
+        self.reset()
+
+    def reset(self):
+        self.counts = {}
+        self.expected = 0
+        self.start = time.time()
+        self.last_event = self.start
+        self.next_render = 0
+
+    def enable(self, live=None, json_out=None):
+        '''
+        Render the live line to the live stream (e.g. sys.stderr) and the
+        JSON Lines snapshots to the json_out stream
+        '''
+        self.live = live
+        self.json_out = json_out
+        self.enabled = live is not None or json_out is not None
+        self.reset()
+
+    def _start_ticker(self):
+        self.ticker = threading.Thread(target=self._tick, name='cromulent-progress')
+        self.ticker.daemon = True
+        self.ticker.start()
+
+    def _tick(self):
+        while True:
+            time.sleep(INTERVAL)
+            if self.enabled and self.counts and time.time() >= self.next_render:
+                self.render()
+
+    def disable(self):
+        with self.lock:
+            self.enabled = False
+            (self.live, self.json_out) = (None, None)
+            self.line = None
+
+    def clear_around(self, handler):
+        '''
+        Clear the live line before the records of a logging handler (that
+        writes to the live stream) are emitted, and redraw it after
+        '''
+        emit = handler.emit
+
+        def clearing_emit(record):
+            with self.lock:
+                if self.line is None:
+                    emit(record)
+                    return
+                self.live.write('\r\x1b[K')
+                self.live.flush()
+                emit(record)
+                self.live.write(self.line)
+                self.live.flush()
+        handler.emit = clearing_emit
+
+    # -- counting
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        self.counts[name] = self.counts.get(name, 0) + n
+        if self.ticker is None:
+            self._start_ticker()
+        now = time.time()
+        self.last_event = now
+        if now >= self.next_render:
+            self.render(now)
+
+    def expect(self, n):
+        '''
+        n more jobs are known to be coming (for the queue depth and ETA)
+        '''
+        if self.enabled:
+            self.expected += n
+
+    # -- rendering
+
+    def snapshot(self, now=None):
+        now = now if now is not None else time.time()
+        elapsed = max(now - self.start, 1e-6)
+        counts = self.counts
+        jobs = counts.get('jobs', 0)
+        queue = max(self.expected - jobs, 0)
+        lookups = counts.get('cache-hits', 0) + counts.get('cache-misses', 0)
+        rate = jobs / elapsed
+        return {
+            'elapsed'            : round(elapsed, 3),
+            'idle'               : round(now - self.last_event, 3),
+            'jobs'               : jobs,
+            'expected'           : self.expected,
+            'queue'              : queue,
+            'priced'             : counts.get('priced', 0),
+            'priced_per_sec'     : round(counts.get('priced', 0) / elapsed, 3),
+            'operations'         : counts.get('operations', 0),
+            'operations_per_sec' : round(counts.get('operations', 0) / elapsed, 3),
+            'metadata'           : counts.get('metadata', 0),
+            'workflows'          : counts.get('workflows', 0),
+            'cache_hit_rate'     : round(counts.get('cache-hits', 0) / lookups, 3) if lookups else None,
+            'eta'                : round(queue / rate, 1) if rate and queue else None,
+        }
+
+    def render(self, now=None):
+        now = now if now is not None else time.time()
+        self.next_render = now + INTERVAL
+        with self.lock:
+            snapshot = self.snapshot(now)
+            if self.json_out is not None:
+                self.json_out.write(json.dumps(snapshot, sort_keys=True))
+                self.json_out.write('\n')
+                self.json_out.flush()
+            if self.live is not None:
+                self.line = '\r{}\x1b[K'.format(_line(snapshot))
+                self.live.write(self.line)
+                self.live.flush()
+
+    def close(self):
+        # a last rendering with the final counts
+        if not self.enabled or not self.counts:
+            return
+        self.render()
+        if self.live is not None:
+            self.live.write('\n')
+            self.live.flush()
+        self.disable()
+
+# -- Meter (end)
+
+def _line(snapshot):
+    parts = []
+    if snapshot['expected'] or snapshot['jobs']:
+        parts.append('jobs {}/{}'.format(snapshot['jobs'], snapshot['expected']))
+    if snapshot['priced']:
+        parts.append('priced {} ({:.1f}/s)'.format(snapshot['priced'], snapshot['priced_per_sec']))
+    if snapshot['operations']:
+        parts.append('ops {} ({:.1f}/s)'.format(snapshot['operations'], snapshot['operations_per_sec']))
+    if snapshot['metadata']:
+        parts.append('metadata {}'.format(snapshot['metadata']))
+    if snapshot['workflows']:
+        parts.append('workflows {}'.format(snapshot['workflows']))
+    if snapshot['queue']:
+        parts.append('queue {}'.format(snapshot['queue']))
+    if snapshot['cache_hit_rate'] is not None:
+        parts.append('cache {:.0f}%'.format(100 * snapshot['cache_hit_rate']))
+    if snapshot['eta'] is not None:
+        parts.append('eta {}'.format(utils.hms(snapshot['eta'])))
+    if snapshot['idle'] >= 10:
+        parts.append('idle {}'.format(utils.hms(snapshot['idle'])))
+    return '[cromulent] ' + ' | '.join(parts)
+
+# the meter of this process
+meter = Meter()
@@ -0,0 +1,134 @@
+from __future__ import print_function
+
+import json, numbers, sys
+
+# -- Streaming table renderer
+#
+# A replacement of tabulate for reports with a large (or unknown) number
+# of rows.  tabulate needs all the rows up front to size the columns;
+# TableWriter sizes the columns from the first rows (or from fixed
+# widths) and then writes every row as soon as it is produced, so the
+# time to the first line and the memory used do not grow with the number
+# of rows.  Values wider than their column are written in full.
+
+FORMATS = ('simple', 'tsv', 'jsonl')
+
+# the number of rows used to size the columns of the "simple" format
+SAMPLE_SIZE = 100
+
+class TableWriter(object):
+    def __init__(self, headers, fmt='simple', out=None, widths=None,
+                 sample_size=SAMPLE_SIZE, floatfmt='g'):
+        '''
+        Writes the rows of a table to out (default: stdout) in one of the
+        FORMATS.  widths optionally fixes the column widths of the "simple"
+        format instead of sizing them from a sample of the rows.
+        '''
+        if fmt not in FORMATS:
+            raise Exception("Unknown table format '{}' (use one of: {})".format(
+                fmt, ', '.join(FORMATS)))
+        self.headers = list(headers)
+        self.fmt = fmt
+        self.out = out if out is not None else sys.stdout
+        self.widths = list(widths) if widths is not None else None
+        self.sample_size = sample_size
+        self.floatfmt = floatfmt
+        self.numeric = None
+        self.sample = []
+        self.started = False
+
+    # -- __init__
+
+    def _text(self, value):
+        if value is None:
+            return ''
+        if isinstance(value, float):
+            return format(value, self.floatfmt)
+        return '{}'.format(value)
+
+    def _start(self):
+        self.started = True
+        if self.fmt == 'tsv':
+            self._write_line('\t'.join([ _tsv(h) for h in self.headers ]))
+        elif self.fmt == 'simple':
+            # numeric columns (in the sample) are right aligned
+            self.numeric = [ True ] * len(self.headers)
+            for row in self.sample:
+                for (i, v) in enumerate(row):
+                    if v is not None and not _is_number(v):
+                        self.numeric[i] = False
+            if self.widths is None:
+                self.widths = [ len(h) for h in self.headers ]
+                for row in self.sample:
+                    for (i, v) in enumerate(row):
+                        self.widths[i] = max(self.widths[i], len(self._text(v)))
+            self._write_line('  '.join([ self._pad(i, h) for (i, h) in enumerate(self.headers) ]))
+            self._write_line('  '.join([ '-' * w for w in self.widths ]))
+
+        sample = self.sample
+        self.sample = None
+        for row in sample:
+            self._write_row(row)
+
+    def _pad(self, i, text):
+        if self.numeric[i]:
+            return text.rjust(self.widths[i])
+        return text.ljust(self.widths[i])
+
+    def _write_line(self, line):
+        self.out.write(line.rstrip() if self.fmt == 'simple' else line)
+        self.out.write('\n')
+
+    def _write_row(self, row):
+        if self.fmt == 'jsonl':
+            self.out.write(json.dumps(dict(zip(self.headers, row)), sort_keys=True, default=_json))
+            self.out.write('\n')
+        elif self.fmt == 'tsv':
+            self._write_line('\t'.join([ _tsv(self._text(v)) for v in row ]))
+        else:
+            self._write_line('  '.join([ self._pad(i, self._text(v)) for (i, v) in enumerate(row) ]))
+
+    # -- writing
+
+    def write(self, row):
+        row = list(row)
+        if self.started:
+            self._write_row(row)
+            return
+
+        self.sample.append(row)
+        sized = self.fmt != 'simple' or self.widths is not None
+        if sized or len(self.sample) >= self.sample_size:
+            self._start()
+
+    def close(self):
+        if not self.started:
+            self._start()
+        self.out.flush()
+
+# -- TableWriter (end)
+
+def render(rows, headers, fmt='simple', out=None, widths=None, sample_size=SAMPLE_SIZE, floatfmt='g'):
+    '''
+    Write all the rows (any iterable) of a table
+    '''
+    writer = TableWriter(headers, fmt=fmt, out=out, widths=widths,
+                         sample_size=sample_size, floatfmt=floatfmt)
+    for row in rows:
+        writer.write(row)
+    writer.close()
+
+def _is_number(value):
+    return isinstance(value, numbers.Number) and not isinstance(value, bool)
+
+def _json(value):
+    # the values json can not encode, like the DATETIME and DECIMAL
+    # columns of the database
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    return str(value)
+
+def _tsv(text):
+    return text.replace('\t', ' ').replace('\n', ' ')
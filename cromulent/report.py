@@ -1,17 +1,27 @@
 from __future__ import division, print_function
 from pprint import pprint
 from functools import partial
-import json
+from multiprocessing.pool import ThreadPool
+import json, sys
 
 import cromulent.utils as utils
+from cromulent import metrics
 
-from clint.textui import puts, indent, colored
-from tabulate import tabulate
-from cytoolz.itertoolz import frequencies, take
-from cytoolz.curried import pipe, map, filter, get
-from cytoolz.dicttoolz import merge, valmap, get_in
+from clint.textui import indent, colored
+import clint.textui
 
+def puts(s='', newline=True):
+    # clint's puts writes to the sys.stdout of import time, and the daemon
+    # captures the reports it generates by replacing sys.stdout
+    clint.textui.puts(s, newline=newline, stream=lambda text: sys.stdout.write(text))
+
+# NOTE: tabulate is imported by the reports that use it, so that the
+#       simple status displays stay cheap to import.  The reports with one
+#       row per call (or more) stream their tables with cromulent.render.
+
+@metrics.timed('report.cost')
 def standard_cost_report(wf_id, json_costs, display_nano_dollars):
+    from tabulate import tabulate
     units = partial(dollar_units, display_nano_dollars)
     display = partial(display_dollars, display_nano_dollars)
     puts('=== Workflow: {} ==='.format(wf_id))
@@ -33,9 +43,7 @@ def standard_cost_report(wf_id, json_costs, display_nano_dollars):
         total_mem_cost += task_mem_cost
         total_disk_cost += task_disk_cost
 
-        total_task_calls = 0
-        for item in json_costs[k]['items']:
-            total_task_calls += len(item.keys())
+        total_task_calls = _task_shard_count(json_costs[k])
         total_calls += total_task_calls
 
         avg_task_cost = task_cost / float(total_task_calls)
@@ -68,10 +76,89 @@ def standard_cost_report(wf_id, json_costs, display_nano_dollars):
         puts(colored.yellow("Total Calls : {}".format(total_calls)))
         puts('================================')
 
-def raw_cost_report(wf_id, json_costs):
+def raw_cost_report(wf_id, json_costs, in_flight=None):
     data = { 'id' : wf_id, 'tasks' : json_costs }
+    if in_flight:
+        data['in-flight'] = in_flight
     print(json.dumps(data, sort_keys=True, indent=4))
 
+def in_flight_report(in_flight):
+    from tabulate import tabulate
+    if not in_flight:
+        return
+
+    headers = ['task', 'shard', 'jobId']
+    table = [ [ j['task'], j['shard'], j['jobId'] or '-' ] for j in in_flight ]
+
+    puts()
+    with indent(4, quote=''):
+        puts(colored.yellow('= In-Flight ({} not yet priced) ='.format(len(in_flight))))
+        puts(tabulate(table, headers, tablefmt="simple"))
+
+@metrics.timed('report.what-if')
+def what_if_report(wf_id, operation_count, results, display_nano_dollars, fmt='simple'):
+    import cromulent.render as render
+    units = partial(dollar_units, display_nano_dollars)
+    unit = 'nano dollars (USD)' if display_nano_dollars else 'dollars (USD)'
+    if fmt == 'simple':
+        puts('=== Workflow: {} ({} operations) ==='.format(wf_id, operation_count))
+        puts()
+        puts("Prices in: '{}'".format(unit))
+        puts()
+
+    def as_run(value):
+        return 'as-run' if value is None else value
+
+    headers = ['tier-scheme', 'region', 'preemptible', 'family',
+               'cpu', 'mem', 'disk', 'total', 'change']
+    def what_if_rows():
+        for (scenario, cost, as_run_cost) in results:
+            row = [ scenario.tier_scheme, as_run(scenario.region),
+                    as_run(scenario.preemptible), as_run(scenario.family) ]
+            if cost is None:
+                yield row + [None] * 5
+                continue
+            total = cost['cpu'] + cost['mem'] + cost['disk']
+            change = None
+            if as_run_cost is not None:
+                as_run_total = as_run_cost['cpu'] + as_run_cost['mem'] + as_run_cost['disk']
+                if as_run_total:
+                    change = '{:+.1f}%'.format(100.0 * (total - as_run_total) / as_run_total)
+            yield row + [ units(cost['cpu']), units(cost['mem']), units(cost['disk']),
+                          units(total), change ]
+    floatfmt = '.4e' if display_nano_dollars else '.3f'
+    render.render(what_if_rows(), headers, fmt=fmt, floatfmt=floatfmt)
+
+@metrics.timed('report.shapes')
+def shapes_report(wf_id, tasks, display_nano_dollars, fmt='simple'):
+    import cromulent.render as render
+    units = partial(dollar_units, display_nano_dollars)
+    if fmt == 'simple':
+        unit = 'nano dollars (USD)' if display_nano_dollars else 'dollars (USD)'
+        puts('=== Workflow: {} ==='.format(wf_id))
+        puts()
+        puts("Prices in: '{}' (cpu and memory only)".format(unit))
+        puts()
+
+    headers = ['task', 'jobs', 'machine', 'recommended', 'cost', 'projected', 'savings', 'savings %']
+    def shape_rows():
+        for call in sorted(tasks, key=lambda c: tasks[c]['projected'] - tasks[c]['cost']):
+            task = tasks[call]
+            savings = task['cost'] - task['projected']
+            share = '{:.1f}%'.format(100.0 * savings / task['cost']) if task['cost'] else None
+            yield [ call, task['jobs'], task['machine'], task['recommended'] or 'NA',
+                    units(task['cost']), units(task['projected']), units(savings), share ]
+    floatfmt = '.4e' if display_nano_dollars else '.3f'
+    render.render(shape_rows(), headers, fmt=fmt, floatfmt=floatfmt)
+
+    if fmt == 'simple':
+        cost = sum([ t['cost'] for t in tasks.values() ])
+        projected = sum([ t['projected'] for t in tasks.values() ])
+        puts()
+        puts(colored.green("Total Savings : {} of {}".format(
+            display_dollars(display_nano_dollars, units(cost - projected)),
+            display_dollars(display_nano_dollars, units(cost)))))
+
 def display_workflow_status(wf_id, status):
     if status == 'Failed':
         color = colored.red
@@ -97,10 +184,18 @@ def workflow_report_dispatcher():
     dispatch = {
         'summary' : wf_summary,
         'failures': wf_failures,
+        'critical-path' : wf_critical_path,
+        'phases' : wf_phases,
+        'concurrency' : wf_concurrency,
     }
     return dispatch
 
-def workflow_report(report, metadata, opts):
+def operation_report_types():
+    # the reports that need the genomics operations of the calls
+    return ('phases', 'concurrency')
+
+def workflow_report(report, metadata, opts, fmt='simple', google=None):
+    import cromulent.calltable as calltable
     dispatch = workflow_report_dispatcher()
 
     if report not in dispatch:
@@ -108,10 +203,24 @@ def workflow_report(report, metadata, opts):
         logger.error(msg)
         raise Exception(msg)
 
+    # the call attempts are extracted from the metadata once, in a single
+    # pass, and shared by the reports
+    if report in operation_report_types():
+        if google is None:
+            raise Exception("The '{}' report needs the google services".format(report))
+        # the jobs of (inlined) subworkflows ran on the pipelines api too
+        calls = calltable.CallTable.from_metadata(metadata, expand=True)
+        calls.load_operations(google)
+    else:
+        calls = calltable.CallTable.from_metadata(metadata, expand=False)
+
     fn = dispatch[report]
-    fn(metadata, opts)
+    with metrics.timer('report.{}'.format(report)):
+        fn(metadata, calls, opts, fmt)
+
+def wf_summary(metadata, calls, opts, fmt='simple'):
+    import cromulent.render as render
 
-def wf_summary(metadata, opts):
     overall_wf_attributes = (
         'id', 'status',
         'workflowName', 'workflowRoot',
@@ -121,58 +230,158 @@ def wf_summary(metadata, opts):
     (wf_id, wf_status, wf_name, wf_root, wf_submission, wf_start) = \
             [metadata[x] for x in overall_wf_attributes]
 
-    wf_end = get('end', metadata, default="-")
+    wf_end = metadata.get('end', "-")
 
-    puts('')
-    puts("ID         : {}".format(wf_id))
-    puts("Status     : {}".format(wf_status))
-    puts("Submit Time: {} (UTC)".format(wf_submission))
-    puts("Start  Time: {} (UTC)".format(wf_start))
-    puts("End    Time: {} (UTC)".format(wf_end))
-    puts("Root       : {}".format(wf_root))
-    puts('')
+    # the tsv and jsonl formats are just the table
+    if fmt == 'simple':
+        puts('')
+        puts("ID         : {}".format(wf_id))
+        puts("Status     : {}".format(wf_status))
+        puts("Submit Time: {} (UTC)".format(wf_submission))
+        puts("Start  Time: {} (UTC)".format(wf_start))
+        puts("End    Time: {} (UTC)".format(wf_end))
+        puts("Root       : {}".format(wf_root))
+        puts('')
 
-    (calls, states, stats) = _get_wf_call_statuses(metadata)
-
-    table = []
-    for c in calls:
-        counts = [ stats[c][s] for s in states ]
-        row = [c]
-        row.extend(counts)
-        table.append(row)
+    (call_names, states, stats) = _get_wf_call_statuses(calls)
 
     headers = ['call']
     headers.extend([ s for s in states ])
-    print(tabulate(table, headers=headers))
+    rows = ( [c] + [ stats[c][s] for s in states ] for c in call_names )
+    render.render(rows, headers, fmt=fmt)
 
-def _get_wf_call_statuses(metadata):
-    calls = metadata['calls'].keys()
-    states = set([])
+def _get_wf_call_statuses(calls):
     call_stats = {}
+    for (call, state) in zip(calls['call'], calls['status']):
+        counts = call_stats.setdefault(call, {})
+        counts[state] = counts.get(state, 0) + 1
 
-    for c in calls:
-        tasks = metadata['calls'][c]
-        counts = pipe(tasks, map(get('executionStatus')),
-                             frequencies)
-        new_states = list(filter(lambda x: x not in states, counts.keys()))
-        if new_states:
-            for s in new_states: states.add(s)
-        call_stats[c] = counts
+    states = sorted(set([ s for counts in call_stats.values() for s in counts ]))
+    call_names = sorted(call_stats.keys())
 
-    base_states = { s : 0 for s in states }
+    final_stats = {}
+    for c in call_names:
+        final_stats[c] = dict([ (s, call_stats[c].get(s, 0)) for s in states ])
+    return (call_names, states, final_stats)
 
-    final_stats = valmap(lambda d: merge(base_states, d), call_stats)
-    return (calls, sorted(states), final_stats)
+def wf_critical_path(metadata, calls, opts, fmt='simple'):
+    import cromulent.analysis as analysis
+    import cromulent.render as render
+    extra_opts = utils.parse_wf_report_opts(opts)
+    factor = float(extra_opts.get('straggler', 3.0))
+    min_seconds = float(extra_opts.get('min-excess', 60.0))
+    top = int(extra_opts.get('top', 20))
+
+    path = analysis.critical_path(calls)
+    if fmt == 'simple':
+        puts('')
+        puts("ID         : {}".format(metadata['id']))
+        if path:
+            wall = calls['end'][path[-1]] - calls['start'][path[0]]
+            busy = sum([ calls['end'][i] - calls['start'][i] for i in path ])
+            puts("Wall Clock : {} (critical path)".format(utils.hms(wall)))
+            puts("Waiting    : {} (between the critical path calls)".format(utils.hms(wall - busy)))
+        puts('')
+        # cromwell's metadata has no call dependencies, so they are inferred
+        puts(colored.yellow("= Critical Path (inferred: each call waited on another call "
+                            "that ended last before it started) ="))
+
+    headers = ['call', 'shard', 'attempt', 'start', 'duration', 'wait']
+    def path_rows():
+        previous_end = None
+        for i in path:
+            (start, end) = (calls['start'][i], calls['end'][i])
+            wait = start - previous_end if previous_end is not None else 0.0
+            previous_end = end
+            yield [ calls['call'][i], calls['shard'][i], calls['attempt'][i],
+                    _iso(start), utils.hms(end - start), utils.hms(wait) ]
+    render.render(path_rows(), headers, fmt=fmt)
+
+    flagged = analysis.stragglers(calls, factor, min_seconds)
+    if fmt == 'simple':
+        puts('')
+        puts(colored.yellow("= Stragglers ({} attempts over {}x their call's median, top {}) =".format(
+            len(flagged), factor, top)))
+
+    headers = ['call', 'shard', 'attempt', 'jobId', 'duration', 'median', 'ratio']
+    rows = ( [ calls['call'][i], calls['shard'][i], calls['attempt'][i], calls['job_id'][i],
+               utils.hms(d), utils.hms(median), round(d / median, 1) if median else None ]
+             for (i, d, median) in flagged[:top] )
+    render.render(rows, headers, fmt=fmt)
+
+def wf_phases(metadata, calls, opts, fmt='simple'):
+    import cromulent.analysis as analysis
+    import cromulent.render as render
+
+    summary = analysis.phase_summary(calls)
+    overall = summary.pop('*', {})
+    if fmt == 'simple':
+        puts('')
+        puts("ID         : {}".format(metadata['id']))
+        jobs = max([ n for (n, _, _, _) in overall.values() ] or [0])
+        puts("Jobs       : {}".format(jobs))
+        grand_total = sum([ t for (_, _, _, t) in overall.values() ])
+        for phase in analysis.PHASES:
+            if phase in overall:
+                total = overall[phase][3]
+                puts("{:<15}: {} ({:.1f}%)".format(
+                    phase, utils.hms(total), 100.0 * total / grand_total if grand_total else 0.0))
+        puts('')
+
+    headers = ['call', 'phase', 'jobs', 'p50', 'p90', 'max', 'total', 'share']
+    def phase_rows():
+        for call in sorted(summary):
+            call_total = sum([ t for (_, _, _, t) in summary[call].values() ])
+            for phase in analysis.PHASES:
+                if phase not in summary[call]:
+                    continue
+                (n, (p50, p90), longest, total) = summary[call][phase]
+                share = round(100.0 * total / call_total, 1) if call_total else None
+                yield [ call, phase, n, utils.hms(p50), utils.hms(p90), utils.hms(longest), utils.hms(total), share ]
+    render.render(phase_rows(), headers, fmt=fmt)
+
+def wf_concurrency(metadata, calls, opts, fmt='simple'):
+    import cromulent.analysis as analysis
+    import cromulent.render as render
+    extra_opts = utils.parse_wf_report_opts(opts)
 
-def wf_failures(metadata, opts):
+    usage = analysis.concurrency(calls.operations)
+    if fmt == 'simple':
+        puts('')
+        puts("ID         : {}".format(metadata['id']))
+        puts("Regions    : {}".format(', '.join(sorted(usage)) or '-'))
+        puts('')
+
+    headers = ['region', 'resource', 'peak', 'at']
+    rows = ( [ region, resource, _round(peaks[resource][0]),
+               _iso(peaks[resource][1]) if peaks[resource][1] is not None else None ]
+             for region in sorted(usage)
+             for (timeline, peaks) in [ usage[region] ]
+             for resource in analysis.RESOURCES )
+    render.render(rows, headers, fmt=fmt)
+
+    if 'timeline' in extra_opts:
+        if fmt == 'simple':
+            puts('')
+            puts(colored.yellow("= Timeline ="))
+        headers = ['region', 'time'] + list(analysis.RESOURCES)
+        rows = ( [ region, _iso(t) ] + [ _round(v) for v in held ]
+                 for region in sorted(usage)
+                 for (t, held) in usage[region][0] )
+        render.render(rows, headers, fmt=fmt)
+
+def wf_failures(metadata, calls, opts, fmt='simple'):
     extra_opts = utils.parse_wf_report_opts(opts)
 
-    fails = _get_wf_call_failures(metadata, extra_opts)
+    fails = _get_wf_call_failures(calls, extra_opts)
 
     if 'detail' in extra_opts:
+        if 'tail' in extra_opts:
+            _read_stderr_tails(fails, int(extra_opts['tail']) * 1024,
+                               int(extra_opts.get('tail-threads', 16)))
         _generate_detail_wf_failure_report(fails, extra_opts)
     else:
-        _generate_basic_wf_failure_report(fails, extra_opts)
+        _generate_basic_wf_failure_report(fails, extra_opts, fmt)
 
 def _generate_detail_wf_failure_report(fails, opts):
     for call in fails:
@@ -199,6 +408,11 @@ def _generate_detail_wf_failure_report(fails, opts):
                 puts()
                 with indent(2, quote=''):
                     puts(f['stderr'])
+                tail = f.get('stderr_tail', None)
+                if tail:
+                    puts()
+                    with indent(2, quote='| '):
+                        puts(tail.rstrip('\n'))
                 puts()
                 puts(colored.green("--- jes: ---"))
                 puts()
@@ -213,58 +427,91 @@ def _generate_detail_wf_failure_report(fails, opts):
                     puts(inputs)
             puts()
 
-def _generate_basic_wf_failure_report(fails, opts):
-    headers = ['call', 'shard', 'jobId', 'rc', 'stderr']
-    table = []
+def _read_stderr_tails(fails, nbytes, threads):
+    # the stderr files are read concurrently, so the total time is bound by
+    # the slowest file (e.g. on a shared filesystem), not the sum of them
+    paths = sorted(set([ f['stderr'] for call in fails for f in fails[call] if f['stderr'] ]))
+    if not paths:
+        return
+
+    pool = ThreadPool(max(1, min(threads, len(paths))))
+    try:
+        tails = dict(zip(paths, pool.map(partial(_tail_stderr, nbytes), paths)))
+    finally:
+        pool.close()
+        pool.join()
+
     for call in fails:
         for f in fails[call]:
-            row = [ call, f['shard'], f['jobId'], f['rc'], f['stderr'] ]
-            table.append(row)
+            f['stderr_tail'] = tails.get(f['stderr'], None)
+
+def _tail_stderr(nbytes, path):
+    try:
+        return utils.tail_file(path, nbytes)
+    except (IOError, OSError, ValueError) as e:
+        return '[could not read {}: {}]'.format(path, e)
+
+def _generate_basic_wf_failure_report(fails, opts, fmt='simple'):
+    import cromulent.render as render
+    headers = ['call', 'shard', 'jobId', 'rc', 'stderr']
+    rows = ( [ call, f['shard'], f['jobId'], f['rc'], f['stderr'] ]
+             for call in fails for f in fails[call] )
 
-    puts('')
-    print(tabulate(table, headers=headers))
+    if fmt == 'simple':
+        puts('')
+    render.render(rows, headers, fmt=fmt)
 
-def _get_wf_call_failures(metadata, opts):
-    calls = []
+def _get_wf_call_failures(calls, opts):
+    call_names = None
     if 'calls' in opts:
-        calls = opts['calls'].split(',')
-    else:
-        calls = metadata['calls'].keys()
+        call_names = set(opts['calls'].split(','))
 
-    jobids = None
+    # a single scan per job id, however many job ids are asked for
+    matcher = None
     if 'jobids' in opts:
-        jobids = set(opts['jobids'].split(','))
+        matcher = utils.JobIdMatcher(opts['jobids'].split(','))
 
     fails = {}
 
-    for c in calls:
-        tasks = metadata['calls'][c]
-        failures = pipe(tasks, filter(lambda x: get('executionStatus', x) == 'Failed'),
-                               filter(lambda x: _valid_job_id(jobids, get('jobId', x))),
-                               map(lambda x: { 'jobId'   : get('jobId', x),
-#                                               'inputs'  : get('inputs', x),
-                                               'stderr'  : get('stderr', x),
-                                               'shard'   : get('shardIndex', x),
-                                               'err_msg' : get_in(['failures', 0, 'message'], x, 'NA'),
-#                                               'jes'     : get('jes', x),
-#                                               'runtime' : get('runtimeAttributes', x),
-                                               'rc'      : get('returnCode', x, 'NA') ,}),
-                               list)
-        fails[c] = failures
+    columns = zip(calls['call'], calls['status'], calls['job_id'], calls.executions)
+    for (i, (call, state, job_id, execution)) in enumerate(columns):
+        if state != 'Failed':
+            continue
+        if call_names is not None and call not in call_names:
+            continue
+        if matcher is not None and not matcher(job_id):
+            continue
+
+        execution = execution or {}
+        rc = calls['return_code'][i]
+        fails.setdefault(call, []).append({
+            'jobId'   : job_id,
+            'stderr'  : calls['stderr'][i],
+            'shard'   : calls['shard'][i],
+            'err_msg' : calls['error'][i] or 'NA',
+            'rc'      : 'NA' if rc is None else rc,
+            'inputs'  : execution.get('inputs', None),
+            'jes'     : execution.get('jes', None),
+            'runtime' : execution.get('runtimeAttributes', None),
+        })
 
     return fails
 
-def _valid_job_id(valid_jobid_text_set, full_jobid_name):
-    if valid_jobid_text_set is None:
-        return True
+# -- Helper functions ----------------------------------------------------------
 
-    for jobid_text in valid_jobid_text_set:
-        if jobid_text in full_jobid_name:
-            return True
+def _task_shard_count(task_costs):
+    # raw cost data from older cromulent versions only has the 'items'
+    if 'shards' in task_costs:
+        return task_costs['shards']
+    return sum([ len(item.keys()) for item in task_costs['items'] ])
 
-    return False
+def _round(amount):
+    # memory sizes are sums of fractional gb
+    return round(amount, 2) if isinstance(amount, float) else amount
 
-# -- Helper functions ----------------------------------------------------------
+def _iso(epoch):
+    import time
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(epoch))
 
 # convert nano dollars to standard US dollars
 def dollar_units(display_nano, amount):
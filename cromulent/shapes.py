@@ -0,0 +1,150 @@
+from __future__ import division
+
+import bisect, collections, math
+
+from cromulent.gcloud import Cpu
+
+# -- Machine shape recommendations
+#
+# For every task, the cheapest machine shape (a predefined machine type
+# of the zone's catalog, or an N1 custom shape) with at least the cores
+# and memory of the shape it ran on.  The search is precomputed per
+# (zone, project, preemptible): the predefined types are grouped by core
+# count and, within a group, sorted by memory with the running minimum of
+# the price from the largest memory down, so a lookup is a binary search
+# per core count.  Custom shapes are priced in closed form.  Results are
+# memoized per requested shape, as a workflow's tasks share few shapes.
+
+Shape = collections.namedtuple('Shape', ['name', 'cores', 'mem_mb', 'price'])
+
+# N1 custom machine types: 1 or an even number of cores (up to 96), and
+# 0.9 to 6.5 GB of memory per core in multiples of 256 MB
+CUSTOM_MAX_CORES = 96
+CUSTOM_MIN_MB_PER_CORE = 0.9 * 1024
+CUSTOM_MAX_MB_PER_CORE = 6.5 * 1024
+CUSTOM_MB_STEP = 256
+
+class ShapeRecommender(object):
+    def __init__(self, google, zone, project, preemptible):
+        '''
+        The machine shapes available in the zone, priced (in nano dollars
+        per second) with the skus of google (a GoogleServices).
+        '''
+        self.region = zone.rsplit('-', 1)[0]
+        self.preemptible = preemptible
+        classes = google.google_compute_classes()
+
+        machines = google.get_available_compute_types(zone, project) or {}
+        by_cores = collections.defaultdict(list)
+        for ((cores, mem_mb), machine) in machines.items():
+            family = machine['name'].rsplit('-', 1)[0]
+            compute_class = classes.get(family, None)
+            # the shared core types are not priced per core
+            if compute_class is None or 'with' in compute_class:
+                continue
+            prices = google.compute_unit_prices(compute_class, self.region, preemptible)
+            if prices is None:
+                continue
+            (cores, mem_mb) = (int(cores), int(mem_mb))
+            price = cores * prices[0] + (mem_mb / 1024.0) * prices[1]
+            by_cores[cores].append(Shape(machine['name'], cores, mem_mb, price))
+
+        self.levels = sorted(by_cores)
+        self.memories = []
+        self.cheapest_above = []
+        for cores in self.levels:
+            shapes = sorted(by_cores[cores], key=lambda s: s.mem_mb)
+            cheapest = list(shapes)
+            for i in range(len(shapes) - 2, -1, -1):
+                if cheapest[i + 1].price < cheapest[i].price:
+                    cheapest[i] = cheapest[i + 1]
+            self.memories.append([ s.mem_mb for s in shapes ])
+            self.cheapest_above.append(cheapest)
+
+        self.custom_prices = google.compute_unit_prices(
+            classes['custom'], self.region, preemptible)
+        self._memo = {}
+
+    # -- __init__
+
+    def _predefined(self, cores, mem_mb):
+        best = None
+        for j in range(bisect.bisect_left(self.levels, cores), len(self.levels)):
+            k = bisect.bisect_left(self.memories[j], mem_mb)
+            if k < len(self.memories[j]):
+                shape = self.cheapest_above[j][k]
+                if best is None or shape.price < best.price:
+                    best = shape
+        return best
+
+    def _custom(self, cores, mem_mb):
+        if self.custom_prices is None:
+            return None
+        cores = max(cores, int(math.ceil(mem_mb / CUSTOM_MAX_MB_PER_CORE)))
+        if cores > 1 and cores % 2:
+            cores += 1
+        if cores > CUSTOM_MAX_CORES:
+            return None
+        mem_mb = max(mem_mb, CUSTOM_MIN_MB_PER_CORE * cores)
+        mem_mb = int(math.ceil(mem_mb / CUSTOM_MB_STEP)) * CUSTOM_MB_STEP
+        price = cores * self.custom_prices[0] + (mem_mb / 1024.0) * self.custom_prices[1]
+        return Shape('custom-{}-{}'.format(cores, mem_mb), cores, mem_mb, price)
+
+    def cheapest(self, cores, mem_mb):
+        '''
+        The cheapest Shape with at least the cores and memory, or None
+        '''
+        key = (cores, mem_mb)
+        if key not in self._memo:
+            candidates = [ s for s in (self._predefined(cores, mem_mb), self._custom(cores, mem_mb))
+                           if s is not None ]
+            self._memo[key] = min(candidates, key=lambda s: s.price) if candidates else None
+        return self._memo[key]
+
+# -- ShapeRecommender (end)
+
+def recommend(google, calls):
+    '''
+    The projected compute (cpu and memory) cost of every task of calls
+    (a CallTable with its operations loaded) on the cheapest shapes that
+    fit the shapes its jobs ran on, as a dict of call -> dict of jobs,
+    machine (the most common one), recommended (the shape for it),
+    cost and projected (in nano dollars).  The preemptibility, zones and
+    billed seconds of the jobs are kept as they ran.
+    '''
+    recommenders = {}
+    classes = {}
+    tasks = {}
+    for (call, op) in zip(calls['call'], calls.operations):
+        if op is None or not op.is_finished():
+            continue
+        key = (op.zone, op.project, op.preemptible)
+        if key not in recommenders:
+            recommenders[key] = ShapeRecommender(google, *key)
+
+        task = tasks.setdefault(call, {
+            'jobs' : 0, 'machines' : collections.Counter(), 'recommended' : collections.Counter(),
+            'cost' : 0.0, 'projected' : 0.0,
+        })
+        seconds = Cpu(op.cores, op.duration()).google_pricing_duration()
+        class_key = (op.machine, op.zone, op.project)
+        if class_key not in classes:
+            classes[class_key] = google.identify_google_compute_class(op)
+        prices = google.compute_unit_prices(classes[class_key], op.region, op.preemptible)
+        cost = seconds * (op.cores * prices[0] + op.mem_gb * prices[1]) if prices else None
+        shape = recommenders[key].cheapest(op.cores, int(round(op.mem_gb * 1024)))
+
+        task['jobs'] += 1
+        task['machines'][op.machine] += 1
+        if cost is None or shape is None:
+            continue
+        task['recommended'][shape.name] += 1
+        task['cost'] += cost
+        task['projected'] += min(seconds * shape.price, cost)
+
+    for call in tasks:
+        task = tasks[call]
+        task['machine'] = task.pop('machines').most_common(1)[0][0]
+        recommended = task['recommended'].most_common(1)
+        task['recommended'] = recommended[0][0] if recommended else None
+    return tasks
@@ -1,12 +1,35 @@
-from tabulate import tabulate
+import cromulent.render as render
+from cromulent import metrics
 
-def run(db, sql_fname):
+@metrics.timed('sql.run')
+def run(db, sql_fname, fmt='simple'):
     with open(sql_fname, 'r') as f:
         sql = f.read()
-        c = db.cursor()
-        c.execute(sql)
+        c = _cursor(db)
+        with metrics.timer('sql.execute'):
+            c.execute(sql)
         headers = [field[0] for field in c.description]
-        print(tabulate(c.fetchall(), headers, tablefmt="simple"))
+        render.render(_fetch_rows(c, headers), headers, fmt=fmt)
+
+def _cursor(db):
+    # the default cursor of the mysql connections (a DictCursor) buffers
+    # the whole result set on execute; an unbuffered one streams it
+    if type(db).__module__.startswith('pymysql'):
+        import pymysql.cursors
+        return db.cursor(pymysql.cursors.SSDictCursor)
+    return db.cursor()
+
+def _fetch_rows(cursor, headers, size=1000):
+    # stream the result set instead of fetching it all at once
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            break
+        for row in rows:
+            # the mysql connections use a (SS)DictCursor
+            if isinstance(row, dict):
+                row = [ row[h] for h in headers ]
+            yield row
 
 ## -- run
 
@@ -0,0 +1,178 @@
+# -- MetadataStore
+
+import gzip, hashlib, json, logging, os, threading, time
+
+import cromulent.utils as utils
+
+# the metadata of workflows in these states never changes again
+TERMINAL_STATUSES = ('Succeeded', 'Failed', 'Aborted')
+
+# default size limit of the store (in bytes, compressed)
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# seconds between the saved access times of an entry (the index is not
+# rewritten on every lookup)
+ACCESS_RESOLUTION = 3600
+
+class MetadataStore(object):
+    def __init__(self, root=None, max_bytes=DEFAULT_MAX_BYTES):
+        '''
+        A local store of the (gzip compressed) metadata of workflows that
+        have reached a terminal state, keyed by workflow ID and the metadata
+        query parameters.  An index of the status, size and last access
+        time of every entry is kept in index.json, and the least recently
+        used entries are evicted once the store grows beyond max_bytes.
+        '''
+        self.root = root if root is not None else utils.cache_dir('metadata')
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.index = self._load_index()
+        self.removed = set()
+
+    # -- __init__
+
+    def _index_path(self):
+        return os.path.join(self.root, 'index.json')
+
+    def _entry_path(self, key):
+        return os.path.join(self.root, '{}.json.gz'.format(key))
+
+    def _load_index(self):
+        path = self._index_path()
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except ValueError:
+            logging.warning("Ignoring the corrupt metadata store index at {}".format(path))
+            return {}
+
+    def _merge_index(self):
+        # pick up the entries stored (or evicted) by other processes in the
+        # meantime, keeping the latest access times
+        index = self._load_index()
+        for key in self.removed:
+            index.pop(key, None)
+        for (key, entry) in self.index.items():
+            if key in index:
+                entry['accessed'] = max(entry['accessed'], index[key]['accessed'])
+            elif not os.path.exists(self._entry_path(key)):
+                continue
+            index[key] = entry
+        self.index = index
+
+    def _save_index(self):
+        tmp_path = '{}.{}.tmp'.format(self._index_path(), os.getpid())
+        with open(tmp_path, 'w') as f:
+            json.dump(self.index, f, sort_keys=True)
+        os.rename(tmp_path, self._index_path())
+
+    @staticmethod
+    def key(workflow_id, url_params=None):
+        # the same workflow fetched with different query parameters
+        # (e.g. the "lite" metadata) is stored as a separate variant
+        params = json.dumps(url_params or {}, sort_keys=True)
+        variant = hashlib.sha1(params.encode('utf-8')).hexdigest()[:12]
+        return '{}-{}'.format(workflow_id, variant)
+
+    # -- lookups
+
+    def get(self, workflow_id, url_params=None):
+        '''
+        The stored metadata, or None if the workflow is not in the store
+        '''
+        key = self.key(workflow_id, url_params)
+        with self.lock:
+            if key not in self.index:
+                return None
+            try:
+                with gzip.open(self._entry_path(key), 'rb') as f:
+                    metadata = json.loads(f.read().decode('utf-8'))
+            except (IOError, OSError, ValueError):
+                logging.warning("Dropping the unreadable stored metadata of {}".format(workflow_id))
+                self._merge_index()
+                if key in self.index:
+                    self._remove(key)
+                self._save_index()
+                return None
+
+            now = time.time()
+            if now - self.index[key]['accessed'] > ACCESS_RESOLUTION:
+                self._merge_index()
+                if key in self.index:
+                    self.index[key]['accessed'] = now
+                self._save_index()
+            else:
+                self.index[key]['accessed'] = now
+            logging.info("Using the stored metadata of {}".format(workflow_id))
+
+        return metadata
+
+    def status(self, workflow_id):
+        '''
+        The terminal status of a stored workflow, or None
+        '''
+        with self.lock:
+            for entry in self.index.values():
+                if entry['workflow_id'] == workflow_id:
+                    return entry['status']
+        return None
+
+    def __contains__(self, workflow_id):
+        return self.status(workflow_id) is not None
+
+    def size(self):
+        return sum([ e['size'] for e in self.index.values() ])
+
+    # -- updates
+
+    def put(self, workflow_id, url_params, metadata):
+        '''
+        Store the metadata if the workflow has reached a terminal state.
+        Returns True if the metadata was stored.
+        '''
+        status = metadata.get('status', None)
+        if status not in TERMINAL_STATUSES:
+            return False
+
+        key = self.key(workflow_id, url_params)
+        path = self._entry_path(key)
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with gzip.open(tmp_path, 'wb') as f:
+            f.write(json.dumps(metadata).encode('utf-8'))
+        os.rename(tmp_path, path)
+
+        with self.lock:
+            self._merge_index()
+            self.removed.discard(key)
+            self.index[key] = {
+                'workflow_id' : workflow_id,
+                'status'      : status,
+                'size'        : os.path.getsize(path),
+                'accessed'    : time.time(),
+            }
+            self.evict()
+            self._save_index()
+
+        logging.debug("Stored the metadata of {} ({})".format(workflow_id, status))
+        return True
+
+    def _remove(self, key):
+        path = self._entry_path(key)
+        if os.path.exists(path):
+            os.remove(path)
+        del self.index[key]
+        self.removed.add(key)
+
+    def evict(self):
+        # drop the least recently used entries until the store fits
+        total = self.size()
+        for key in sorted(self.index, key=lambda k: self.index[k]['accessed']):
+            if total <= self.max_bytes:
+                break
+            total -= self.index[key]['size']
+            logging.debug("Evicting the stored metadata of {}".format(self.index[key]['workflow_id']))
+            self._remove(key)
+
+# -- MetadataStore (end)
@@ -0,0 +1,338 @@
+from __future__ import division
+
+import datetime, random, uuid
+
+from cromulent.cromwell import Server
+from cromulent.gcloud import GoogleServices
+from cromulent.progress import meter
+
+# -- Synthetic workflows
+#
+# Realistic, reproducible workflow metadata of any size, for benchmarks
+# and load tests: calls scattered over shards, nested subworkflows, call
+# cached shards (pointing at an earlier "cache source" workflow) and
+# failed attempts that were retried.  Every job has a genomics operation,
+# which is generated from its name on demand (so the operations of a
+# large workflow are not all kept in memory), and the sku list and
+# machine type catalog to price them are generated too.  SyntheticServer
+# and SyntheticGoogle serve all of this in place of the cromwell server
+# and the google services.
+
+PROJECT = 'synthetic-project'
+ZONES = ('us-central1-b', 'us-central1-c', 'us-east4-a')
+# (cores, memory mb) of the custom machine shapes of the jobs
+SHAPES = ((1, 3840), (2, 7680), (4, 15360), (8, 30720), (16, 61440))
+DISK_SIZES = (50, 100, 200, 500)
+DISK_TYPES = ('pd-standard', 'pd-ssd')
+# the jobs start within SPAN seconds after EPOCH (2018-11-21T22:00:00Z)
+EPOCH = 1542837600
+SPAN = 6 * 3600
+
+class SyntheticWorkflow(object):
+    def __init__(self, shards=1000, calls=10, subworkflow_depth=0, cache_ratio=0.0,
+                 failure_ratio=0.0, preemptible_ratio=0.5, expand_subworkflows=True,
+                 seed=0, project=PROJECT):
+        '''
+        A workflow of about shards call attempts (plus the retries of the
+        failed ones) spread over the calls of each of subworkflow_depth + 1
+        nested (sub)workflows.  A cache_ratio of the shards are call cached
+        and a failure_ratio of them failed once before succeeding.
+        Subworkflows are inlined in the metadata, unless expand_subworkflows
+        is False.  The same arguments always generate the same workflow.
+        '''
+        self.seed = seed
+        self.project = project
+        self.calls = calls
+        self.cache_ratio = cache_ratio
+        self.failure_ratio = failure_ratio
+        self.preemptible_ratio = preemptible_ratio
+        self.expand_subworkflows = expand_subworkflows
+        self.rng = random.Random(seed)
+        # the number of operations so far
+        self.jobs = 0
+        # workflow id -> metadata, of all the workflows generated
+        self.workflows = {}
+
+        self.cache_source = self._new_workflow('CacheSource')
+        self.shards_per_level = _split(shards, subworkflow_depth + 1)
+        self.metadata = self._workflow('Synthetic', 0)
+        if self.cache_source['calls']:
+            self.workflows[self.cache_source['id']] = self.cache_source
+
+    # -- __init__
+
+    def _new_workflow(self, name):
+        wf_id = str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+        return {
+            'id'           : wf_id,
+            'workflowName' : name,
+            'workflowRoot' : 'gs://synthetic-bucket/{}/{}'.format(name, wf_id),
+            'status'       : 'Succeeded',
+            'submission'   : _rfc3339(EPOCH - 300),
+            'start'        : _rfc3339(EPOCH - 240),
+            'end'          : _rfc3339(EPOCH + SPAN + 7200),
+            'calls'        : {},
+        }
+
+    def _workflow(self, name, level):
+        metadata = self._new_workflow(name)
+        for (i, shards) in enumerate(_split(self.shards_per_level[level], self.calls)):
+            call = '{}.task_{}'.format(name, i)
+            executions = []
+            for shard in range(shards):
+                executions.extend(self._shard(metadata, call, shard))
+            if executions:
+                metadata['calls'][call] = executions
+
+        if level + 1 < len(self.shards_per_level):
+            sub_name = '{}_sub{}'.format(name, level + 1)
+            subworkflow = self._workflow(sub_name, level + 1)
+            execution = { 'shardIndex' : -1, 'attempt' : 1, 'executionStatus' : 'Done' }
+            if self.expand_subworkflows:
+                execution['subWorkflowMetadata'] = subworkflow
+            else:
+                execution['subWorkflowId'] = subworkflow['id']
+            metadata['calls']['{}.{}'.format(name, sub_name)] = [execution]
+            if subworkflow['status'] == 'Failed':
+                metadata['status'] = 'Failed'
+
+        self.workflows[metadata['id']] = metadata
+        return metadata
+
+    def _shard(self, metadata, call, shard):
+        # the executions of a shard
+        if self.rng.random() < self.cache_ratio:
+            return [self._cached(call, shard)]
+        if self.rng.random() < self.failure_ratio:
+            return [ self._job_execution(metadata, call, shard, 1, failed=True),
+                     self._job_execution(metadata, call, shard, 2) ]
+        return [self._job_execution(metadata, call, shard, 1)]
+
+    def _cached(self, call, shard):
+        # the job that ran in the cache source is looked up by shard index
+        source = self.cache_source['calls'].setdefault(call, [])
+        while len(source) <= shard:
+            source.append({ 'shardIndex' : len(source), 'attempt' : 1, 'executionStatus' : 'Done' })
+        source[shard]['jobId'] = self._new_job()
+
+        hit = 'Cache Hit: {}:{}:{}'.format(self.cache_source['id'], call, shard)
+        return {
+            'shardIndex'      : shard,
+            'attempt'         : 1,
+            'executionStatus' : 'Done',
+            'callCaching'     : { 'hit' : True, 'result' : hit },
+            'start'           : _rfc3339(EPOCH),
+            'end'             : _rfc3339(EPOCH + 1),
+            'returnCode'      : 0,
+        }
+
+    def _job_execution(self, metadata, call, shard, attempt, failed=False):
+        job_id = self._new_job()
+        job = self.job(job_id)
+        execution = {
+            'shardIndex'      : shard,
+            'attempt'         : attempt,
+            'executionStatus' : 'Failed' if failed else 'Done',
+            'jobId'           : job_id,
+            'start'           : _rfc3339(job['created']),
+            'end'             : _rfc3339(job['end'] + 30),
+            'backendStatus'   : 'Failed' if failed else 'Success',
+            'returnCode'      : 1 if failed else 0,
+            'stderr'          : '{}/call-{}/shard-{}/attempt-{}/stderr'.format(
+                metadata['workflowRoot'], call.split('.')[-1], shard, attempt),
+            'inputs'          : { 'sample' : 'sample-{}'.format(shard) },
+        }
+        if failed:
+            metadata['status'] = 'Failed'
+            execution['failures'] = [ {
+                'message'  : "Job {}:{}:{} exited with return code 1".format(call, shard, attempt),
+                'causedBy' : [],
+            } ]
+        return execution
+
+    def _new_job(self):
+        self.jobs += 1
+        return 'projects/{}/operations/{}'.format(self.project, self.jobs)
+
+    # -- operations
+
+    def job(self, name):
+        '''
+        The shape, placement and times of the job of an operation name
+        '''
+        n = int(name.rsplit('/', 1)[1])
+        rng = random.Random((self.seed << 32) + n)
+        start = EPOCH + rng.uniform(0, SPAN)
+        (cores, mem_mb) = rng.choice(SHAPES)
+        return {
+            'n'           : n,
+            'cores'       : cores,
+            'mem_mb'      : mem_mb,
+            'zone'        : rng.choice(ZONES),
+            'preemptible' : rng.random() < self.preemptible_ratio,
+            'disk'        : (rng.choice(DISK_SIZES), rng.choice(DISK_TYPES)),
+            'created'     : start - rng.uniform(5, 120),
+            'start'       : start,
+            'end'         : start + rng.uniform(30, 7200),
+        }
+
+    def operation(self, name):
+        '''
+        The genomics operation (as returned by operations.get) of a job
+        '''
+        job = self.job(name)
+        if job['n'] < 1 or job['n'] > self.jobs:
+            raise KeyError(name)
+        (start, end) = (job['start'], job['end'])
+        localized = start + 60 + (end - start) * 0.05
+        delocalized = end - 30 - (end - start) * 0.02
+
+        def event(timestamp, description, event_type, zone=False):
+            details = { '@type' : 'type.googleapis.com/google.genomics.v2alpha1.' + event_type }
+            if zone:
+                details['zone'] = job['zone']
+            return { 'timestamp' : _rfc3339(timestamp), 'description' : description, 'details' : details }
+
+        return {
+            'name' : name,
+            'done' : True,
+            'metadata' : {
+                '@type' : 'type.googleapis.com/google.genomics.v2alpha1.Metadata',
+                'createTime' : _rfc3339(job['created']),
+                'startTime'  : _rfc3339(start),
+                'endTime'    : _rfc3339(end),
+                'pipeline'   : { 'resources' : {
+                    'projectId' : self.project,
+                    'virtualMachine' : {
+                        'machineType'    : 'custom-{}-{}'.format(job['cores'], job['mem_mb']),
+                        'preemptible'    : job['preemptible'],
+                        'bootDiskSizeGb' : 10,
+                        'disks'          : [ { 'name' : 'local-disk', 'sizeGb' : job['disk'][0],
+                                               'type' : job['disk'][1] } ],
+                    },
+                } },
+                # the newest event first, as in the genomics api
+                'events' : [
+                    event(end, 'Worker released', 'WorkerReleasedEvent', zone=True),
+                    event(delocalized, 'Started running "Delocalization"', 'ContainerStartedEvent'),
+                    event(localized, 'Started running "UserAction"', 'ContainerStartedEvent'),
+                    event(start + 60, 'Started running "Localization"', 'ContainerStartedEvent'),
+                    event(start + 30, 'Worker "google-pipelines-worker-{}" assigned in "{}"'.format(
+                        job['n'], job['zone']), 'WorkerAssignedEvent', zone=True),
+                ],
+            },
+        }
+
+    def operation_names(self):
+        for n in range(1, self.jobs + 1):
+            yield 'projects/{}/operations/{}'.format(self.project, n)
+
+# -- SyntheticWorkflow (end)
+
+# (core, ram) nano dollars per hour and per GiB hour of the machine classes
+CLASS_PRICES = {
+    'Custom instance'      : (33174000, 4446000),
+    'N1 Standard Instance' : (31611000, 4237000),
+    'N1 High-mem Instance' : (31611000, 4237000),
+    'N1 High-CPU Instance' : (31611000, 4237000),
+}
+# the price multipliers of the regions (preemptible skus are regional)
+REGION_FACTORS = { 'Americas' : 1.0, 'Virginia' : 1.126, 'Los Angeles' : 1.2 }
+PREEMPTIBLE_FACTOR = 0.21
+
+def skus():
+    '''
+    A sku list (as GoogleServices.compute_engine_skus) for the machine
+    classes, regions and disks of the synthetic operations
+    '''
+    sku_list = {}
+    for (compute_class, (core_nanos, ram_nanos)) in CLASS_PRICES.items():
+        sku_list['{} Core'.format(compute_class)] = _sku(core_nanos, 3600, 'h')
+        sku_list['{} Ram'.format(compute_class)] = _sku(ram_nanos, 3865470566400, 'GiBy.h')
+        for (region, factor) in REGION_FACTORS.items():
+            factor *= PREEMPTIBLE_FACTOR
+            template = 'Preemptible {} {} running in {}'
+            sku_list[template.format(compute_class, 'Core', region)] = \
+                _sku(int(core_nanos * factor), 3600, 'h')
+            sku_list[template.format(compute_class, 'Ram', region)] = \
+                _sku(int(ram_nanos * factor), 3865470566400, 'GiBy.h')
+    month = 2786795747942400.0
+    sku_list['SSD backed PD Capacity'] = _sku(170000000, month, 'GiBy.mo')
+    sku_list['Storage PD Capacity'] = _sku(0, month, 'GiBy.mo', tiers=((5, 40000000),))
+    for description in sku_list:
+        sku_list[description]['description'] = description
+    return sku_list
+
+def machine_types():
+    '''
+    A machine type catalog (as GoogleServices.get_available_compute_types)
+    of the predefined N1 machine types
+    '''
+    machines = {}
+    for cores in (1, 2, 4, 8, 16, 32, 64, 96):
+        for (family, mb_per_core) in (('n1-standard', 3840), ('n1-highmem', 6656), ('n1-highcpu', 921.6)):
+            if family == 'n1-highcpu' and cores == 1:
+                continue
+            mem_mb = int(cores * mb_per_core)
+            machines[(cores, mem_mb)] = {
+                'name' : '{}-{}'.format(family, cores),
+                'guestCpus' : cores,
+                'memoryMb' : mem_mb,
+            }
+    return machines
+
+class SyntheticGoogle(GoogleServices):
+    def __init__(self, workflow):
+        '''
+        The google services of a SyntheticWorkflow: its operations, the
+        synthetic sku list and machine type catalog
+        '''
+        super(SyntheticGoogle, self).__init__(sku_list=skus())
+        self.workflow = workflow
+        self.machines = machine_types()
+
+    def get_genomics_operation_metadata(self, name):
+        meter.count('operations')
+        return self.workflow.operation(name)
+
+    def get_available_compute_types(self, zone, project):
+        return self.machines
+
+class SyntheticServer(Server):
+    def __init__(self, workflow):
+        '''
+        A cromwell server of the workflows of a SyntheticWorkflow
+        '''
+        super(SyntheticServer, self).__init__()
+        self.workflow = workflow
+
+    def _get_workflow_metadata(self, workflow_id, url_params):
+        if workflow_id not in self.workflow.workflows:
+            raise Exception("Unrecognized workflow ID: {}".format(workflow_id))
+        return self.workflow.workflows[workflow_id]
+
+    def get_workflow_status(self, workflow_id):
+        return self._get_workflow_metadata(workflow_id, {})['status']
+
+# -- Helper functions
+
+def _sku(nanos, conversion_factor, usage_unit, tiers=()):
+    rates = [ (0, nanos) ] + list(tiers)
+    return {
+        'category' : { 'resourceFamily' : 'Compute' },
+        'pricingInfo' : [ { 'pricingExpression' : {
+            'baseUnitConversionFactor' : conversion_factor,
+            'usageUnit' : usage_unit,
+            'tieredRates' : [ {
+                'startUsageAmount' : start,
+                'unitPrice' : { 'currencyCode' : 'USD', 'units' : '0', 'nanos' : n },
+            } for (start, n) in rates ],
+        } } ],
+    }
+
+def _split(total, parts):
+    # total split into parts as evenly as possible
+    return [ total // parts + (1 if i < total % parts else 0) for i in range(parts) ]
+
+def _rfc3339(epoch):
+    return datetime.datetime.utcfromtimestamp(epoch).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
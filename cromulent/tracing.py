@@ -0,0 +1,193 @@
+from __future__ import division
+
+import json, logging, os, random, threading, time
+
+# -- Trace spans
+#
+# Nested, timed spans of the work done by a command (workflow -> call ->
+# shard -> operation fetch -> pricing, and the cromwell and google
+# requests), with parent/child ids and attributes such as the workflow
+# id, the jobId or whether a cache answered.  The spans of the process
+# are written to a local file when the command exits, either in the
+# Chrome trace event format (for chrome://tracing, Perfetto or
+# speedscope) or as OTLP JSON (for the OpenTelemetry tools); no collector
+# is needed.  Nothing is recorded until the tracer is enabled, and a
+# disabled span costs one attribute check.
+#
+# The parent of a span is the innermost span open in the same thread.
+# Spans may be left in any order (a generator can keep a span open across
+# its yields), and at most MAX_SPANS spans are kept.
+
+MAX_SPANS = 1000000
+
+class Span(object):
+    __slots__ = ('tracer', 'name', 'span_id', 'parent_id', 'thread_id',
+                 'start', 'end', 'attributes')
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.span_id = '{:016x}'.format(random.getrandbits(64))
+        self.parent_id = None
+        self.thread_id = threading.current_thread().ident
+        self.start = None
+        self.end = None
+        self.attributes = attributes
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        if stack:
+            self.parent_id = stack[-1].span_id
+        stack.append(self)
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.end = time.time()
+        if exc_info[0] is not None:
+            self.attributes['error'] = exc_info[0].__name__
+        stack = self.tracer._stack()
+        if self in stack:
+            stack.remove(self)
+        self.tracer._record(self)
+        return False
+
+class _NoSpan(object):
+    # the span of a disabled tracer
+    def set(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NO_SPAN = _NoSpan()
+
+class Tracer(object):
+    def __init__(self):
+        self.enabled = False
+        self.local = threading.local()
+        self.reset()
+
+    def reset(self):
+        self.trace_id = '{:032x}'.format(random.getrandbits(128))
+        self.spans = []
+        self.dropped = 0
+
+    def enable(self):
+        self.enabled = True
+        self.reset()
+
+    def disable(self):
+        self.enabled = False
+
+    def span(self, name, **attributes):
+        '''
+        A context manager of a span named name, as a child of the
+        innermost open span of the thread.  More attributes can be set on
+        it (see Span.set) within the block.
+        '''
+        if not self.enabled:
+            return _NO_SPAN
+        return Span(self, name, attributes)
+
+    def annotate(self, key, value):
+        '''
+        Set an attribute of the innermost open span of the thread
+        '''
+        if not self.enabled:
+            return
+        stack = self._stack()
+        if stack:
+            stack[-1].set(key, value)
+
+    def _stack(self):
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+    def _record(self, span):
+        if len(self.spans) < MAX_SPANS:
+            self.spans.append(span)
+        else:
+            self.dropped += 1
+
+    # -- export
+
+    def to_chrome_trace(self):
+        pid = os.getpid()
+        events = []
+        for span in self.spans:
+            args = dict(span.attributes)
+            args['span_id'] = span.span_id
+            if span.parent_id is not None:
+                args['parent_id'] = span.parent_id
+            events.append({
+                'name' : span.name,
+                'cat'  : 'cromulent',
+                'ph'   : 'X',
+                'ts'   : round(span.start * 1e6, 3),
+                'dur'  : round((span.end - span.start) * 1e6, 3),
+                'pid'  : pid,
+                'tid'  : span.thread_id,
+                'args' : args,
+            })
+        events.sort(key=lambda e: e['ts'])
+        return { 'traceEvents' : events, 'displayTimeUnit' : 'ms' }
+
+    def to_otlp(self):
+        spans = []
+        for span in self.spans:
+            otlp_span = {
+                'traceId'           : self.trace_id,
+                'spanId'            : span.span_id,
+                'name'              : span.name,
+                'kind'              : 1, # SPAN_KIND_INTERNAL
+                'startTimeUnixNano' : str(int(span.start * 1e9)),
+                'endTimeUnixNano'   : str(int(span.end * 1e9)),
+                'attributes'        : [ _otlp_attribute(k, v) for (k, v) in sorted(span.attributes.items()) ],
+            }
+            if span.parent_id is not None:
+                otlp_span['parentSpanId'] = span.parent_id
+            spans.append(otlp_span)
+        return {
+            'resourceSpans' : [ {
+                'resource' : { 'attributes' : [ _otlp_attribute('service.name', 'cromulent') ] },
+                'scopeSpans' : [ { 'scope' : { 'name' : 'cromulent' }, 'spans' : spans } ],
+            } ]
+        }
+
+    def write(self, path):
+        '''
+        Write the spans to path, as OTLP JSON if the path ends with
+        .otlp.json, or else in the Chrome trace event format
+        '''
+        if self.dropped:
+            logging.warning("Dropped {} trace spans (over {})".format(self.dropped, MAX_SPANS))
+        data = self.to_otlp() if path.endswith('.otlp.json') else self.to_chrome_trace()
+        with open(path, 'w') as f:
+            json.dump(data, f)
+        logging.info("Wrote {} trace spans to {}".format(len(self.spans), path))
+
+# -- Tracer (end)
+
+def _otlp_attribute(key, value):
+    if isinstance(value, bool):
+        typed = { 'boolValue' : value }
+    elif isinstance(value, int):
+        typed = { 'intValue' : str(value) }
+    elif isinstance(value, float):
+        typed = { 'doubleValue' : value }
+    else:
+        typed = { 'stringValue' : str(value) }
+    return { 'key' : key, 'value' : typed }
+
+# the tracer of this process
+tracer = Tracer()
+span = tracer.span
+annotate = tracer.annotate
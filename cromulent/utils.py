@@ -1,4 +1,4 @@
-import functools
+import calendar, collections, functools, mmap, os, re
 
 def memoize(func):
     cache = {}
@@ -12,6 +12,44 @@ def memoize(func):
 
     return memoized_func
 
+def cache_dir(*parts):
+    # the on-disk caches live under $CROMULENT_CACHE_DIR
+    # (default: ~/.cache/cromulent)
+    root = os.environ.get('CROMULENT_CACHE_DIR', None)
+    if root is None:
+        xdg_cache = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+        root = os.path.join(xdg_cache, 'cromulent')
+
+    path = os.path.join(root, *parts)
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    return path
+
+def tail_file(path, nbytes):
+    # the last nbytes of a local file (or a file:// url), starting at a
+    # line boundary.  Only the end of the file is read: it is memory-mapped
+    # and sliced, so large logs cost the same as small ones.  Returns None
+    # for remote (e.g. gs://) or missing files.
+    if path.startswith('file://'):
+        path = path[len('file://'):]
+    if '://' in path or not os.path.isfile(path):
+        return None
+
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return ''
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            start = max(0, size - nbytes)
+            tail = data[start:]
+        finally:
+            data.close()
+
+    if start > 0 and b'\n' in tail:
+        tail = tail[tail.index(b'\n') + 1:]
+    return tail.decode('utf-8', 'replace')
+
 def parse_wf_report_opts(opts=None):
     if opts is None:
         return {}
@@ -24,3 +62,83 @@ def parse_wf_report_opts(opts=None):
         params[k] = v
 
     return params
+
+_RFC3339_RE = re.compile(r'(\d{4})-(\d\d)-(\d\d)[Tt ](\d\d):(\d\d):(\d\d)(\.\d+)?'
+                         r'(?:[Zz]|([+-])(\d\d):?(\d\d))?$')
+
+def parse_rfc3339(timestamp):
+    # A much faster replacement of dateutil.parser.parse for the RFC3339
+    # timestamps used by cromwell and the google APIs.  Returns the
+    # seconds since the epoch (UTC).
+    m = _RFC3339_RE.match(timestamp)
+    if m is None:
+        raise ValueError("Not a RFC3339 timestamp: '{}'".format(timestamp))
+
+    (year, month, day, hour, minute, second, fraction, sign, tz_hour, tz_minute) = m.groups()
+    seconds = float(calendar.timegm((int(year), int(month), int(day),
+                                     int(hour), int(minute), int(second))))
+    if fraction:
+        seconds += float(fraction)
+    if sign:
+        offset = int(tz_hour) * 3600 + int(tz_minute) * 60
+        seconds += -offset if sign == '+' else offset
+    return seconds
+
+def hms(seconds):
+    # a duration as hours:minutes:seconds
+    seconds = int(round(seconds))
+    return '{}:{:02d}:{:02d}'.format(seconds // 3600, (seconds // 60) % 60, seconds % 60)
+
+class JobIdMatcher(object):
+    def __init__(self, terms):
+        '''
+        Matches the job ids that contain any of the terms.  Whole job ids
+        are found in a set, and the substring matches use an Aho-Corasick
+        automaton of all the terms, so a job id is scanned only once no
+        matter how many terms there are.
+        '''
+        self.exact = set(terms)
+
+        # the trie of the terms: goto transitions, failure links and
+        # whether a term ends at (or is a suffix of) the state
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [False]
+        for term in self.exact:
+            state = 0
+            for ch in term:
+                if ch not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(False)
+                    self.goto[state][ch] = len(self.goto) - 1
+                state = self.goto[state][ch]
+            self.out[state] = True
+
+        # breadth first, so the failure link of a state is always done
+        # before its children
+        queue = collections.deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for (ch, child) in self.goto[state].items():
+                queue.append(child)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[child] = self.goto[f].get(ch, 0)
+                self.out[child] = self.out[child] or self.out[self.fail[child]]
+
+    def __call__(self, job_id):
+        if job_id is None:
+            return False
+        if job_id in self.exact:
+            return True
+
+        state = 0
+        for ch in job_id:
+            while state and ch not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            if self.out[state]:
+                return True
+        return False
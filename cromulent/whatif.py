@@ -0,0 +1,139 @@
+from __future__ import division
+
+import collections, itertools, logging
+
+from cromulent.gcloud import Cpu, Disk
+
+# -- What-if repricing
+#
+# Prices the same genomics operations under a grid of scenarios (tier
+# scheme x region x preemptible x machine family).  The operations are
+# reduced once, in a single pass, to their billed core and memory seconds
+# per (machine class, region, preemptible) and to their distinct disks,
+# so every scenario is priced from a handful of aggregates instead of
+# repricing each operation.  The cpu and memory prices are linear in the
+# billed seconds; the (tiered) disk costs only depend on the tier scheme
+# and are computed once per scheme.
+
+TIER_SCHEMES = ('all', 'no-free', 'top-tier', 'max-price')
+FAMILIES = ('custom', 'n1-standard', 'n1-highmem', 'n1-highcpu')
+
+# the value of a scenario axis that keeps what the operations ran as
+AS_RUN = None
+
+Scenario = collections.namedtuple('Scenario', ['tier_scheme', 'region', 'preemptible', 'family'])
+
+def scenarios(tier_schemes=('all',), regions=(AS_RUN,), preemptible=(AS_RUN,), families=(AS_RUN,)):
+    '''
+    The grid of scenarios over the given axis values
+    '''
+    return [ Scenario(*s) for s in itertools.product(tier_schemes, regions, preemptible, families) ]
+
+class OperationSet(object):
+    def __init__(self, google, operations):
+        '''
+        The billed usage of the finished operations (None entries and
+        unfinished operations are skipped), for repricing with the skus
+        of google (a GoogleServices).
+        '''
+        self.google = google
+        self.count = 0
+        # (compute class, region, preemptible) -> [core seconds, memory gb seconds]
+        self.usage = collections.defaultdict(lambda: [0.0, 0.0])
+        # (size, disk type, seconds) -> number of disks
+        self.disks = collections.Counter()
+
+        classes = {}
+        for op in operations:
+            if op is None or not op.is_finished():
+                continue
+            # the machine class only depends on the shape and the zone
+            class_key = (op.machine, op.zone, op.project)
+            if class_key not in classes:
+                classes[class_key] = google.identify_google_compute_class(op)
+
+            seconds = Cpu(op.cores, op.duration()).google_pricing_duration()
+            usage = self.usage[(classes[class_key], op.region, op.preemptible)]
+            usage[0] += op.cores * seconds
+            usage[1] += op.mem_gb * seconds
+            for (size, disk_type) in op.disk_shapes:
+                self.disks[(size, disk_type, op.duration())] += 1
+            self.count += 1
+
+        self._disk_costs = {}
+        logging.info("Repricing {} operations ({} usage groups, {} distinct disks)".format(
+            self.count, len(self.usage), len(self.disks)))
+
+    # -- __init__
+
+    def disk_cost(self, tier_scheme):
+        if tier_scheme not in self._disk_costs:
+            total = 0.0
+            for ((size, disk_type, seconds), n) in self.disks.items():
+                disk = Disk(size=size, duration=seconds, disk_type=disk_type)
+                sku = self.google.identify_google_disk_sku(disk)
+                total += n * disk.compute_nano_dollars(sku, tier_scheme)
+            self._disk_costs[tier_scheme] = total
+        return self._disk_costs[tier_scheme]
+
+    def price(self, scenario):
+        '''
+        The cost (in nano dollars) of the operations under the scenario, as
+        a dictionary of cpu, mem and disk costs, or None if the skus of the
+        scenario are not in the sku list or the scenario can not be priced
+        (see is_regional).
+        '''
+        if not self.is_regional(scenario):
+            return None
+
+        compute_classes = self.google.google_compute_classes()
+        (cpu, mem) = (0.0, 0.0)
+        for ((compute_class, region, preemptible), (core_seconds, gb_seconds)) in self.usage.items():
+            if scenario.family is not AS_RUN:
+                compute_class = compute_classes[scenario.family]
+            if scenario.region is not AS_RUN:
+                region = scenario.region
+            if scenario.preemptible is not AS_RUN:
+                preemptible = scenario.preemptible
+
+            prices = self.google.compute_unit_prices(compute_class, region, preemptible)
+            if prices is None:
+                return None
+            cpu += core_seconds * prices[0]
+            mem += gb_seconds * prices[1]
+
+        return { 'cpu' : cpu, 'mem' : mem, 'disk' : self.disk_cost(scenario.tier_scheme) }
+
+    def is_regional(self, scenario):
+        '''
+        Whether the region of the scenario can be priced: only the
+        preemptible skus are regional, so moving the operations that are not
+        preemptible to another region would price them the same as before.
+        '''
+        if scenario.region is AS_RUN:
+            return True
+        if scenario.preemptible is not AS_RUN:
+            return bool(scenario.preemptible)
+        return all([ preemptible for (_, _, preemptible) in self.usage ])
+
+# -- OperationSet (end)
+
+def compare(operation_set, grid):
+    '''
+    Price every scenario of the grid, as (scenario, cost, as-run cost)
+    tuples, where the as-run cost is the cost of the operations as they
+    ran under the scenario's tier scheme.
+    '''
+    results = []
+    unpriced = []
+    for scenario in grid:
+        if not operation_set.is_regional(scenario):
+            unpriced.append(scenario)
+        as_run = Scenario(scenario.tier_scheme, AS_RUN, AS_RUN, AS_RUN)
+        results.append((scenario, operation_set.price(scenario), operation_set.price(as_run)))
+    if unpriced:
+        regions = sorted(set([ s.region for s in unpriced ]))
+        logging.warning(("Only the preemptible skus are regional: the {} scenarios in {} "
+                         "with operations that are not preemptible are not priced").format(
+                             len(unpriced), ', '.join(regions)))
+    return results
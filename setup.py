@@ -25,7 +25,6 @@ setup(
         'clint==0.5.1',
         'google-api-python-client==1.7.3',
         'google-auth==1.5.1',
-        'python-dateutil==2.7.3',
         'requests==2.20.0',
         'tabulate==0.8.2',
         'cytoolz==0.9.0.1',
@@ -34,6 +33,10 @@ setup(
         'pyparsing==2.3.1',
         'pyhocon==0.3.51'
     ],
+    extras_require={
+        'arrow': ['pyarrow'],
+        'numpy': ['numpy'],
+    },
     entry_points='''
         [console_scripts]
         cromulent=cromulent.cli:cli
@@ -0,0 +1,117 @@
+import unittest
+
+from .context import cromulent
+import cromulent.analysis as analysis
+import cromulent.calltable as calltable
+
+def make_calls(rows):
+    # rows of (call, shard, start, end)
+    table = calltable.CallTable()
+    for (call, shard, start, end) in rows:
+        table.append({ 'call' : call, 'shard' : shard, 'attempt' : 1,
+                       'start' : start, 'end' : end, 'job_id' : 'op-{}-{}'.format(call, shard) })
+    return table
+
+class AnalysisTest(unittest.TestCase):
+
+    def setUp(self):
+        # A -> (B scatter, with a straggler shard) -> C, and an unrelated D
+        rows = [ ('A', -1, 0, 100) ]
+        rows.extend([ ('B', s, 110, 210) for s in range(9) ])
+        rows.append(('B', 9, 110, 1000))
+        rows.append(('C', -1, 1005, 1100))
+        rows.append(('D', -1, 50, 60))
+        rows.append(('E', -1, None, None))
+        self.calls = make_calls(rows)
+
+    def test_critical_path(self):
+        path = analysis.critical_path(self.calls)
+        self.assertEqual([ (self.calls['call'][i], self.calls['shard'][i]) for i in path ],
+                         [ ('A', -1), ('B', 9), ('C', -1) ])
+        self.assertEqual(analysis.critical_path(make_calls([])), [])
+
+    def test_critical_path_scatter(self):
+        # the shards of a scatter that ran in waves (e.g. held back by a
+        # quota) are not chained to each other
+        calls = make_calls([ ('A', -1, 0, 10), ('B', 0, 20, 100), ('B', 1, 100, 200),
+                             ('B', 2, 200, 250), ('C', -1, 260, 300) ])
+        path = analysis.critical_path(calls)
+        self.assertEqual([ (calls['call'][i], calls['shard'][i]) for i in path ],
+                         [ ('A', -1), ('B', 2), ('C', -1) ])
+
+    def test_stragglers(self):
+        flagged = analysis.stragglers(self.calls)
+        self.assertEqual(len(flagged), 1)
+        (i, duration, median) = flagged[0]
+        self.assertEqual((self.calls['call'][i], self.calls['shard'][i]), ('B', 9))
+        self.assertEqual((duration, median), (890, 100))
+
+        # not far enough above the median in absolute terms
+        self.assertEqual(analysis.stragglers(self.calls, min_seconds=1000), [])
+
+class FakeOperation(object):
+    def __init__(self, created, start, end, milestones):
+        (self.created, self.start, self.end, self.milestones) = (created, start, end, milestones)
+
+class PhasesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = make_calls([ ('A', 0, 0, 200), ('A', 1, 0, 300), ('B', -1, 300, 400), ('C', -1, None, None) ])
+        self.calls.operations = [
+            FakeOperation(5, 10, 200, (20, 50, 60, 160, 190)),
+            FakeOperation(5, 10, 300, (40, 80, 90, 260, 290)),
+            # no worker events (e.g. an older operation)
+            FakeOperation(305, 310, 400, (None, None, None, None, None)),
+            None,
+        ]
+
+    def test_job_phases(self):
+        phases = analysis.job_phases(self.calls)
+        self.assertEqual([ phases[p][0] for p in analysis.PHASES ], [20, 30, 10, 100, 30])
+        self.assertEqual([ phases[p][1] for p in analysis.PHASES ], [40, 40, 10, 170, 30])
+        self.assertEqual(phases['queued'][2], 10)
+        self.assertEqual([ phases[p][2] for p in analysis.PHASES[1:] ], [None] * 4)
+        self.assertEqual([ phases[p][3] for p in analysis.PHASES ], [None] * 5)
+
+    def test_phase_summary(self):
+        summary = analysis.phase_summary(self.calls)
+        self.assertEqual(sorted(summary.keys()), ['*', 'A', 'B'])
+        self.assertEqual(summary['A']['running'], (2, (100, 170), 170, 270))
+        self.assertEqual(summary['*']['queued'], (3, (20, 40), 40, 70))
+        self.assertNotIn('running', summary['B'])
+
+class ShapedOperation(object):
+    def __init__(self, region, start, end, cores, preemptible=False):
+        (self.region, self.start, self.end) = (region, start, end)
+        (self.cores, self.mem_gb, self.preemptible) = (cores, cores * 3.75, preemptible)
+        self.disk_shapes = ((100, 'pd-ssd'), (10, 'pd-standard'))
+
+class ConcurrencyTest(unittest.TestCase):
+
+    def test_concurrency(self):
+        ops = [
+            ShapedOperation('us-central1', 0, 100, 2),
+            ShapedOperation('us-central1', 50, 150, 4, preemptible=True),
+            # starts as the first one ends: never held at the same time
+            ShapedOperation('us-central1', 100, 120, 8),
+            ShapedOperation('us-east1', 10, None, 1),
+            None,
+        ]
+        usage = analysis.concurrency(ops, now=1000)
+        self.assertEqual(sorted(usage.keys()), ['us-central1', 'us-east1'])
+
+        (timeline, peaks) = usage['us-central1']
+        self.assertEqual([ (t, held[:3]) for (t, held) in timeline ],
+                         [ (0, (1, 2, 0)), (50, (2, 6, 4)), (100, (2, 12, 4)),
+                           (120, (1, 4, 4)), (150, (0, 0, 0)) ])
+        self.assertEqual(peaks['vms'], (2, 50))
+        self.assertEqual(peaks['cores'], (12, 100))
+        self.assertEqual(peaks['mem_gb'], (45.0, 100))
+        self.assertEqual(peaks['pd_ssd_gb'], (200, 50))
+
+        # unfinished operations are held until now
+        (timeline, peaks) = usage['us-east1']
+        self.assertEqual(timeline[-1], (1000, (0, 0, 0, 0.0, 0, 0)))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
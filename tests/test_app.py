@@ -1,12 +1,20 @@
 import unittest
 
-import os, sys
+import os, shutil, sys, tempfile
 
 from .context import cromulent
 import cromulent.app as app
 
 class CromulentAppTest(unittest.TestCase):
 
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        os.environ['CROMULENT_CACHE_DIR'] = self.cache_dir
+
+    def tearDown(self):
+        del os.environ['CROMULENT_CACHE_DIR']
+        shutil.rmtree(self.cache_dir)
+
     def test_init(self):
         theapp = app.CromulentApp("tests/data/cromulent/app/jes.conf")
         self.assertIsNotNone(theapp)
@@ -19,6 +27,28 @@ class CromulentAppTest(unittest.TestCase):
         self.assertIsNone(theapp.config)
         self.assertIsNone(theapp.db)
 
+    def test_config_cache(self):
+        theapp = app.CromulentApp("tests/data/cromulent/app/jes.conf")
+        self.assertIsNone(theapp._config)
+        self.assertEqual(theapp.config['database']['db']['user'], 'cromwell')
+        self.assertTrue(os.path.exists(theapp._config_cache_path()))
+
+        # the second time around the config is not parsed
+        theapp = app.CromulentApp("tests/data/cromulent/app/jes.conf")
+        def fail():
+            raise Exception("config was parsed")
+        theapp._parse_config = fail
+        self.assertEqual(theapp.config['database']['db']['password'], 'words')
+        self.assertEqual(theapp._config_get('database.db.user'), 'cromwell')
+        self.assertIsNone(theapp._config_get('database.db.file'))
+
+        # a partially written cache is a cache miss
+        with open(theapp._config_cache_path(), 'w') as f:
+            f.write('{"path": ')
+        theapp = app.CromulentApp("tests/data/cromulent/app/jes.conf")
+        self.assertEqual(theapp.config['database']['db']['user'], 'cromwell')
+        self.assertEqual(oct(os.stat(theapp._config_cache_path()).st_mode & 0o777), oct(0o600))
+
     def test_init_fails(self):
         with self.assertRaises(IOError) as cm:
             app.CromulentApp("/jes.conf")
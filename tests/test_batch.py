@@ -0,0 +1,33 @@
+import unittest
+
+from .context import cromulent
+from .test_cromwell import FakeGoogle
+import cromulent.batch as batch
+import cromulent.cromwell as cromwell
+
+class EstimateBatchTest(unittest.TestCase):
+
+    def test_estimate_workflow(self):
+        metadata = 'tests/data/cromulent/cromwell/metadata.json'
+        result = batch.estimate_workflow(metadata, cromwell.Server(), FakeGoogle())
+        self.assertNotIn('error', result)
+        self.assertEqual(result['id'], '0e2a2a1c-7d5b-4b1e-9f06-5e1f1b3c2d10')
+        self.assertEqual(result['total-cost'], 6.0)
+        self.assertEqual(result['in-flight'], 2)
+        self.assertNotIn('items', result['tasks']['Test.Align'])
+
+        rollup = batch.merge_rollup({}, result['tasks'])
+        rollup = batch.merge_rollup(rollup, result['tasks'])
+        self.assertEqual(rollup['Test.Align']['workflows'], 2)
+        self.assertEqual(rollup['Test.Align']['shards'], 2)
+        self.assertEqual(rollup['Test.Align']['total-cost'], 12.0)
+
+    def test_estimate_workflow_failure(self):
+        # an unreachable cromwell server is reported, not raised
+        server = cromwell.Server(port=1)
+        result = batch.estimate_workflow('no-such-workflow', server, FakeGoogle())
+        self.assertIn('error', result)
+        self.assertEqual(result['source'], 'no-such-workflow')
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
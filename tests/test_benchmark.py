@@ -0,0 +1,87 @@
+import os, sqlite3, sys, tempfile
+
+import pytest
+
+# the benchmarks need the pytest-benchmark plugin, and are skipped without it
+pytest.importorskip('pytest_benchmark')
+
+from .context import cromulent
+import cromulent.calltable as calltable
+import cromulent.cromwell as cromwell
+import cromulent.report as report
+import cromulent.sqlrun as sqlrun
+import cromulent.synthetic as synthetic
+
+# the number of shards of the synthetic workflows
+SIZES = (1000, 10000, 100000)
+
+# the workflows are generated once per size, and shared by the benchmarks
+_workflows = {}
+
+def _workflow(shards):
+    if shards not in _workflows:
+        _workflows[shards] = synthetic.SyntheticWorkflow(
+            shards=shards, calls=20, subworkflow_depth=2, cache_ratio=0.1, failure_ratio=0.05)
+    return _workflows[shards]
+
+def _run(benchmark, fn, *args):
+    # the peak memory of a first run is recorded with the timings
+    import tracemalloc
+    tracemalloc.start()
+    try:
+        fn(*args)
+        benchmark.extra_info['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return benchmark.pedantic(fn, args=args, rounds=3, iterations=1)
+
+@pytest.fixture
+def devnull(monkeypatch):
+    # the reports write to stdout
+    with open(os.devnull, 'w') as f:
+        monkeypatch.setattr(sys, 'stdout', f)
+        yield f
+
+@pytest.mark.parametrize('shards', SIZES)
+def test_calculate_cost(benchmark, shards):
+    workflow = _workflow(shards)
+    (server, google) = (synthetic.SyntheticServer(workflow), synthetic.SyntheticGoogle(workflow))
+
+    def calculate_cost():
+        return cromwell.CostEstimator(server, google).calculate_cost(workflow.metadata)
+    tasks = _run(benchmark, calculate_cost)
+    assert sum([ t['shards'] for t in tasks.values() ]) >= shards
+
+@pytest.mark.parametrize('shards', SIZES)
+def test_call_table(benchmark, shards):
+    workflow = _workflow(shards)
+    calls = _run(benchmark, calltable.CallTable.from_metadata, workflow.metadata)
+    assert len(calls) >= shards
+
+@pytest.mark.parametrize('shards', SIZES)
+def test_wf_summary(benchmark, devnull, shards):
+    workflow = _workflow(shards)
+    _run(benchmark, report.workflow_report, 'summary', workflow.metadata, None)
+
+@pytest.mark.parametrize('shards', SIZES)
+def test_wf_call_failures(benchmark, shards):
+    workflow = _workflow(shards)
+    calls = calltable.CallTable.from_metadata(workflow.metadata, expand=False)
+    fails = _run(benchmark, report._get_wf_call_failures, calls, {})
+    assert len(fails) > 0
+
+@pytest.mark.parametrize('shards', SIZES)
+def test_sqlrun(benchmark, devnull, shards):
+    workflow = _workflow(shards)
+    calls = calltable.CallTable.from_metadata(workflow.metadata)
+    db = sqlite3.connect(':memory:')
+    db.execute('create table calls ({})'.format(', '.join(calltable.COLUMNS)))
+    db.executemany('insert into calls values ({})'.format(', '.join(['?'] * len(calltable.COLUMNS))),
+                   [ [ row[c] for c in calltable.COLUMNS ] for row in calls.rows() ])
+    (fd, sql_fname) = tempfile.mkstemp(suffix='.sql')
+    with os.fdopen(fd, 'w') as f:
+        f.write('select call, shard, attempt, status, job_id from calls order by start')
+    try:
+        _run(benchmark, sqlrun.run, db, sql_fname, 'tsv')
+    finally:
+        os.remove(sql_fname)
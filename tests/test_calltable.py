@@ -0,0 +1,64 @@
+import unittest
+
+import json, os, shutil, tempfile
+
+from .context import cromulent
+import cromulent.calltable as calltable
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+class CallTableTest(unittest.TestCase):
+
+    def setUp(self):
+        with open('tests/data/cromulent/calltable/metadata.json') as f:
+            self.metadata = json.load(f)
+        self.table = calltable.CallTable.from_metadata(self.metadata)
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_from_metadata(self):
+        table = self.table
+        self.assertEqual(len(table), 4)
+        self.assertEqual(table['call'], ['Inner.Work', 'Outer.Prepare', 'Outer.Prepare', 'Outer.Report'])
+        self.assertEqual(table['workflow_id'][0], '9d8e7f6a-5b4c-4d3e-2f1a-0b9c8d7e6f5a')
+        self.assertEqual(table['attempt'][1:3], [1, 2])
+        self.assertEqual(table['return_code'][0], 137)
+        self.assertEqual(table['error'][1], 'Job exited with return code 1')
+        self.assertIsNone(table['error'][2])
+        self.assertAlmostEqual(table['end'][2] - table['start'][2], 300.5)
+        self.assertIsNone(table['job_id'][3])
+
+    def assertRoundTrip(self, ext):
+        path = os.path.join(self.tmpdir, 'calls' + ext)
+        self.table.write(path)
+        self.assertEqual(list(calltable.CallTable.read(path).rows()), list(self.table.rows()))
+
+    def test_jsonl(self):
+        self.assertRoundTrip('.jsonl')
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_numpy(self):
+        array = self.table.to_numpy()
+        self.assertEqual(len(array), 4)
+        self.assertEqual(int((array['status'] == 'Failed').sum()), 2)
+        self.assertEqual(array['return_code'][3], calltable.INT_NA)
+        self.assertRoundTrip('.npy')
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_arrow(self):
+        self.assertEqual(self.table.to_arrow().num_rows, 4)
+        self.assertRoundTrip('.parquet')
+        self.assertRoundTrip('.arrow')
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
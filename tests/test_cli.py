@@ -0,0 +1,67 @@
+import unittest
+
+import json, os, shutil, subprocess, sys, tempfile, time
+
+from .context import cromulent
+
+# modules that simple subcommands should never pay for
+HEAVY_MODULES = ('googleapiclient', 'google.auth', 'pymysql', 'pyhocon', 'cytoolz', 'tabulate')
+
+# seconds to import the cli and run a simple subcommand, on top of the
+# startup time of a bare python interpreter (measured by the tests)
+STARTUP_BUDGET = float(os.environ.get('CROMULENT_TEST_STARTUP_BUDGET', 1.0))
+
+RUNNER = '''
+import json, sys
+from cromulent.cli import cli
+try:
+    cli(sys.argv[1:], standalone_mode=False)
+except Exception:
+    pass
+print(json.dumps({ 'modules' : sorted(sys.modules.keys()) }))
+'''
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+def run_python(args, env):
+    start = time.time()
+    out = subprocess.check_output([sys.executable] + list(args), cwd=ROOT, env=env)
+    return (time.time() - start, out)
+
+class CliStartupTest(unittest.TestCase):
+
+    def setUp(self):
+        # keep the cli's caches (and daemon lookups) out of the real ~/.cache
+        self.cache_dir = tempfile.mkdtemp()
+        self.env = dict(os.environ, CROMULENT_CACHE_DIR=self.cache_dir)
+        (self.baseline, _) = run_python(['-c', 'pass'], self.env)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def run_cli(self, *args):
+        (elapsed, out) = run_python(['-c', RUNNER] + list(args), self.env)
+        result = json.loads(out.decode('utf-8').strip().splitlines()[-1])
+        result['elapsed'] = elapsed - self.baseline
+        return result
+
+    def assertLightweight(self, result):
+        loaded = [ m for m in result['modules']
+                     if any([ m == h or m.startswith(h + '.') for h in HEAVY_MODULES ]) ]
+        self.assertEqual(loaded, [])
+        self.assertLess(result['elapsed'], STARTUP_BUDGET)
+
+    def test_help(self):
+        self.assertLightweight(self.run_cli('--help'))
+
+    def test_status(self):
+        # no cromwell server is listening on port 1
+        self.assertLightweight(self.run_cli('status', '--port', '1', 'some-workflow-id'))
+
+    def test_wf_help(self):
+        result = self.run_cli('wf', '--help')
+        self.assertIn('cromulent.report', result['modules'])
+        self.assertLess(result['elapsed'], STARTUP_BUDGET)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -1,8 +1,9 @@
 import unittest
 
-import sys
+import json, os, sys, shutil, tempfile
 
 from .context import cromulent
+import cromulent.checkpoint as checkpoint
 import cromulent.cromwell as cromwell
 
 class CromwellServerTest(unittest.TestCase):
@@ -17,5 +18,121 @@ class CromwellServerTest(unittest.TestCase):
     def test2(self):
         self.assertIsNotNone(self.__class__.server)
 
+class FakeGoogle(object):
+    def __init__(self):
+        self.fetched = []
+
+    def get_genomics_operation_metadata(self, name):
+        self.fetched.append(name)
+        fname = 'operation-{}.json'.format(name.rsplit('/', 1)[-1])
+        with open(os.path.join('tests/data/cromulent/gcloud', fname)) as f:
+            return json.load(f)
+
+    def estimate_genomics_operation_cost(self, operation, tier_scheme):
+        return { 'cpu': 1.0, 'mem': 2.0, 'disk': 3.0 }
+
+class CostEstimatorTest(unittest.TestCase):
+
+    def setUp(self):
+        with open('tests/data/cromulent/cromwell/metadata.json') as f:
+            self.metadata = json.load(f)
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_in_flight(self):
+        google = FakeGoogle()
+        estimator = cromwell.CostEstimator(cromwell.Server(), google)
+        costs = estimator.calculate_cost(self.metadata)
+        self.assertEqual(list(costs.keys()), ['Test.Align'])
+        self.assertEqual(costs['Test.Align']['total-cost'], 6.0)
+        self.assertEqual(costs['Test.Align']['items'], [{0: {'cpu': 1.0, 'mem': 2.0, 'disk': 3.0}}])
+        self.assertEqual(costs['Test.Align']['shards'], 1)
+        in_flight = sorted([ (j['task'], j['jobId']) for j in estimator.in_flight ])
+        self.assertEqual(in_flight, [('Test.Align', 'projects/test-project/operations/2'), ('Test.Merge', None)])
+
+    def test_totals_only(self):
+        path = os.path.join(self.tmpdir, 'shards.jsonl')
+        with open(path, 'w') as f:
+            estimator = cromwell.CostEstimator(cromwell.Server(), FakeGoogle(),
+                                               totals_only=True, shard_rows=f)
+            costs = estimator.calculate_cost(self.metadata)
+        self.assertEqual(costs['Test.Align'], { 'cpu': 1.0, 'mem': 2.0, 'disk': 3.0,
+                                                'total-cost': 6.0, 'shards': 1 })
+        with open(path) as f:
+            rows = [ json.loads(l) for l in f ]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['jobId'], 'projects/test-project/operations/1')
+        self.assertEqual(rows[0]['shard'], 0)
+
+    def test_shard_costs(self):
+        google = FakeGoogle()
+        records = cromwell.CostEstimator(cromwell.Server(), google).iter_shard_costs(self.metadata)
+        # nothing is fetched until the records are consumed, one at a time
+        self.assertEqual(google.fetched, [])
+        record = next(records)
+        self.assertEqual(google.fetched, ['projects/test-project/operations/1'])
+        self.assertEqual(record, { 'workflow_id' : self.metadata['id'], 'task' : 'Test.Align',
+                                   'shard' : 0, 'attempt' : 1,
+                                   'jobId' : 'projects/test-project/operations/1',
+                                   'cpu' : 1.0, 'mem' : 2.0, 'disk' : 3.0 })
+        self.assertEqual(list(records), [])
+
+    def test_cost_summary(self):
+        summary = cromwell.CostSummary()
+        cost = { 'cpu' : 1.0, 'mem' : 2.0, 'disk' : 3.0 }
+        for (wf_id, shard) in (('sub-1', 0), ('sub-1', 0), ('sub-1', 1), ('sub-2', 0)):
+            summary.add(dict(cost, workflow_id=wf_id, task='Sub.Task', shard=shard))
+        task = summary.tasks['Sub.Task']
+        self.assertEqual((task['shards'], task['total-cost']), (3, 24.0))
+        self.assertEqual(task['items'], [ { 0 : { 'cpu' : 2.0, 'mem' : 4.0, 'disk' : 6.0 }, 1 : cost },
+                                          { 0 : cost } ])
+
+    def test_cost_summary_totals_only(self):
+        # the shards are counted by their first attempts, without keeping
+        # any per-shard state
+        summary = cromwell.CostSummary(totals_only=True)
+        cost = { 'cpu' : 1.0, 'mem' : 2.0, 'disk' : 3.0 }
+        for shard in range(1000):
+            summary.add(dict(cost, workflow_id='wf', task='Wf.Task', shard=shard, attempt=1))
+        summary.add(dict(cost, workflow_id='wf', task='Wf.Task', shard=7, attempt=2))
+        task = summary.tasks['Wf.Task']
+        self.assertEqual(task['shards'], 1000)
+        self.assertEqual(task['total-cost'], 6006.0)
+        self.assertNotIn('items', task)
+        self.assertEqual(summary.groups, {})
+
+    def test_checkpoint(self):
+        path = os.path.join(self.tmpdir, 'costs.json')
+        wf_id = self.metadata['id']
+
+        cp = checkpoint.CostCheckpoint(path, wf_id)
+        cromwell.CostEstimator(cromwell.Server(), FakeGoogle(), cp).calculate_cost(self.metadata)
+        cp.save()
+        self.assertTrue(os.path.exists(path))
+
+        # the finished operation is not fetched a second time
+        google = FakeGoogle()
+        cp = checkpoint.CostCheckpoint(path, wf_id)
+        self.assertEqual(len(cp), 1)
+        costs = cromwell.CostEstimator(cromwell.Server(), google, cp).calculate_cost(self.metadata)
+        self.assertEqual(google.fetched, ['projects/test-project/operations/2'])
+        self.assertEqual(costs['Test.Align']['total-cost'], 6.0)
+
+        # other workflows in the same file are left alone
+        cp = checkpoint.CostCheckpoint(path, 'another-workflow')
+        self.assertEqual(len(cp), 0)
+
+        # concurrent estimates sharing the file keep each other's workflows
+        other = checkpoint.CostCheckpoint(path, 'yet-another-workflow')
+        cp.record('job-a', { 'cpu' : 1, 'mem' : 0, 'disk' : 0 })
+        other.record('job-b', { 'cpu' : 2, 'mem' : 0, 'disk' : 0 })
+        cp.save()
+        other.save()
+        self.assertIn('job-a', checkpoint.CostCheckpoint(path, 'another-workflow'))
+        self.assertIn('job-b', checkpoint.CostCheckpoint(path, 'yet-another-workflow'))
+        self.assertEqual(len(checkpoint.CostCheckpoint(path, wf_id)), 1)
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
@@ -0,0 +1,112 @@
+import unittest
+
+import json, os, shutil, socket, tempfile, threading, time
+
+from .context import cromulent
+from .test_cromwell import FakeGoogle
+import cromulent.cromwell as cromwell
+import cromulent.daemon as daemon
+
+METADATA = 'tests/data/cromulent/cromwell/metadata.json'
+
+class FakeServer(cromwell.Server):
+    def get_workflow_metadata(self, workflow_id, lite=False):
+        with open(METADATA) as f:
+            return json.load(f)
+
+    def get_workflow_status(self, workflow_id):
+        return 'Running'
+
+class DaemonTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.old_cache_dir = os.environ.get('CROMULENT_CACHE_DIR', None)
+        os.environ['CROMULENT_CACHE_DIR'] = self.cache_dir
+
+        self.daemon = daemon.Daemon()
+        self.daemon.servers[('localhost', 8000)] = FakeServer()
+        self.daemon.google[(None, None)] = FakeGoogle()
+        self.thread = threading.Thread(target=self.daemon.serve)
+        self.thread.start()
+        for i in range(100):
+            if os.path.exists(daemon.state_path()):
+                break
+            time.sleep(0.05)
+
+    def tearDown(self):
+        if self.thread.is_alive():
+            self.daemon.stop()
+            self.thread.join()
+        if self.old_cache_dir is None:
+            del os.environ['CROMULENT_CACHE_DIR']
+        else:
+            os.environ['CROMULENT_CACHE_DIR'] = self.old_cache_dir
+        shutil.rmtree(self.cache_dir)
+
+    def test_forwarding(self):
+        client = daemon.Client.find()
+        self.assertIsNotNone(client)
+
+        metadata = client.request('metadata', workflow_id='some-id', host='localhost', port=8000)
+        self.assertEqual(metadata['id'], '0e2a2a1c-7d5b-4b1e-9f06-5e1f1b3c2d10')
+        self.assertEqual(client.request('status', workflow_id='some-id'), 'Running')
+
+        result = client.request('estimate', metadata_path=METADATA, workflow_id=None)
+        self.assertEqual(result['tasks']['Test.Align']['total-cost'], 6.0)
+        self.assertEqual(len(result['in-flight']), 2)
+
+        with self.assertRaises(Exception):
+            client.request('no-such-operation')
+
+    def test_report(self):
+        # the wf reports are generated by the daemon, and returned as text
+        client = daemon.Client.find()
+        text = client.request('report', report='summary', workflow_id='some-id')
+        self.assertIn('ID         : 0e2a2a1c-7d5b-4b1e-9f06-5e1f1b3c2d10', text)
+        text = client.request('report', report='summary', workflow_id='some-id', fmt='tsv')
+        self.assertEqual(text.splitlines()[0].split('\t')[0], 'call')
+
+    def test_timeout(self):
+        # a daemon that is slow to answer is not taken for an unavailable one
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(1)
+        try:
+            (host, port) = listener.getsockname()
+            client = daemon.Client(host, port, 'x', timeout=0.1)
+            with self.assertRaises(daemon.DaemonTimeout):
+                client.request('status', workflow_id='some-id')
+        finally:
+            listener.close()
+
+    def test_token(self):
+        # only the daemon's owner can read its token
+        self.assertEqual(os.stat(daemon.state_path()).st_mode & 0o777, 0o600)
+
+        client = daemon.Client.find()
+        impostor = daemon.Client(client.host, client.port, 'not-the-token')
+        with self.assertRaises(Exception) as cm:
+            impostor.request('status', workflow_id='some-id')
+        self.assertIn('token', str(cm.exception))
+
+    def test_stale_state(self):
+        self.daemon.stop()
+        self.thread.join()
+        self.assertIsNone(daemon.Client.find())
+
+        # a state file left behind by a daemon that is gone
+        with open(daemon.state_path(), 'w') as f:
+            json.dump({ 'host' : '127.0.0.1', 'port' : 1, 'pid' : 2 ** 22 + 1 }, f)
+        self.assertIsNone(daemon.Client.find())
+
+        # nothing is listening on the address of a state file whose pid
+        # was reused
+        with open(daemon.state_path(), 'w') as f:
+            json.dump({ 'host' : '127.0.0.1', 'port' : 1, 'pid' : os.getpid(), 'token' : 'x' }, f)
+        client = daemon.Client.find()
+        with self.assertRaises(daemon.DaemonUnavailable):
+            client.request('status', workflow_id='some-id')
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,69 @@
+import unittest
+
+from .context import cromulent
+import cromulent.cromwell as cromwell
+import cromulent.fakeserver as fakeserver
+import cromulent.gcloud as gcloud
+import cromulent.synthetic as synthetic
+
+import requests
+
+class FakeServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workflow = synthetic.SyntheticWorkflow(shards=40, calls=2, subworkflow_depth=1,
+                                                    cache_ratio=0.2, expand_subworkflows=False)
+        self.fake = fakeserver.FakeServer(self.workflow).start()
+        self.server = cromwell.Server(self.fake.host, self.fake.port)
+
+    def tearDown(self):
+        self.fake.stop()
+
+    def test_cromwell(self):
+        wf_id = self.workflow.metadata['id']
+        self.assertTrue(self.server.is_accessible())
+        self.assertTrue(cromwell.is_accessible(self.fake.host, self.fake.port))
+        self.assertEqual(self.server.get_workflow_metadata(wf_id), self.workflow.metadata)
+        self.assertEqual(self.server.get_workflow_status(wf_id), 'Succeeded')
+
+        lite = self.server.get_workflow_metadata_lite(wf_id)
+        self.assertNotIn('end', lite)
+        execution = lite['calls']['Synthetic.task_0'][0]
+        self.assertEqual(sorted(execution), ['attempt', 'executionStatus', 'jobId', 'shardIndex', 'start'])
+
+        self.assertEqual(self.server.abort_workflow(wf_id)['status'], 'Aborting')
+        self.assertEqual(self.server.get_workflow_status(wf_id), 'Aborted')
+        with self.assertRaises(Exception) as cm:
+            self.server.get_workflow_metadata('no-such-workflow')
+        self.assertIn('Unrecognized workflow ID', str(cm.exception))
+
+    def test_estimate(self):
+        # the same costs as the synthetic services, over http
+        google = gcloud.GoogleServices(api_root=self.fake.url)
+        self.assertEqual(google.compute_engine_skus(), synthetic.skus())
+
+        costs = cromwell.CostEstimator(self.server, google).calculate_cost(self.workflow.metadata)
+        expected = cromwell.CostEstimator(synthetic.SyntheticServer(self.workflow),
+                                          synthetic.SyntheticGoogle(self.workflow)) \
+                           .calculate_cost(self.workflow.metadata)
+        self.assertEqual(sorted(costs), sorted(expected))
+        for task in costs:
+            self.assertAlmostEqual(costs[task]['total-cost'], expected[task]['total-cost'])
+
+    def test_not_accessible(self):
+        (host, port) = (self.fake.host, self.fake.port)
+        self.fake.stop()
+        self.assertFalse(cromwell.is_accessible(host, port))
+
+    def test_errors(self):
+        self.fake.error_rate = 0.5
+        codes = [ requests.get(self.fake.url + '/engine/v1/version').status_code for i in range(50) ]
+        self.assertEqual(codes.count(503), self.fake.errors)
+        self.assertGreater(self.fake.errors, 10)
+        self.assertLess(self.fake.errors, 40)
+        self.assertEqual(self.fake.requests, 50)
+
+# -- FakeServerTest
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
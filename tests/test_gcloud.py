@@ -0,0 +1,47 @@
+import unittest
+
+import json, sys
+
+from .context import cromulent
+import cromulent.gcloud as gcloud
+
+class GenomicsOperationTest(unittest.TestCase):
+
+    def load(self, fname):
+        with open('tests/data/cromulent/gcloud/{}'.format(fname)) as f:
+            return json.load(f)
+
+    def test_finished(self):
+        op = gcloud.GenomicsOperation(self.load('operation-1.json'))
+        self.assertEqual(op.machine, 'custom-2-7680')
+        self.assertEqual(op.zone, 'us-central1-b')
+        self.assertEqual(op.region, 'us-central1')
+        self.assertEqual(op.project, 'test-project')
+        self.assertFalse(op.preemptible)
+        self.assertTrue(op.is_finished())
+        self.assertAlmostEqual(op.duration(), 3676.530865, places=6)
+        self.assertEqual(op.start_time.isoformat(), '2018-11-21T21:53:45.123456')
+        self.assertEqual(op.cpu.cores, 2)
+        self.assertEqual(op.ram.size, 7.5)
+        self.assertEqual([ (d.size, d.disk_label()) for d in op.disks ],
+                         [ (100, 'pd-ssd'), (10, 'pd-standard') ])
+        self.assertFalse(hasattr(op, '__dict__'))
+
+    def test_milestones(self):
+        op = gcloud.GenomicsOperation(self.load('operation-1.json'))
+        self.assertEqual(op.created, 1542837221.0)
+        self.assertEqual(op.milestones, (1542837260.0, 1542837300.0, 1542837370.0,
+                                         1542840870.0, 1542840901.1))
+        # still running
+        op = gcloud.GenomicsOperation(self.load('operation-2.json'))
+        self.assertEqual(op.milestones[3:], (None, None))
+
+    def test_unfinished(self):
+        op = gcloud.GenomicsOperation(self.load('operation-2.json'))
+        self.assertFalse(op.is_finished())
+        self.assertIsNone(op.end_time)
+        self.assertIsNone(op.length)
+        self.assertIsNone(op.duration())
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,88 @@
+import unittest
+
+import json, os, shutil, tempfile
+
+from .context import cromulent
+import cromulent.cromwell as cromwell
+import cromulent.metrics as metrics
+from .test_cromwell import FakeGoogle
+
+class MetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        metrics.registry.enabled = False
+        metrics.registry.reset()
+
+    def test_disabled(self):
+        registry = metrics.Registry()
+        with registry.timer('a'):
+            pass
+        registry.count('b')
+        registry.timed('c')(lambda: None)()
+        self.assertEqual(registry.summary(), { 'calls' : {}, 'counters' : {} })
+
+    def test_summary(self):
+        registry = metrics.Registry()
+        registry.enable()
+        for i in range(1, 101):
+            registry.observe('fetch', i / 100.0, nbytes=10)
+        with registry.timer('render') as t:
+            t.nbytes = 5
+        self.assertEqual(registry.timed('square')(lambda x: x * x)(3), 9)
+        registry.count('pages', 2)
+
+        summary = registry.summary()
+        fetch = summary['calls']['fetch']
+        self.assertEqual((fetch['count'], fetch['bytes']), (100, 1000))
+        self.assertEqual((fetch['p50'], fetch['p95'], fetch['p99']), (0.51, 0.96, 1.0))
+        self.assertAlmostEqual(fetch['total'], 50.5)
+        self.assertEqual(summary['calls']['render']['bytes'], 5)
+        self.assertEqual(summary['calls']['square']['count'], 1)
+        self.assertEqual(summary['counters'], { 'pages' : 2 })
+
+    def test_reservoir(self):
+        metric = metrics.Metric()
+        for i in range(metrics.RESERVOIR_SIZE * 2):
+            metric.observe(1.0)
+        self.assertEqual(metric.count, metrics.RESERVOIR_SIZE * 2)
+        self.assertEqual(len(metric.samples), metrics.RESERVOIR_SIZE)
+
+    def test_write(self):
+        registry = metrics.Registry()
+        registry.enable()
+        registry.observe('cromwell.metadata', 0.25, nbytes=1024)
+        registry.count('pages')
+
+        path = os.path.join(self.tmpdir, 'metrics.json')
+        registry.write(path)
+        with open(path) as f:
+            self.assertEqual(json.load(f)['calls']['cromwell.metadata']['bytes'], 1024)
+
+        path = os.path.join(self.tmpdir, 'cromulent.prom')
+        registry.write(path)
+        with open(path) as f:
+            lines = f.read().splitlines()
+        self.assertIn('# TYPE cromulent_call_seconds summary', lines)
+        self.assertIn('cromulent_call_seconds{call="cromwell.metadata",quantile="0.99"} 0.25', lines)
+        self.assertIn('cromulent_call_seconds_count{call="cromwell.metadata"} 1', lines)
+        self.assertIn('cromulent_call_bytes_total{call="cromwell.metadata"} 1024', lines)
+        self.assertIn('cromulent_events_total{event="pages"} 1', lines)
+        # no temporary files are left behind
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), ['cromulent.prom', 'metrics.json'])
+
+    def test_estimate(self):
+        metrics.registry.enable()
+        with open('tests/data/cromulent/cromwell/metadata.json') as f:
+            metadata = json.load(f)
+        cromwell.CostEstimator(cromwell.Server(), FakeGoogle()).calculate_cost(metadata)
+        calls = metrics.registry.summary()['calls']
+        self.assertEqual(calls['pricing.operation']['count'], 1)
+
+# -- MetricsTest
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,73 @@
+import unittest
+
+import json, os, shutil, tempfile
+
+from .context import cromulent
+import cromulent.gcloud as gcloud
+import cromulent.pricing as pricing
+
+class PricingIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sku_path = 'tests/data/cromulent/gcloud/skus.json'
+        with open(self.sku_path) as f:
+            self.skus = json.load(f)
+        self.catalogs = {
+            ('us-central1-b', 'test-project') : {
+                (2, 7680) : { 'name' : 'n1-standard-2' },
+                (1, 3840) : { 'name' : 'n1-standard-1' },
+            },
+            ('us-east1-b', 'test-project') : {
+                (4, 3840) : { 'name' : 'n1-highcpu-4' },
+            },
+        }
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'pricing.idx')
+        pricing.write_pricing_index(self.path, self.skus, self.catalogs)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_skus(self):
+        index = pricing.PricingIndex(self.path)
+        self.assertEqual(len(index), len(self.skus))
+        self.assertEqual(sorted(index.keys()), sorted(self.skus.keys()))
+        self.assertNotIn('No Such Sku', index)
+        self.assertIsNone(index.get('No Such Sku'))
+        with self.assertRaises(KeyError):
+            index['No Such Sku']
+
+        for description in self.skus:
+            self.assertIn(description, index)
+            expected = self.skus[description]['pricingInfo'][0]['pricingExpression']
+            found = index[description]['pricingInfo'][0]['pricingExpression']
+            self.assertEqual(found['baseUnitConversionFactor'], expected['baseUnitConversionFactor'])
+            self.assertEqual([ (t['startUsageAmount'], t['unitPrice']['nanos']) for t in found['tieredRates'] ],
+                             [ (t['startUsageAmount'], t['unitPrice']['nanos']) for t in expected['tieredRates'] ])
+
+    def test_compute_types(self):
+        index = pricing.PricingIndex(self.path)
+        machines = index.get_compute_types('us-central1-b', 'test-project')
+        self.assertEqual(sorted(machines.keys()), [ (1, 3840), (2, 7680) ])
+        self.assertEqual(machines[(2, 7680)]['name'], 'n1-standard-2')
+        self.assertEqual(list(index.get_compute_types('us-east1-b', 'test-project').keys()), [ (4, 3840) ])
+        self.assertIsNone(index.get_compute_types('us-west1-a', 'test-project'))
+
+    def test_google_services(self):
+        with open('tests/data/cromulent/gcloud/operation-1.json') as f:
+            op = gcloud.GenomicsOperation(json.load(f))
+
+        google = gcloud.GoogleServices(index_path=self.path)
+        cost = google.estimate_genomics_operation_cost(op, 'no-free')
+
+        google = gcloud.GoogleServices(self.sku_path)
+        google.get_available_compute_types = lambda zone, project: {}
+        expected = google.estimate_genomics_operation_cost(op, 'no-free')
+        self.assertEqual(cost, expected)
+
+    def test_not_an_index(self):
+        with self.assertRaises(Exception):
+            pricing.PricingIndex(self.sku_path)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,48 @@
+import unittest
+
+import os, pstats, shutil, sys, tempfile
+
+from .context import cromulent
+import cromulent.profiling as profiling
+
+class ProfilingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_cpu_profile(self):
+        path = os.path.join(self.tmpdir, 'cromulent.pstats')
+        profile = profiling.CpuProfile(path)
+        profile.start()
+        sorted(range(1000), key=lambda i: -i)
+        profile.stop()
+        profile.stop()
+        self.assertGreater(pstats.Stats(path).total_calls, 0)
+
+    @unittest.skipIf(sys.version_info < (3, 4), "needs tracemalloc")
+    def test_memory_profile(self):
+        path = os.path.join(self.tmpdir, 'memory.txt')
+        profile = profiling.MemoryProfile(path, top=3)
+        profile.start()
+        blocks = [ bytearray(1024) for i in range(1000) ]
+        profile.stop()
+        with open(path) as f:
+            lines = f.read().splitlines()
+        self.assertTrue(lines[0].startswith('peak memory    : '))
+        self.assertTrue(lines[3].startswith('top '))
+        # the largest allocation site is the list of blocks above
+        self.assertIn('test_profiling.py', lines[4])
+        self.assertLessEqual(len(lines), 7)
+
+    def test_size(self):
+        self.assertEqual(profiling._size(512), '512.0 B')
+        self.assertEqual(profiling._size(3 * 1024 * 1024), '3.0 MiB')
+        self.assertEqual(profiling._size(5 * 1024 ** 3), '5.0 GiB')
+
+# -- ProfilingTest
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
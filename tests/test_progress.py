@@ -0,0 +1,77 @@
+import unittest
+
+import json, logging
+
+from .context import cromulent
+import cromulent.cromwell as cromwell
+import cromulent.progress as progress
+from .test_cromwell import FakeGoogle
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+class ProgressTest(unittest.TestCase):
+
+    def tearDown(self):
+        progress.meter.disable()
+
+    def test_disabled(self):
+        meter = progress.Meter()
+        meter.count('jobs')
+        meter.expect(10)
+        self.assertEqual((meter.counts, meter.expected), ({}, 0))
+
+    def test_estimate(self):
+        (live, json_out) = (StringIO(), StringIO())
+        progress.meter.enable(live=live, json_out=json_out)
+        with open('tests/data/cromulent/cromwell/metadata.json') as f:
+            metadata = json.load(f)
+        cromwell.CostEstimator(cromwell.Server(), FakeGoogle()).calculate_cost(metadata)
+        progress.meter.close()
+        self.assertFalse(progress.meter.enabled)
+
+        snapshots = [ json.loads(l) for l in json_out.getvalue().splitlines() ]
+        last = snapshots[-1]
+        self.assertEqual((last['jobs'], last['expected'], last['queue'], last['priced']), (3, 3, 0, 1))
+        self.assertIsNone(last['cache_hit_rate'])
+        self.assertTrue(live.getvalue().startswith('\r[cromulent] jobs '))
+        self.assertTrue(live.getvalue().endswith('\n'))
+
+    def test_snapshot(self):
+        meter = progress.Meter()
+        meter.enable(json_out=StringIO())
+        meter.start -= 10
+        meter.expect(100)
+        meter.count('jobs', 20)
+        meter.count('cache-hits', 3)
+        meter.count('cache-misses')
+        snapshot = meter.snapshot()
+        self.assertEqual(snapshot['queue'], 80)
+        self.assertEqual(snapshot['cache_hit_rate'], 0.75)
+        self.assertAlmostEqual(snapshot['eta'], 40, delta=1)
+        meter.disable()
+
+    def test_logging(self):
+        # a log record clears the live line and redraws it
+        live = StringIO()
+        meter = progress.Meter()
+        meter.enable(live=live)
+        handler = logging.StreamHandler(live)
+        meter.clear_around(handler)
+        meter.count('jobs')
+        line = live.getvalue()
+        self.assertTrue(line.startswith('\r[cromulent] jobs 1/0'))
+
+        handler.handle(logging.makeLogRecord({ 'msg' : 'Fetching metadata' }))
+        self.assertEqual(live.getvalue(), line + '\r\x1b[K' + 'Fetching metadata\n' + line)
+
+        # and nothing is redrawn once the meter is done
+        meter.close()
+        before = live.getvalue()
+        handler.handle(logging.makeLogRecord({ 'msg' : 'Done' }))
+        self.assertEqual(live.getvalue(), before + 'Done\n')
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,60 @@
+import unittest
+
+import datetime, decimal, itertools, json
+
+from .context import cromulent
+import cromulent.render as render
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+class TableWriterTest(unittest.TestCase):
+
+    def test_simple(self):
+        out = StringIO()
+        render.render([ ['a', 1, 0.5], ['bbb', 22, None] ], ['name', 'n', 'x'], out=out)
+        self.assertEqual(out.getvalue().splitlines(), [
+            'name   n    x',
+            '----  --  ---',
+            'a      1  0.5',
+            'bbb   22',
+        ])
+
+    def test_streaming(self):
+        # the rows past the sample are written as they are produced
+        out = StringIO()
+        writer = render.TableWriter(['n'], out=out, sample_size=2)
+        writer.write([1])
+        self.assertEqual(out.getvalue(), '')
+        writer.write([2])
+        self.assertEqual(len(out.getvalue().splitlines()), 4)
+        writer.write([12345])
+        self.assertEqual(out.getvalue().splitlines()[-1], '12345')
+
+        # fixed widths need no sample at all
+        out = StringIO()
+        writer = render.TableWriter(['n'], out=out, widths=[3])
+        writer.write([1])
+        self.assertEqual(out.getvalue().splitlines(), ['  n', '---', '  1'])
+
+    def test_tsv_jsonl(self):
+        out = StringIO()
+        render.render([ ['a\tb', None] ], ['x', 'y'], fmt='tsv', out=out)
+        self.assertEqual(out.getvalue(), 'x\ty\na b\t\n')
+
+        out = StringIO()
+        rows = ( [i] for i in itertools.count() )
+        render.render(itertools.islice(rows, 3), ['i'], fmt='jsonl', out=out)
+        self.assertEqual([ json.loads(l)['i'] for l in out.getvalue().splitlines() ], [0, 1, 2])
+
+    def test_jsonl_database_types(self):
+        # the DATETIME and DECIMAL columns of the database
+        out = StringIO()
+        render.render([ [datetime.datetime(2018, 5, 1, 12, 30), decimal.Decimal('1.50')] ],
+                      ['start', 'cost'], fmt='jsonl', out=out)
+        self.assertEqual(json.loads(out.getvalue()), { 'start' : '2018-05-01T12:30:00', 'cost' : '1.50' })
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
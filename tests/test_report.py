@@ -0,0 +1,97 @@
+import unittest
+
+import json, os, shutil, sys, tempfile
+
+from .context import cromulent
+import cromulent.calltable as calltable
+import cromulent.report as report
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+class FakeGoogle(object):
+    # every job ran as the same operation
+    def get_genomics_operation_metadata(self, name):
+        with open('tests/data/cromulent/gcloud/operation-1.json') as f:
+            return json.load(f)
+
+class WorkflowReportTest(unittest.TestCase):
+
+    def setUp(self):
+        with open('tests/data/cromulent/calltable/metadata.json') as f:
+            metadata = json.load(f)
+        self.calls = calltable.CallTable.from_metadata(metadata, expand=False)
+
+    def test_call_statuses(self):
+        (calls, states, stats) = report._get_wf_call_statuses(self.calls)
+        self.assertEqual(calls, ['Outer.Inner', 'Outer.Prepare', 'Outer.Report'])
+        self.assertEqual(states, ['Done', 'Failed', 'NotStarted'])
+        self.assertEqual(stats['Outer.Prepare'], { 'Done' : 1, 'Failed' : 1, 'NotStarted' : 0 })
+
+    def test_call_failures(self):
+        fails = report._get_wf_call_failures(self.calls, {})
+        self.assertEqual(sorted(fails.keys()), ['Outer.Inner', 'Outer.Prepare'])
+        self.assertEqual(fails['Outer.Prepare'][0]['rc'], 1)
+        self.assertEqual(fails['Outer.Inner'][0]['rc'], 'NA')
+
+        fails = report._get_wf_call_failures(self.calls, { 'jobids' : 'operations/10,operations/99' })
+        self.assertEqual(list(fails.keys()), ['Outer.Prepare'])
+
+        fails = report._get_wf_call_failures(self.calls, { 'calls' : 'Outer.Inner' })
+        self.assertEqual(list(fails.keys()), ['Outer.Inner'])
+
+    def test_stderr_tails(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            fails = report._get_wf_call_failures(self.calls, {})
+            path = os.path.join(tmpdir, 'stderr')
+            with open(path, 'w') as f:
+                f.write('x' * 4096 + '\nOutOfMemoryError\n')
+            fails['Outer.Prepare'][0]['stderr'] = path
+
+            report._read_stderr_tails(fails, 1024, 4)
+            self.assertEqual(fails['Outer.Prepare'][0]['stderr_tail'], 'OutOfMemoryError\n')
+            self.assertIsNone(fails['Outer.Inner'][0]['stderr_tail'])
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_phases(self):
+        with open('tests/data/cromulent/calltable/metadata.json') as f:
+            metadata = json.load(f)
+        self.assertRaises(Exception, report.workflow_report, 'phases', metadata, None, 'jsonl')
+
+        (stdout, sys.stdout) = (sys.stdout, StringIO())
+        try:
+            report.workflow_report('phases', metadata, None, 'jsonl', google=FakeGoogle())
+            rows = [ json.loads(line) for line in sys.stdout.getvalue().splitlines() ]
+        finally:
+            sys.stdout = stdout
+
+        # the subworkflow's job is included, the unstarted call is not
+        self.assertEqual(sorted(set([ r['call'] for r in rows ])), ['Inner.Work', 'Outer.Prepare'])
+        running = [ r for r in rows if r['call'] == 'Outer.Prepare' and r['phase'] == 'running' ]
+        self.assertEqual(running[0]['jobs'], 2)
+        self.assertEqual(running[0]['p50'], '0:58:20')
+
+    def test_concurrency(self):
+        with open('tests/data/cromulent/calltable/metadata.json') as f:
+            metadata = json.load(f)
+
+        (stdout, sys.stdout) = (sys.stdout, StringIO())
+        try:
+            report.workflow_report('concurrency', metadata, 'timeline=true', 'jsonl', google=FakeGoogle())
+            rows = [ json.loads(line) for line in sys.stdout.getvalue().splitlines() ]
+        finally:
+            sys.stdout = stdout
+
+        peaks = dict([ (r['resource'], r['peak']) for r in rows if 'resource' in r ])
+        self.assertEqual(peaks['vms'], 3)
+        self.assertEqual(peaks['cores'], 6)
+        self.assertEqual(peaks['pd_ssd_gb'], 300)
+        timeline = [ r for r in rows if 'time' in r ]
+        self.assertEqual([ r['vms'] for r in timeline ], [3, 0])
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
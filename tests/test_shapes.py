@@ -0,0 +1,59 @@
+import unittest
+
+import json
+
+from .context import cromulent
+import cromulent.calltable as calltable
+import cromulent.gcloud as gcloud
+import cromulent.shapes as shapes
+
+CATALOG = {
+    (1, 3840)  : { 'name' : 'n1-standard-1' },
+    (2, 7680)  : { 'name' : 'n1-standard-2' },
+    (4, 15360) : { 'name' : 'n1-standard-4' },
+    (2, 13312) : { 'name' : 'n1-highmem-2' },   # not in the sku list
+    (1, 614)   : { 'name' : 'f1-micro' },       # shared core
+}
+
+class ShapesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.google = gcloud.GoogleServices('tests/data/cromulent/gcloud/skus.json')
+        self.google.get_available_compute_types = lambda zone, project: CATALOG
+        self.recommender = shapes.ShapeRecommender(self.google, 'us-central1-b', 'test-project', False)
+
+    def test_predefined(self):
+        self.assertEqual(self.recommender.levels, [1, 2, 4])
+        shape = self.recommender.cheapest(2, 7680)
+        self.assertEqual((shape.name, shape.cores, shape.mem_mb), ('n1-standard-2', 2, 7680))
+        # less memory on a custom shape beats the predefined type
+        self.assertEqual(self.recommender.cheapest(2, 4000).name, 'custom-2-4096')
+        self.assertEqual(self.recommender.cheapest(3, 15000).name, 'n1-standard-4')
+
+    def test_custom(self):
+        # cheaper than n1-standard-4
+        shape = self.recommender.cheapest(3, 4000)
+        self.assertEqual((shape.name, shape.cores, shape.mem_mb), ('custom-4-4096', 4, 4096))
+        # too much memory for 2 cores
+        self.assertEqual(self.recommender.cheapest(2, 20000).name, 'custom-4-20224')
+        self.assertIsNone(self.recommender.cheapest(200, 1024))
+
+    def test_recommend(self):
+        with open('tests/data/cromulent/gcloud/operation-1.json') as f:
+            op = gcloud.GenomicsOperation(json.load(f))
+        calls = calltable.CallTable()
+        for call in ('A', 'A', 'B'):
+            calls.append({ 'call' : call })
+        calls.operations = [op, op, None]
+
+        tasks = shapes.recommend(self.google, calls)
+        self.assertEqual(list(tasks.keys()), ['A'])
+        self.assertEqual(tasks['A']['jobs'], 2)
+        self.assertEqual(tasks['A']['machine'], 'custom-2-7680')
+        self.assertEqual(tasks['A']['recommended'], 'n1-standard-2')
+        expected = self.google.estimate_genomics_operation_cost(op, 'all')
+        self.assertAlmostEqual(tasks['A']['cost'], 2 * (expected['cpu'] + expected['mem']), places=3)
+        self.assertLess(tasks['A']['projected'], tasks['A']['cost'])
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
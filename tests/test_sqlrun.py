@@ -1,6 +1,11 @@
 import unittest
 
-import os, sys
+import datetime, decimal, json, os, sqlite3, sys
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
 
 from .context import cromulent
 import cromulent.app as app
@@ -13,6 +18,46 @@ class CromulentSqlrunTest(unittest.TestCase):
         db = theapp.connect()
         sqlrun.run(db, "tests/data/cromulent/sqlrun/select.sql")
 
+    def test_runsql_dict_cursor(self):
+        # like the pymysql DictCursor of the mysql connections
+        theapp = app.CromulentApp("tests/data/cromulent/app/sqlite.conf")
+        db = theapp.connect()
+        db.row_factory = lambda c, row: dict(zip([ d[0] for d in c.description ], row))
+        expected = db.execute("select name, id from test").fetchall()
+
+        (stdout, sys.stdout) = (sys.stdout, StringIO())
+        try:
+            sqlrun.run(db, "tests/data/cromulent/sqlrun/select.sql", fmt='tsv')
+            lines = sys.stdout.getvalue().splitlines()
+        finally:
+            sys.stdout = stdout
+        self.assertEqual(lines[0], 'name\tid')
+        self.assertEqual(lines[1:], [ '{}\t{}'.format(r['name'], r['id']) for r in expected ])
+
+    def test_runsql_jsonl_database_types(self):
+        # a mysql row with DATETIME and DECIMAL columns
+        theapp = app.CromulentApp("tests/data/cromulent/app/sqlite.conf")
+        db = theapp.connect()
+        db.row_factory = lambda c, row: { 'name' : datetime.datetime(2018, 5, 1), 'id' : decimal.Decimal('2.5') }
+
+        (stdout, sys.stdout) = (sys.stdout, StringIO())
+        try:
+            sqlrun.run(db, "tests/data/cromulent/sqlrun/select.sql", fmt='jsonl')
+            lines = sys.stdout.getvalue().splitlines()
+        finally:
+            sys.stdout = stdout
+        self.assertGreater(len(lines), 0)
+        self.assertEqual(json.loads(lines[0]), { 'name' : '2018-05-01T00:00:00', 'id' : '2.5' })
+
+    def test_mysql_cursor(self):
+        # the mysql result sets are streamed with an unbuffered cursor
+        try:
+            import pymysql, pymysql.cursors
+        except ImportError:
+            self.skipTest('pymysql is not installed')
+        db = pymysql.connect(defer_connect=True)
+        self.assertIsInstance(sqlrun._cursor(db), pymysql.cursors.SSDictCursor)
+
 # -- CromulentSqlrunTest
 
 if __name__ == '__main__':
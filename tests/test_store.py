@@ -0,0 +1,78 @@
+import unittest
+
+import json, os, shutil, tempfile
+
+from .context import cromulent
+import cromulent.cromwell as cromwell
+import cromulent.store as cstore
+
+class MetadataStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        with open('tests/data/cromulent/cromwell/metadata.json') as f:
+            self.metadata = json.load(f)
+        self.wf_id = self.metadata['id']
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_terminal_only(self):
+        store = cstore.MetadataStore(self.root)
+        self.assertFalse(store.put(self.wf_id, {}, self.metadata))
+        self.assertIsNone(store.get(self.wf_id, {}))
+
+        self.metadata['status'] = 'Succeeded'
+        self.assertTrue(store.put(self.wf_id, {}, self.metadata))
+        self.assertEqual(store.get(self.wf_id, {}), self.metadata)
+        self.assertEqual(store.status(self.wf_id), 'Succeeded')
+
+        # other query parameters are a different variant
+        self.assertIsNone(store.get(self.wf_id, { 'includeKey' : ['status'] }))
+
+        # the index is persisted
+        self.assertEqual(cstore.MetadataStore(self.root).get(self.wf_id, {}), self.metadata)
+
+    def test_eviction(self):
+        self.metadata['status'] = 'Failed'
+        store = cstore.MetadataStore(self.root)
+        store.put('wf-1', {}, self.metadata)
+        store.max_bytes = store.size() + 1
+
+        store.get('wf-1', {})
+        store.put('wf-2', {}, self.metadata)
+        self.assertNotIn('wf-1', store)
+        self.assertIn('wf-2', store)
+        self.assertEqual(len(os.listdir(self.root)), 2) # index + wf-2
+
+    def test_concurrent_processes(self):
+        # two stores over the same directory, like the estimate-batch workers
+        self.metadata['status'] = 'Succeeded'
+        (a, b) = (cstore.MetadataStore(self.root), cstore.MetadataStore(self.root))
+        a.put('wf-1', {}, self.metadata)
+        b.put('wf-2', {}, self.metadata)
+        self.assertIsNotNone(a.get('wf-1', {}))
+        a.put('wf-3', {}, self.metadata)
+
+        store = cstore.MetadataStore(self.root)
+        for wf_id in ('wf-1', 'wf-2', 'wf-3'):
+            self.assertIn(wf_id, store)
+        self.assertEqual(len(os.listdir(self.root)), 4) # index + 3 workflows
+
+        # an entry evicted by one store is not brought back by another
+        b.max_bytes = 0
+        b.put('wf-5', {}, self.metadata)
+        a.put('wf-4', {}, self.metadata)
+        self.assertEqual(sorted([ e['workflow_id'] for e in a.index.values() ]), ['wf-4'])
+
+    def test_server(self):
+        # a stored workflow never reaches the (unreachable) server
+        self.metadata['status'] = 'Aborted'
+        store = cstore.MetadataStore(self.root)
+        server = cromwell.Server(port=1, store=store)
+        store.put(self.wf_id, { 'expandSubWorkflows' : 'false' }, self.metadata)
+        self.assertEqual(server.get_workflow_metadata(self.wf_id)['status'], 'Aborted')
+        self.assertEqual(server.get_workflow_status(self.wf_id), 'Aborted')
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,93 @@
+import unittest
+
+from .context import cromulent
+import cromulent.calltable as calltable
+import cromulent.cromwell as cromwell
+import cromulent.gcloud as gcloud
+import cromulent.synthetic as synthetic
+
+class SyntheticTest(unittest.TestCase):
+
+    def test_shape(self):
+        workflow = synthetic.SyntheticWorkflow(shards=100, calls=3, subworkflow_depth=2,
+                                               failure_ratio=0.2, seed=1)
+        calls = calltable.CallTable.from_metadata(workflow.metadata)
+        attempts = len([ a for a in calls['attempt'] if a == 1 ])
+        retries = len([ a for a in calls['attempt'] if a == 2 ])
+        self.assertEqual(attempts, 100)
+        self.assertEqual(retries, len([ s for s in calls['status'] if s == 'Failed' ]))
+        self.assertGreater(retries, 0)
+        self.assertEqual(len(set(calls['workflow_id'])), 3)
+        self.assertEqual(workflow.jobs, 100 + retries)
+        self.assertEqual(workflow.metadata['status'], 'Failed')
+
+        # the same arguments generate the same workflow
+        again = synthetic.SyntheticWorkflow(shards=100, calls=3, subworkflow_depth=2,
+                                            failure_ratio=0.2, seed=1)
+        self.assertEqual(again.metadata, workflow.metadata)
+
+    def test_operations(self):
+        workflow = synthetic.SyntheticWorkflow(shards=20, calls=2)
+        google = synthetic.SyntheticGoogle(workflow)
+        for name in workflow.operation_names():
+            op = gcloud.GenomicsOperation(google.get_genomics_operation_metadata(name))
+            self.assertTrue(op.is_finished())
+            self.assertIsNotNone(op.milestones[2])
+            cost = google.estimate_genomics_operation_cost(op, 'all')
+            self.assertGreater(cost['cpu'], 0)
+        self.assertRaises(KeyError, workflow.operation, 'projects/synthetic-project/operations/21')
+
+    def test_estimate(self):
+        workflow = synthetic.SyntheticWorkflow(shards=200, calls=4, subworkflow_depth=1,
+                                               cache_ratio=0.25, expand_subworkflows=False)
+        server = synthetic.SyntheticServer(workflow)
+        estimator = cromwell.CostEstimator(server, synthetic.SyntheticGoogle(workflow))
+        records = list(estimator.iter_shard_costs(workflow.metadata))
+        # every shard is priced, the call cached ones with the job of the cache source
+        self.assertEqual(len(records), 200)
+        self.assertEqual(estimator.in_flight, [])
+        self.assertIn(workflow.cache_source['id'], workflow.workflows)
+        self.assertEqual(server.get_workflow_status(workflow.metadata['id']), 'Succeeded')
+
+    def test_naming(self):
+        workflow = synthetic.SyntheticWorkflow(shards=50, calls=5, cache_ratio=0.2, seed=3,
+                                               project='some-project')
+        names = list(workflow.operation_names())
+        self.assertEqual(names[0], 'projects/some-project/operations/1')
+        self.assertEqual(len(set(names)), workflow.jobs)
+
+        # every job id of the metadata (and of the cache source) is an operation
+        job_ids = [ e['jobId'] for wf in workflow.workflows.values()
+                    for executions in wf['calls'].values() for e in executions if 'jobId' in e ]
+        self.assertEqual(sorted(job_ids), sorted(names))
+        self.assertEqual(sorted(workflow.metadata['calls']), [ 'Synthetic.task_{}'.format(i) for i in range(5) ])
+        for name in names[:5]:
+            self.assertEqual(workflow.operation(name)['name'], name)
+            self.assertEqual(workflow.job(name)['n'], int(name.rsplit('/', 1)[1]))
+
+    def test_seed(self):
+        workflow = synthetic.SyntheticWorkflow(shards=50, calls=2, cache_ratio=0.3, seed=7)
+        again = synthetic.SyntheticWorkflow(shards=50, calls=2, cache_ratio=0.3, seed=7)
+        other = synthetic.SyntheticWorkflow(shards=50, calls=2, cache_ratio=0.3, seed=8)
+        self.assertEqual(again.workflows, workflow.workflows)
+        name = next(workflow.operation_names())
+        self.assertEqual(again.operation(name), workflow.operation(name))
+        self.assertNotEqual(other.metadata['id'], workflow.metadata['id'])
+        self.assertNotEqual(other.operation(name), workflow.operation(name))
+
+    def test_scale(self):
+        # the largest workflows of the benchmarks (see test_benchmark.py)
+        workflow = synthetic.SyntheticWorkflow(shards=100000, calls=20, subworkflow_depth=2,
+                                               cache_ratio=0.1, failure_ratio=0.05)
+        calls = calltable.CallTable.from_metadata(workflow.metadata)
+        self.assertEqual(len([ a for a in calls['attempt'] if a == 1 ]), 100000)
+        self.assertEqual(len(set(calls['workflow_id'])), 3)
+        # the cached shards ran their jobs in the cache source
+        cached = len([ e for c in workflow.cache_source['calls'].values() for e in c if 'jobId' in e ])
+        self.assertAlmostEqual(cached / 100000.0, 0.1, delta=0.01)
+        self.assertEqual(workflow.jobs, len([ j for j in calls['job_id'] if j is not None ]) + cached)
+
+# -- SyntheticTest
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,114 @@
+import unittest
+
+import json, os, shutil, tempfile
+
+from .context import cromulent
+import cromulent.cromwell as cromwell
+import cromulent.tracing as tracing
+from .test_cromwell import FakeGoogle
+
+class TracingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        tracing.tracer.disable()
+        tracing.tracer.reset()
+
+    def test_disabled(self):
+        tracer = tracing.Tracer()
+        with tracer.span('a') as s:
+            s.set('b', 1)
+            tracer.annotate('c', 2)
+        self.assertEqual(tracer.spans, [])
+
+    def test_nesting(self):
+        tracer = tracing.Tracer()
+        tracer.enable()
+
+        def records():
+            # a generator keeps its span open across its yields
+            with tracer.span('producer'):
+                for i in range(2):
+                    yield i
+
+        with tracer.span('root', workflow_id='wf') as root:
+            for i in records():
+                with tracer.span('consumer', item=i):
+                    tracer.annotate('cache_hit', i == 1)
+            with tracer.span('failing'):
+                self.assertRaises(ValueError, int, 'x')
+            try:
+                with tracer.span('raising'):
+                    raise ValueError('x')
+            except ValueError:
+                pass
+
+        spans = dict([ (s.name, s) for s in tracer.spans ])
+        self.assertIsNone(root.parent_id)
+        self.assertEqual(root.attributes, { 'workflow_id' : 'wf' })
+        self.assertEqual(spans['producer'].parent_id, root.span_id)
+        self.assertEqual(spans['consumer'].parent_id, spans['producer'].span_id)
+        self.assertEqual(spans['consumer'].attributes, { 'item' : 1, 'cache_hit' : True })
+        self.assertEqual(spans['failing'].parent_id, root.span_id)
+        self.assertNotIn('error', spans['failing'].attributes)
+        self.assertEqual(spans['raising'].attributes['error'], 'ValueError')
+        self.assertEqual(tracer._stack(), [])
+
+    def test_estimate(self):
+        tracing.tracer.enable()
+        with open('tests/data/cromulent/cromwell/metadata.json') as f:
+            metadata = json.load(f)
+        cromwell.CostEstimator(cromwell.Server(), FakeGoogle()).calculate_cost(metadata)
+
+        spans = tracing.tracer.spans
+        by_id = dict([ (s.span_id, s) for s in spans ])
+        pricing = [ s for s in spans if s.name == 'pricing' ]
+        self.assertEqual(len(pricing), 1)
+        chain = []
+        span = pricing[0]
+        while span is not None:
+            chain.append(span.name)
+            span = by_id.get(span.parent_id, None)
+        self.assertEqual(chain, ['pricing', 'shard', 'call', 'workflow', 'calculate_cost'])
+        shard = by_id[pricing[0].parent_id]
+        self.assertEqual(shard.attributes['jobId'], 'projects/test-project/operations/1')
+        self.assertEqual(len([ s for s in spans if s.name == 'shard' ]), 3)
+
+    def test_write(self):
+        tracer = tracing.Tracer()
+        tracer.enable()
+        with tracer.span('workflow', workflow_id='wf'):
+            with tracer.span('shard', shard=3, cache_hit=False, cost=1.5):
+                pass
+
+        path = os.path.join(self.tmpdir, 'trace.json')
+        tracer.write(path)
+        with open(path) as f:
+            events = json.load(f)['traceEvents']
+        self.assertEqual([ e['name'] for e in events ], ['workflow', 'shard'])
+        self.assertEqual(events[1]['ph'], 'X')
+        self.assertEqual(events[1]['args']['parent_id'], events[0]['args']['span_id'])
+        self.assertGreaterEqual(events[0]['dur'], events[1]['dur'])
+
+        path = os.path.join(self.tmpdir, 'trace.otlp.json')
+        tracer.write(path)
+        with open(path) as f:
+            spans = json.load(f)['resourceSpans'][0]['scopeSpans'][0]['spans']
+        shard = [ s for s in spans if s['name'] == 'shard' ][0]
+        workflow = [ s for s in spans if s['name'] == 'workflow' ][0]
+        self.assertEqual(shard['parentSpanId'], workflow['spanId'])
+        self.assertEqual(shard['traceId'], workflow['traceId'])
+        self.assertNotIn('parentSpanId', workflow)
+        self.assertEqual(shard['attributes'], [
+            { 'key' : 'cache_hit', 'value' : { 'boolValue' : False } },
+            { 'key' : 'cost', 'value' : { 'doubleValue' : 1.5 } },
+            { 'key' : 'shard', 'value' : { 'intValue' : '3' } },
+        ])
+
+# -- TracingTest
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,54 @@
+import unittest
+
+import os, shutil, tempfile
+
+from .context import cromulent
+import cromulent.utils as utils
+
+class UtilsTest(unittest.TestCase):
+
+    def test_parse_rfc3339(self):
+        self.assertEqual(utils.parse_rfc3339('1970-01-01T00:00:00Z'), 0.0)
+        self.assertEqual(utils.parse_rfc3339('2018-11-21T21:53:45.123456Z'), 1542837225.123456)
+        self.assertEqual(utils.parse_rfc3339('2019-03-05T19:40:54.684-06:00'), 1551836454.684)
+        self.assertEqual(utils.parse_rfc3339('2019-03-05T19:40:54+05:30'), 1551795054.0)
+        with self.assertRaises(ValueError):
+            utils.parse_rfc3339('yesterday')
+
+    def test_parse_wf_report_opts(self):
+        self.assertEqual(utils.parse_wf_report_opts(None), {})
+        self.assertEqual(utils.parse_wf_report_opts('detail=true;calls=a,b'),
+                         { 'detail' : 'true', 'calls' : 'a,b' })
+
+    def test_hms(self):
+        self.assertEqual(utils.hms(0), '0:00:00')
+        self.assertEqual(utils.hms(3725.6), '1:02:06')
+        self.assertEqual(utils.hms(100 * 3600), '100:00:00')
+
+    def test_job_id_matcher(self):
+        match = utils.JobIdMatcher(['operations/12', 'she', 'hers'])
+        self.assertTrue(match('operations/12'))
+        self.assertTrue(match('projects/p/operations/123'))
+        self.assertTrue(match('ushers'))
+        self.assertFalse(match('projects/p/operations/1'))
+        self.assertFalse(match(None))
+
+    def test_tail_file(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'stderr')
+            with open(path, 'w') as f:
+                f.write('first line\nsecond line\nlast line\n')
+            self.assertEqual(utils.tail_file(path, 1024), 'first line\nsecond line\nlast line\n')
+            # starts at a line boundary
+            self.assertEqual(utils.tail_file('file://' + path, 15), 'last line\n')
+
+            open(path, 'w').close()
+            self.assertEqual(utils.tail_file(path, 1024), '')
+            self.assertIsNone(utils.tail_file('gs://bucket/stderr', 1024))
+            self.assertIsNone(utils.tail_file(os.path.join(tmpdir, 'missing'), 1024))
+        finally:
+            shutil.rmtree(tmpdir)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
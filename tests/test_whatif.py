@@ -0,0 +1,56 @@
+import unittest
+
+import json
+
+from .context import cromulent
+import cromulent.gcloud as gcloud
+import cromulent.whatif as whatif
+
+class WhatIfTest(unittest.TestCase):
+
+    def setUp(self):
+        with open('tests/data/cromulent/gcloud/operation-1.json') as f:
+            self.op = gcloud.GenomicsOperation(json.load(f))
+        self.google = gcloud.GoogleServices('tests/data/cromulent/gcloud/skus.json')
+        self.google.get_available_compute_types = lambda zone, project: {}
+        with open('tests/data/cromulent/gcloud/operation-2.json') as f:
+            unfinished = gcloud.GenomicsOperation(json.load(f))
+        self.operation_set = whatif.OperationSet(self.google, [self.op, self.op, unfinished, None])
+
+    def test_as_run(self):
+        self.assertEqual(self.operation_set.count, 2)
+        for tier_scheme in whatif.TIER_SCHEMES:
+            cost = self.operation_set.price(whatif.Scenario(tier_scheme, None, None, None))
+            expected = self.google.estimate_genomics_operation_cost(self.op, tier_scheme)
+            for k in ('cpu', 'mem', 'disk'):
+                self.assertAlmostEqual(cost[k], 2 * expected[k], delta=1e-6 * expected[k])
+
+    def test_scenarios(self):
+        grid = whatif.scenarios(regions=(None, 'us-east1'), preemptible=(None, True),
+                                families=(None, 'n1-standard'))
+        self.assertEqual(len(grid), 8)
+        results = dict([ (s, (cost, as_run)) for (s, cost, as_run) in whatif.compare(self.operation_set, grid) ])
+
+        (cost, as_run) = results[whatif.Scenario('all', 'us-east1', True, None)]
+        self.assertLess(cost['cpu'], as_run['cpu'])
+        self.assertEqual(cost['disk'], as_run['disk'])
+
+        # there are no preemptible n1 standard skus in the list
+        (cost, as_run) = results[whatif.Scenario('all', None, True, 'n1-standard')]
+        self.assertIsNone(cost)
+        self.assertIsNotNone(results[whatif.Scenario('all', None, None, 'n1-standard')][0])
+
+    def test_region_not_preemptible(self):
+        # the skus of the operations that are not preemptible are global, so
+        # their region scenarios are not priced
+        grid = whatif.scenarios(regions=(None, 'us-east1'), preemptible=(None, False, True))
+        results = dict([ (s, cost) for (s, cost, as_run) in whatif.compare(self.operation_set, grid) ])
+        self.assertIsNone(results[whatif.Scenario('all', 'us-east1', None, None)])
+        self.assertIsNone(results[whatif.Scenario('all', 'us-east1', False, None)])
+        self.assertIsNotNone(results[whatif.Scenario('all', 'us-east1', True, None)])
+        self.assertIsNotNone(results[whatif.Scenario('all', None, False, None)])
+        self.assertFalse(self.operation_set.is_regional(whatif.Scenario('all', 'us-east1', None, None)))
+        self.assertTrue(self.operation_set.is_regional(whatif.Scenario('all', None, None, None)))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)